@@ -1,33 +1,1197 @@
 import sys
-import os
+import io
+import csv
+import json
 import sqlite3
 import time
+import random
+import re
+import shlex
+import bisect
+from collections import deque
 
 from PySide6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton,
-    QComboBox, QTreeWidget, QTreeWidgetItem, QGroupBox, QFileDialog, QMessageBox,
-    QAbstractItemView, QMenu, QSizePolicy, QMainWindow, QTabWidget, QInputDialog
+    QComboBox, QSpinBox, QCheckBox, QTableView, QHeaderView, QGroupBox, QFileDialog, QMessageBox,
+    QAbstractItemView, QMenu, QSizePolicy, QMainWindow, QTabWidget, QTabBar, QInputDialog,
+    QPlainTextEdit, QSplitter
 )
-from PySide6.QtCore import Qt, QTimer
-from PySide6.QtGui import QClipboard, QAction, QCursor
+from PySide6.QtCore import (
+    Qt, QTimer, QAbstractTableModel, QModelIndex, QObject, QRunnable, QThreadPool, Signal, Slot
+)
+from PySide6.QtGui import QClipboard, QAction, QCursor, QKeySequence, QShortcut
+
+from googleapiclient.errors import HttpError
+
+import gsdbe_core
+from gsdbe_core import (
+    CHANGE_DETECTION, CHANGE_DETECTORS, FETCH_PAGE_ROWS, SHEET_TITLE, API_THREADS,
+    col_num_to_letter, col_letter_to_num, a1_range, a1_title, block_cells, ColumnarStore, page_columns,
+    fetch_worksheets, find_worksheet, worksheet_grid, iter_sheet_pages, fetch_worksheet_data,
+    infer_sqlite_type, sqlite_column_names, export_pages, EXPORTERS, import_pyarrow, snapshot_cache,
+    SqliteMirror, read_sheets_file, API_METRICS, LATENCY_BUCKETS
+)
+
+REFRESH_INTERVAL = 1000  # milliseconds, poll rate of the visible tab
+HIDDEN_REFRESH_INTERVAL = 5000  # milliseconds, first poll interval of a hidden tab
+MAX_REFRESH_INTERVAL = 60000  # milliseconds, hidden/idle tabs back off up to this
+MAX_RATE_LIMIT_BACKOFF = 64000  # milliseconds, cap for the backoff after a 429
+FULL_FETCH_EVERY = 30  # polls; a full fetch is forced this often whatever the detector says
+MAX_LOADED_WORKSHEETS = 8  # worksheets per tab held in memory; the least recently viewed is unloaded
+CACHE_MAX_STALENESS = 300  # seconds; younger snapshots are trusted until the change detector sees a change
+CACHE_SAVE_INTERVAL = 30  # seconds; a sheet that keeps changing is snapshotted at most this often
+WRITE_BATCH_WINDOW = 300  # milliseconds edits are collected before being sent together
+PASTE_CHUNK_CELLS = 50000  # cells per values.update call; bigger pastes go in several, with progress
+FILTER_DELAY = 150  # milliseconds after the last keystroke before the filter bar applies
+INDEX_PATCH_LIMIT = 2000  # changed rows patched into a column index; more than this (or 5%) rebuilds it
+QUERY_BATCH_ROWS = 1000  # result rows streamed to the SQL console at a time
+QUERY_ROW_LIMIT = 500000  # result rows the SQL console keeps; the rest of a result is dropped
+JOURNAL_MAX_STEPS = 200  # undo steps kept per tab
+JOURNAL_MAX_CELLS = 1000000  # cell values kept in a tab's undo/redo history; the oldest steps go first
+DIAGNOSTICS_REFRESH = 2000  # milliseconds between updates of a visible diagnostics tab
+EXPORT_FILTERS = {  # save dialog filter -> gsdbe_core.EXPORTERS key
+    'SQLite Database (*.db)': 'sqlite',
+    'CSV (*.csv)': 'csv',
+    'Parquet (*.parquet)': 'parquet',
+    'Arrow IPC (*.arrow)': 'arrow',
+}
+
+_api_pool = None
+
+def api_thread_pool():
+    global _api_pool
+    if _api_pool is None:
+        _api_pool = QThreadPool()
+        _api_pool.setMaxThreadCount(API_THREADS)
+    return _api_pool
+
+def parse_tsv(text):
+    # Clipboard text as Sheets and Excel put it there: tab-separated rows, with cells that hold
+    # tabs, newlines or quotes in double quotes. A trailing newline doesn't add a row.
+    if text.endswith('\n'):
+        text = text[:-2] if text.endswith('\r\n') else text[:-1]
+    if not text:
+        return []
+    return list(csv.reader(io.StringIO(text, newline=''), delimiter='\t'))
+
+def format_tsv(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer, delimiter='\t', lineterminator='\n').writerows(rows)
+    return buffer.getvalue()
+
+class ApiTaskSignals(QObject):
+    finished = Signal(object)
+    failed = Signal(object)
+    progress = Signal(object)
+
+class ApiTask(QRunnable):
+    def __init__(self, fn, signals):
+        super().__init__()
+        self.fn = fn
+        self.signals = signals
+
+    def run(self):
+        try:
+            result = self.fn()
+        except Exception as e:
+            self.signals.failed.emit(e)
+            return
+        self.signals.finished.emit(result)
+
+class ApiWorker(QObject):
+    # Runs one tab's API calls on the shared pool, one at a time and in submission order,
+    # and hands the results back on the GUI thread. Jobs submitted with a key are coalesced:
+    # while one is queued or running, further submissions with the same key are dropped.
+    idle = Signal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.queue = deque()
+        self.current = None
+        self.current_signals = None
+        self.pending_keys = set()
+
+    def submit(self, fn, on_result=None, on_error=None, key=None, on_progress=None):
+        # With on_progress, fn is called with a report(payload) function; every payload is
+        # passed to on_progress on the GUI thread, in order, before on_result.
+        if key is not None:
+            if key in self.pending_keys:
+                return False
+            self.pending_keys.add(key)
+        self.queue.append((fn, on_result, on_error, key, on_progress))
+        self.start_next()
+        return True
+
+    def is_pending(self, key):
+        return key in self.pending_keys
+
+    def is_idle(self):
+        return self.current is None and not self.queue
+
+    def start_next(self):
+        if self.current is not None:
+            return
+        if not self.queue:
+            self.idle.emit()
+            return
+        self.current = self.queue.popleft()
+        fn, on_progress = self.current[0], self.current[4]
+        signals = self.current_signals = ApiTaskSignals()
+        signals.finished.connect(self.on_finished)
+        signals.failed.connect(self.on_failed)
+        if on_progress is not None:
+            signals.progress.connect(self.on_progress)
+            fn = lambda fn=fn: fn(signals.progress.emit)
+        api_thread_pool().start(ApiTask(fn, signals))
+
+    def finish_current(self):
+        job = self.current
+        self.current = None
+        self.current_signals = None
+        self.pending_keys.discard(job[3])
+        return job
+
+    @Slot(object)
+    def on_progress(self, payload):
+        if self.current is not None:
+            self.current[4](payload)
+
+    @Slot(object)
+    def on_finished(self, result):
+        _, on_result, _, _, _ = self.finish_current()
+        try:
+            if on_result:
+                on_result(result)
+        finally:
+            self.start_next()
+
+    @Slot(object)
+    def on_failed(self, error):
+        _, _, on_error, _, _ = self.finish_current()
+        try:
+            if on_error:
+                on_error(error)
+        finally:
+            self.start_next()
+
+class MutationQueue(QObject):
+    # Collects outgoing edits for WRITE_BATCH_WINDOW ms and sends them in as few requests as
+    # possible. Consecutive edits of the same kind share a request (value writes ->
+    # values.batchUpdate, clears -> values.batchClear, structural changes ->
+    # spreadsheets.batchUpdate); a change of kind starts a new one, and the requests of a flush
+    # run back to back in one worker job, so every edit lands in the order it was made.
+    # Edits can carry a tag, handed back once the flush they went out in has succeeded or failed.
+    flushed = Signal(int, object)  # edits sent, (tags, conflicts, had structural changes, formulas)
+    failed = Signal(object, object)  # error, tags
+
+    def __init__(self, service, spreadsheet_id, worker, parent=None):
+        super().__init__(parent)
+        self.service = service
+        self.spreadsheet_id = spreadsheet_id
+        self.worker = worker
+        self.segments = []
+        self.tags = []
+        self.pending = 0
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(WRITE_BATCH_WINDOW)
+        self.timer.timeout.connect(self.flush)
+
+    def segment(self, kind, factory, tag=None):
+        if not self.segments or self.segments[-1][0] != kind:
+            self.segments.append((kind, factory()))
+        self.pending += 1
+        if tag is not None:
+            self.tags.append(tag)
+        if not self.timer.isActive():
+            self.timer.start()
+        return self.segments[-1][1]
+
+    def write(self, range_name, values, base=None, tag=None, kept=None):
+        # base: the values this write expects to replace, same shape as values; see send().
+        # kept: handed back with the formulas the write overwrites, see check_conflicts().
+        data = self.segment("values", dict, tag)
+        # Re-inserting moves a rewritten range to the end so overlapping ranges keep edit order.
+        # The first write's base and kept are kept, they are about what the sheet held before
+        # any of them.
+        previous = data.pop(range_name, None)
+        if previous is not None and previous[1] is not None:
+            base = previous[1]
+            kept = previous[3] or kept
+        data[range_name] = (values, base, tag, kept)
+
+    def clear(self, range_name, tag=None):
+        ranges = self.segment("clear", list, tag)
+        if range_name not in ranges:
+            ranges.append(range_name)
+
+    def structural(self, request, tag=None):
+        self.segment("structure", list, tag).append(request)
+
+    def has_pending(self):
+        return bool(self.segments)
+
+    def build_request(self, kind, payload):
+        spreadsheets = self.service.spreadsheets()
+        if kind == "values":
+            return spreadsheets.values().batchUpdate(
+                spreadsheetId=self.spreadsheet_id,
+                body={
+                    "valueInputOption": "USER_ENTERED",
+                    "data": [{"range": r, "values": v} for r, (v, _, _, _) in payload.items()]
+                }
+            )
+        if kind == "clear":
+            return spreadsheets.values().batchClear(
+                spreadsheetId=self.spreadsheet_id,
+                body={"ranges": payload}
+            )
+        return spreadsheets.batchUpdate(
+            spreadsheetId=self.spreadsheet_id,
+            body={"requests": payload}
+        )
+
+    def read_ranges(self, ranges):
+        # Runs on the worker: (formatted values, formulas) of each range as rows, '' where a
+        # cell is blank or has no formula, from one spreadsheets.get. Its grid data comes
+        # per worksheet, one GridData for each range asked of it, in request order.
+        result = self.service.spreadsheets().get(
+            spreadsheetId=self.spreadsheet_id, ranges=ranges, includeGridData=True,
+            fields="sheets(properties(title),data(rowData(values(formattedValue,userEnteredValue(formulaValue)))))"
+        ).execute()
+        grids = {sheet['properties']['title']: iter(sheet.get('data', [])) for sheet in result.get('sheets', [])}
+        read = []
+        for range_name in ranges:
+            values, formulas = [], []
+            for row in next(grids.get(a1_title(range_name), iter(())), {}).get('rowData', []):
+                cells = row.get('values', [])
+                values.append([cell.get('formattedValue', '') for cell in cells])
+                formulas.append([cell.get('userEnteredValue', {}).get('formulaValue', '') for cell in cells])
+            read.append((values, formulas))
+        return read
+
+    def check_conflicts(self, payload):
+        # Runs on the worker. Reads back the ranges of writes that carry a base; a cell that is
+        # neither its base nor the value being written any more was changed by someone else
+        # since it was fetched. It is left out of the write (a null cell is skipped by the API)
+        # and reported as (tag, row, column, remote value). The same read has the formulas
+        # the writes overwrite, returned as (kept, formula rows) for writes that carry kept.
+        checked = [range_name for range_name, (_, base, _, _) in payload.items() if base is not None]
+        if not checked:
+            return [], []
+        conflicts, formulas = [], []
+        for range_name, (remote, remote_formulas) in zip(checked, self.read_ranges(checked)):
+            values, base, tag, kept = payload[range_name]
+            if kept is not None:
+                formulas.append((kept, remote_formulas))
+            values = [list(row) for row in values]
+            for i, row in enumerate(values):
+                for j, value in enumerate(row):
+                    now = remote[i][j] if i < len(remote) and j < len(remote[i]) else ''
+                    if now != base[i][j] and now != value:
+                        conflicts.append((tag, i, j, now))
+                        row[j] = None
+            payload[range_name] = (values, base, tag, kept)
+        return conflicts, formulas
+
+    def send(self, segments):
+        conflicts, formulas = [], []
+        for kind, payload in segments:
+            if kind == "values":
+                found, overwritten = self.check_conflicts(payload)
+                conflicts.extend(found)
+                formulas.extend(overwritten)
+            self.build_request(kind, payload).execute()
+        return conflicts, formulas
+
+    def flush(self):
+        self.timer.stop()
+        if not self.segments:
+            return
+        segments, tags, count = self.segments, self.tags, self.pending
+        structural = any(kind == "structure" for kind, _ in segments)
+        self.segments = []
+        self.tags = []
+        self.pending = 0
+        self.worker.submit(
+            lambda: self.send(segments),
+            lambda result: self.flushed.emit(count, (tags, result[0], structural, result[1])),
+            lambda e: self.failed.emit(e, tags)
+        )
+
+UNPASTEABLE = re.compile(r'[\t\r\n]|^"')  # values pasteData's tab-delimited text can't carry
+
+def entered_values_requests(sheet_id, top, left, rows):
+    # spreadsheets.batchUpdate requests that enter a block as if it were typed in, like the
+    # USER_ENTERED writes of a normal edit: formulas, numbers, dates and percentages are parsed
+    # again. The block is cleared, then pasted as tab-delimited text. A value with a tab, a
+    # line break or a leading quote wouldn't survive the paste and is set as text instead.
+    # Formats aren't journaled; a restored cell keeps its format, a re-inserted one gets the default.
+    height, width = len(rows), max((len(row) for row in rows), default=0)
+    requests = [{"updateCells": {
+        "range": {"sheetId": sheet_id, "startRowIndex": top, "endRowIndex": top + height,
+                  "startColumnIndex": left, "endColumnIndex": left + width},
+        "fields": "userEnteredValue"
+    }}]
+    if not any(value for row in rows for value in row):
+        return requests
+    lines = []
+    for r, row in enumerate(rows, top):
+        values = []
+        for c, value in enumerate(row, left):
+            if UNPASTEABLE.search(value):
+                requests.append({"updateCells": {
+                    "start": {"sheetId": sheet_id, "rowIndex": r, "columnIndex": c},
+                    "rows": [{"values": [{"userEnteredValue": {"stringValue": value}}]}],
+                    "fields": "userEnteredValue"
+                }})
+                value = ''
+            values.append(value)
+        lines.append("\t".join(values))
+    requests.insert(1, {"pasteData": {
+        "coordinate": {"sheetId": sheet_id, "rowIndex": top, "columnIndex": left},
+        "data": "\n".join(lines), "type": "PASTE_NORMAL", "delimiter": "\t"
+    }})
+    return requests
+
+def dimension_range(sheet_id, dimension, index):
+    return {"sheetId": sheet_id, "dimension": dimension, "startIndex": index, "endIndex": index + 1}
+
+def trim_block(block):
+    # Drops trailing blanks of every row, then trailing empty rows; pad_block undoes it
+    rows = []
+    for row in block:
+        end = len(row)
+        while end and row[end - 1] == '':
+            end -= 1
+        rows.append(list(row[:end]))
+    while rows and not rows[-1]:
+        rows.pop()
+    return rows
+
+def pad_block(rows, height, width):
+    rows = rows + [[]] * (height - len(rows))
+    return [row + [''] * (width - len(row)) for row in rows]
+
+class EditStep:
+    # One journaled edit of a worksheet, as a compact diff: only the cells it touched, taken
+    # from the loaded grid when the edit was made. undo_requests()/redo_requests() are the
+    # spreadsheets.batchUpdate requests that replay it backwards or forwards.
+    def __init__(self, label, sheet_id):
+        self.label = label
+        self.sheet_id = sheet_id
+
+class ValueStep(EditStep):
+    # A block of values written or cleared at (top, left); old and new are kept trimmed.
+    # The grid only has formatted values: the formulas among the old ones arrive with the
+    # write's conflict check (keep_formulas) and are what undo puts back.
+    def __init__(self, label, sheet_id, top, left, old, new):
+        super().__init__(label, sheet_id)
+        self.formulas = {}  # (row, column) within the block -> formula
+        self.top = top
+        self.left = left
+        self.height = len(new)
+        self.width = max((len(row) for row in new), default=0)
+        self.old = trim_block(old)
+        self.new = trim_block(new)
+        self.size = sum(map(len, self.old)) + sum(map(len, self.new))
+
+    def block(self, undo):
+        return pad_block(self.old if undo else self.new, self.height, self.width)
+
+    def keep_formulas(self, formulas, skip=()):
+        # formulas: the block's cells as read before the write, '' where there's no formula;
+        # cells in skip held another pending edit, the grid already has what was typed there
+        for i, row in enumerate(formulas):
+            for j, formula in enumerate(row):
+                if formula and (i, j) not in skip:
+                    self.formulas[(i, j)] = formula
+
+    def undo_requests(self):
+        block = self.block(True)
+        for (i, j), formula in self.formulas.items():
+            if i < self.height and j < self.width:
+                block[i][j] = formula
+        return entered_values_requests(self.sheet_id, self.top, self.left, block)
+
+    def redo_requests(self):
+        return entered_values_requests(self.sheet_id, self.top, self.left, self.block(False))
+
+class DimensionStep(EditStep):
+    # A row or column inserted, or deleted along with its values (trailing blanks dropped)
+    def __init__(self, label, sheet_id, dimension, index, inserted, removed=()):
+        super().__init__(label, sheet_id)
+        self.dimension = dimension
+        self.index = index
+        self.inserted = inserted
+        self.removed = trim_block([removed])[0] if removed else []
+        self.size = len(self.removed)
+
+    def insert(self):
+        requests = [{"insertDimension": {
+            "range": dimension_range(self.sheet_id, self.dimension, self.index), "inheritFromBefore": False
+        }}]
+        if self.removed:
+            if self.dimension == "ROWS":
+                requests += entered_values_requests(self.sheet_id, self.index, 0, [self.removed])
+            else:
+                requests += entered_values_requests(self.sheet_id, 0, self.index, [[value] for value in self.removed])
+        return requests
+
+    def delete(self):
+        return [{"deleteDimension": {"range": dimension_range(self.sheet_id, self.dimension, self.index)}}]
+
+    def undo_requests(self):
+        return self.delete() if self.inserted else self.insert()
+
+    def redo_requests(self):
+        return self.insert() if self.inserted else self.delete()
+
+class CellShiftStep(EditStep):
+    # One cell deleted with the cells below it shifted up
+    def __init__(self, label, sheet_id, row, column, removed):
+        super().__init__(label, sheet_id)
+        self.row = row
+        self.column = column
+        self.removed = removed
+        self.size = 1
+
+    def cell_range(self):
+        return {"sheetId": self.sheet_id, "startRowIndex": self.row, "endRowIndex": self.row + 1,
+                "startColumnIndex": self.column, "endColumnIndex": self.column + 1}
+
+    def undo_requests(self):
+        return [
+            {"insertRange": {"range": self.cell_range(), "shiftDimension": "ROWS"}},
+        ] + entered_values_requests(self.sheet_id, self.row, self.column, [[self.removed]])
+
+    def redo_requests(self):
+        return [{"deleteRange": {"range": self.cell_range(), "shiftDimension": "ROWS"}}]
+
+class EditJournal(QObject):
+    # Undo/redo history of one tab. Steps are positional, replayed as the user made them, so
+    # an edit someone else made meanwhile (rows inserted above, say) isn't accounted for.
+    # Memory stays bounded over long sessions: at most JOURNAL_MAX_STEPS steps and
+    # JOURNAL_MAX_CELLS cell values, the oldest undo steps dropped first. An edit bigger
+    # than that can't be journaled and clears the history, since the steps before it would
+    # no longer replay correctly.
+    changed = Signal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.undo_steps = deque()
+        self.redo_steps = []
+        self.cells = 0
+
+    def record(self, step):
+        self.cells -= sum(s.size for s in self.redo_steps)
+        self.redo_steps = []
+        if step.size > JOURNAL_MAX_CELLS:
+            self.clear()
+            return
+        self.undo_steps.append(step)
+        self.cells += step.size
+        while len(self.undo_steps) > JOURNAL_MAX_STEPS or self.cells > JOURNAL_MAX_CELLS:
+            self.cells -= self.undo_steps.popleft().size
+        self.changed.emit()
+
+    def undo(self):
+        if not self.undo_steps:
+            return None
+        step = self.undo_steps.pop()
+        self.redo_steps.append(step)
+        self.changed.emit()
+        return step
+
+    def redo(self):
+        if not self.redo_steps:
+            return None
+        step = self.redo_steps.pop()
+        self.undo_steps.append(step)
+        self.changed.emit()
+        return step
+
+    def clear(self):
+        self.undo_steps.clear()
+        self.redo_steps = []
+        self.cells = 0
+        self.changed.emit()
+
+class PollState:
+    def __init__(self):
+        self.next_due = 0.0
+        self.started = 0.0
+        self.interval = REFRESH_INTERVAL
+        self.failures = 0
+
+class RefreshScheduler(QObject):
+    # One poll clock for every open tab. The visible tab is polled every REFRESH_INTERVAL;
+    # hidden tabs start at HIDDEN_REFRESH_INTERVAL and double their interval on every poll
+    # that finds nothing new, up to MAX_REFRESH_INTERVAL. Sheets quotas are per user, so a
+    # 429 from any spreadsheet pauses all polling with jittered exponential backoff.
+    def __init__(self, tab_widget, parent=None):
+        super().__init__(parent)
+        self.tab_widget = tab_widget
+        self.states = {}
+        self.paused_until = 0.0
+        self.rate_limit_hits = 0
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.tick)
+        self.timer.start(REFRESH_INTERVAL)
+        self.tab_widget.currentChanged.connect(self.on_current_changed)
 
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+    def register(self, tab):
+        self.states[tab] = PollState()
 
-SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
-REFRESH_INTERVAL = 1000  # milliseconds
+    def unregister(self, tab):
+        self.states.pop(tab, None)
 
-def col_num_to_letter(n):
-    result = ''
-    while n:
-        n, rem = divmod(n - 1, 26)
-        result = chr(65 + rem) + result
-    return result
+    def on_current_changed(self, index):
+        # A tab that just became visible is polled right away at full rate
+        state = self.states.get(self.tab_widget.widget(index))
+        if state is not None:
+            state.interval = REFRESH_INTERVAL
+            state.next_due = 0.0
+            self.tick()
+
+    def tick(self):
+        now = time.monotonic()
+        if now < self.paused_until:
+            return
+        # Small slack so timer jitter doesn't push a due tab to the following tick
+        slack = REFRESH_INTERVAL / 10000
+        for tab, state in list(self.states.items()):
+            if now + slack >= state.next_due and tab.poll(self.on_poll_done):
+                # Parked until the poll reports back, so a slow fetch is never doubled up
+                state.started = now
+                state.next_due = float('inf')
+
+    def on_poll_done(self, tab, changed, error):
+        state = self.states.get(tab)
+        if state is None:
+            return
+        now = time.monotonic()
+        if isinstance(error, HttpError) and error.resp.status == 429:
+            self.rate_limit_hits += 1
+            backoff = min(MAX_RATE_LIMIT_BACKOFF, REFRESH_INTERVAL * 2 ** self.rate_limit_hits)
+            delay = backoff * random.uniform(0.5, 1.0) / 1000
+            self.paused_until = max(self.paused_until, now + delay)
+            state.next_due = now + delay
+            return
+        if error is not None:
+            state.failures += 1
+            delay = min(MAX_REFRESH_INTERVAL, REFRESH_INTERVAL * 2 ** state.failures)
+            state.next_due = now + delay * random.uniform(0.5, 1.0) / 1000
+            return
+
+        self.rate_limit_hits = 0
+        state.failures = 0
+        if tab is self.tab_widget.currentWidget():
+            state.interval = REFRESH_INTERVAL
+        elif changed:
+            state.interval = HIDDEN_REFRESH_INTERVAL
+        else:
+            state.interval = min(MAX_REFRESH_INTERVAL, max(HIDDEN_REFRESH_INTERVAL, state.interval * 2))
+        state.next_due = state.started + state.interval / 1000
+
+class SheetTableModel(QAbstractTableModel):
+    # Read-only table model over a ColumnarStore; the view only asks for the cells it paints.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.store = ColumnarStore()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.store.row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.store.column_count
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.store.cell(index.row(), index.column())
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignLeft | Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return col_num_to_letter(section + 1)
+        return str(section + 1)
+
+    def flags(self, index):
+        return Qt.ItemIsSelectable | Qt.ItemIsEnabled
+
+    def source_row(self, r):
+        # View row -> sheet row; the identity here, see FilterProxyModel
+        return r
+
+    def set_cell_value(self, r, c, value):
+        self.store.set_cell(r, c, value)
+        index = self.index(r, c)
+        self.dataChanged.emit(index, index)
+
+    def set_block(self, top, left, block):
+        # Writes a pasted block locally, growing the model to fit; the next fetch reconciles it
+        store = self.store
+        right = left + max((len(row) for row in block), default=0)
+        bottom = top + len(block)
+        if not block or right == left:
+            return
+        if right > store.column_count:
+            self.beginInsertColumns(QModelIndex(), store.column_count, right - 1)
+            store.set_column_count(right)
+            self.endInsertColumns()
+        if bottom > store.row_count:
+            self.beginInsertRows(QModelIndex(), store.row_count, bottom - 1)
+            store.append_rows([[]] * (bottom - store.row_count))
+            self.endInsertRows()
+        for r, row in enumerate(block, top):
+            for c, value in enumerate(row, left):
+                store.set_cell(r, c, value)
+        self.dataChanged.emit(self.index(top, left), self.index(bottom - 1, right - 1))
+
+    # A fetch is applied page by page: begin_fetch(), apply_page() for every page as it
+    # arrives, then finish_fetch() to drop rows/columns past the data. Pages come as
+    # page_columns, transposed on the worker. Only the insert/remove/dataChanged signals
+    # needed for what actually changed are emitted.
+    def begin_fetch(self):
+        self.fetch_changed = False
+        self.dirty_rows = set()
+
+    def apply_page(self, start, columns, length, window):
+        # Rows [start, start + window) of the sheet, the first length of them in columns;
+        # rows the page doesn't include are blank
+        store = self.store
+        width = len(columns)
+        if width > store.column_count:
+            self.beginInsertColumns(QModelIndex(), store.column_count, width - 1)
+            store.set_column_count(width)
+            self.endInsertColumns()
+            self.fetch_changed = True
+
+        overlap = max(0, min(store.row_count, start + window) - start)
+        changes = store.diff(start, columns, overlap)
+        if changes:
+            for r, c, value in changes:
+                store.set_cell(r, c, value)
+            changed_rows = [r for r, _, _ in changes]
+            self.dirty_rows.update(changed_rows)
+            changed_cols = [c for _, c, _ in changes]
+            self.dataChanged.emit(
+                self.index(min(changed_rows), min(changed_cols)),
+                self.index(max(changed_rows), max(changed_cols))
+            )
+            self.fetch_changed = True
+
+        end = start + length
+        if length and end > store.row_count:
+            first = store.row_count
+            self.beginInsertRows(QModelIndex(), first, end - 1)
+            if start > first:
+                store.append_rows([[]] * (start - first))
+            skip = max(0, first - start)
+            store.append_columns([column[skip:] for column in columns], end - max(first, start))
+            self.endInsertRows()
+            self.dirty_rows.update(range(first, end))
+            self.fetch_changed = True
+
+    def finish_fetch(self, data_rows, width):
+        store = self.store
+        if data_rows < store.row_count:
+            self.beginRemoveRows(QModelIndex(), data_rows, store.row_count - 1)
+            store.truncate(data_rows)
+            self.endRemoveRows()
+            self.fetch_changed = True
+        if width < store.column_count:
+            self.beginRemoveColumns(QModelIndex(), width, store.column_count - 1)
+            store.set_column_count(width)
+            self.endRemoveColumns()
+            self.fetch_changed = True
+        return self.fetch_changed
+
+    def apply_grid(self, columns, length):
+        # A whole grid of length rows, as page_columns
+        self.begin_fetch()
+        self.apply_page(0, columns, length, length)
+        return self.finish_fetch(length, len(columns))
+
+NUMBER_PATTERN = re.compile(r'\s*([+-]?)[$€£]?(\d[\d,]*(?:\.\d*)?|\.\d+)(e[+-]?\d+)?(%?)\s*', re.I)
+
+def parse_number(value):
+    # Numeric reading of a formatted cell ("1,234.5", "-$20", "15%"), or None
+    match = NUMBER_PATTERN.fullmatch(value)
+    if match is None:
+        return None
+    sign, digits, exponent, percent = match.groups()
+    number = float(digits.replace(',', '') + (exponent or ''))
+    if sign == '-':
+        number = -number
+    return number / 100 if percent else number
+
+class ColumnIndex:
+    # Search structures for one column: an inverted index from case-folded value to the
+    # rows holding it (equality, and substring by scanning the distinct values), and the
+    # numeric values sorted as (number, row) for range queries. Rows whose cells changed
+    # are patched in on the next query; a large batch of changes rebuilds instead.
+    def __init__(self, values, row_count):
+        self.stale = set()
+        self.rebuild(values, row_count)
+
+    def rebuild(self, values, row_count):
+        self.keys = [value.casefold() for value in values[:row_count]]
+        rows_by_key = self.rows_by_key = {}
+        for r, key in enumerate(self.keys):
+            if key:
+                rows = rows_by_key.get(key)
+                if rows is None:
+                    rows_by_key[key] = [r]
+                else:
+                    rows.append(r)
+        numbers = self.numbers = []
+        for key, rows in rows_by_key.items():
+            number = parse_number(key)
+            if number is not None:
+                numbers.extend([(number, r) for r in rows])
+        numbers.sort()
+        self.stale.clear()
+
+    def refresh(self, values, row_count):
+        if not self.stale:
+            return
+        if len(self.stale) > max(INDEX_PATCH_LIMIT, row_count // 20):
+            self.rebuild(values, row_count)
+            return
+        keys = self.keys
+        if len(keys) < row_count:
+            keys.extend([''] * (row_count - len(keys)))
+        for r in self.stale:
+            old = keys[r] if r < len(keys) else ''
+            new = values[r].casefold() if r < row_count else ''
+            if old == new:
+                continue
+            if old:
+                self.remove(old, r)
+            if new:
+                self.add(new, r)
+            keys[r] = new
+        del keys[row_count:]
+        self.stale.clear()
+
+    def add(self, key, r):
+        self.rows_by_key.setdefault(key, []).append(r)
+        number = parse_number(key)
+        if number is not None:
+            bisect.insort(self.numbers, (number, r))
+
+    def remove(self, key, r):
+        rows = self.rows_by_key[key]
+        rows.remove(r)
+        if not rows:
+            del self.rows_by_key[key]
+        number = parse_number(key)
+        if number is not None:
+            del self.numbers[bisect.bisect_left(self.numbers, (number, r))]
+
+    def equals(self, text):
+        return set(self.rows_by_key.get(text.casefold(), ()))
+
+    def contains(self, text):
+        needle = text.casefold()
+        found = set()
+        for key, rows in self.rows_by_key.items():
+            if needle in key:
+                found.update(rows)
+        return found
+
+    def non_empty(self):
+        found = set()
+        for rows in self.rows_by_key.values():
+            found.update(rows)
+        return found
+
+    def between(self, low=None, high=None, low_inclusive=True, high_inclusive=True):
+        numbers = self.numbers
+        start = 0 if low is None else (
+            bisect.bisect_left(numbers, (low, -1)) if low_inclusive
+            else bisect.bisect_right(numbers, (low, float('inf'))))
+        end = len(numbers) if high is None else (
+            bisect.bisect_right(numbers, (high, float('inf'))) if high_inclusive
+            else bisect.bisect_left(numbers, (high, -1)))
+        return {r for _, r in numbers[start:end]}
+
+class SheetIndex(QObject):
+    # Per-column ColumnIndexes over a SheetTableModel, each built the first time a query
+    # touches its column. Follows the model's change signals to mark the rows that moved
+    # since, so keeping the indexes current costs nothing until the next query.
+    def __init__(self, model):
+        super().__init__(model)
+        self.model = model
+        self.columns = {}
+        model.dataChanged.connect(lambda top, bottom: self.mark_stale(top.row(), bottom.row()))
+        model.rowsInserted.connect(lambda parent, first, last: self.mark_stale(first, last))
+        model.rowsRemoved.connect(lambda parent, first, last: self.mark_stale(first, last))
+        model.columnsInserted.connect(self.drop)
+        model.columnsRemoved.connect(self.drop)
+        model.modelReset.connect(self.drop)
+
+    def mark_stale(self, first, last):
+        rows = range(first, last + 1)
+        for index in self.columns.values():
+            index.stale.update(rows)
+
+    def drop(self, *args):
+        self.columns.clear()
+
+    def column(self, c):
+        store = self.model.store
+        index = self.columns.get(c)
+        if index is None:
+            index = self.columns[c] = ColumnIndex(store.columns[c], store.row_count)
+        else:
+            index.refresh(store.columns[c], store.row_count)
+        return index
+
+    def match(self, predicate):
+        column, op, value = predicate
+        if column is None:
+            found = set()
+            for c in range(self.model.store.column_count):
+                found |= self.column(c).contains(value)
+            return found
+        index = self.column(column)
+        if op == '~':
+            return index.contains(value)
+        if op == '=':
+            return index.equals(value) if value else set(range(self.model.store.row_count)) - index.non_empty()
+        if op == '!=':
+            return set(range(self.model.store.row_count)) - index.equals(value)
+        if op == '..':
+            return index.between(*value)
+        return index.between(**{
+            '>': {'low': value, 'low_inclusive': False},
+            '>=': {'low': value},
+            '<': {'high': value, 'high_inclusive': False},
+            '<=': {'high': value},
+        }[op])
+
+    def query(self, groups):
+        # groups: predicates ANDed within a group, groups ORed. Returns sorted row numbers.
+        found = set()
+        for predicates in groups:
+            rows = None
+            for predicate in predicates:
+                rows = self.match(predicate) if rows is None else rows & self.match(predicate)
+                if not rows:
+                    break
+            found |= rows or set()
+        return sorted(found)
+
+FILTER_TERM = re.compile(r'^(?P<column>[^=<>!~:]+?)\s*(?P<op>>=|<=|!=|=|>|<|~|:)\s*(?P<value>.*)$', re.S)
+
+def parse_filter(text, column_count, header=()):
+    # Filter bar syntax, terms separated by spaces and ANDed, OR between groups of terms:
+    #   word          any column contains word        B=open     column B equals "open"
+    #   B~smi / B:smi column B contains "smi"         B!=open    column B isn't "open"
+    #   C>100, C<=5   numeric comparisons             C=10..20   numeric range, inclusive
+    # Columns are letters or header-row names; quote terms with spaces: "Due date"<5
+    groups = [[]]
+    for term in shlex.split(text):
+        if term == 'OR':
+            groups.append([])
+            continue
+        match = FILTER_TERM.match(term)
+        column = match and resolve_filter_column(match['column'].strip(), column_count, header)
+        if column is None:
+            groups[-1].append((None, '~', term))
+            continue
+        op, value = match['op'], match['value']
+        if op == ':':
+            op = '~'
+        if op in ('>', '>=', '<', '<='):
+            number = parse_number(value)
+            if number is None:
+                raise ValueError(f"{term}: {value!r} is not a number")
+            value = number
+        elif op == '=' and '..' in value:
+            low, high = (parse_number(part) if part.strip() else None for part in value.split('..', 1))
+            if (low is None and value.split('..')[0].strip()) or (high is None and value.split('..')[1].strip()):
+                raise ValueError(f"{term}: range bounds must be numbers")
+            op, value = '..', (low, high)
+        groups[-1].append((column, op, value))
+    return [group for group in groups if group]
+
+def resolve_filter_column(name, column_count, header):
+    if re.fullmatch(r'[A-Za-z]{1,3}', name):
+        c = col_letter_to_num(name.upper()) - 1
+        if c < column_count:
+            return c
+    folded = name.casefold()
+    for c, title in enumerate(header):
+        if title.strip().casefold() == folded:
+            return c
+    return None
+
+class FilterProxyModel(QAbstractTableModel):
+    # The rows of a SheetTableModel that match the filter bar, in sheet order. Row headers
+    # keep showing sheet row numbers; source_row() maps a view row back to the sheet.
+    # Re-filters (from the indexes, no API calls) whenever the source model changes.
+    def __init__(self, source, parent=None):
+        super().__init__(parent)
+        self.source = source
+        self.search_index = SheetIndex(source)
+        self.groups = []
+        self.rows = []
+        self.refilter_timer = QTimer(self)
+        self.refilter_timer.setSingleShot(True)
+        self.refilter_timer.setInterval(0)
+        self.refilter_timer.timeout.connect(self.refilter)
+        for signal in (source.dataChanged, source.rowsInserted, source.rowsRemoved,
+                       source.columnsInserted, source.columnsRemoved, source.modelReset):
+            signal.connect(self.refilter_timer.start)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return self.source.columnCount(parent)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        return self.source.data(self.source.index(self.rows[index.row()], index.column()), role)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Vertical:
+            return str(self.rows[section] + 1)
+        return self.source.headerData(section, orientation, role)
+
+    def flags(self, index):
+        return self.source.flags(index)
+
+    def source_row(self, r):
+        return self.rows[r]
+
+    def set_filter(self, text):
+        # Raises ValueError for a filter that can't be parsed
+        store = self.source.store
+        header = store.row(0) if store.row_count else []
+        self.groups = parse_filter(text, store.column_count, header)
+        self.refilter()
+
+    def refilter(self):
+        self.refilter_timer.stop()
+        rows = self.search_index.query(self.groups)
+        if rows == self.rows:
+            if rows:
+                self.dataChanged.emit(self.index(0, 0), self.index(len(rows) - 1, max(0, self.columnCount() - 1)))
+            return
+        self.beginResetModel()
+        self.rows = rows
+        self.endResetModel()
+
+def sql_identifier(text):
+    # Table names for the SQL console: lower-case words joined by underscores
+    name = re.sub(r'\W+', '_', text.strip().lower()).strip('_') or 'sheet'
+    return f"t_{name}" if name[0].isdigit() else name
+
+class SqlTable:
+    def __init__(self, name, columns):
+        self.name = name
+        self.columns = columns
+
+class SqlWorkspace(QObject):
+    # An in-memory SQLite database with one table per loaded worksheet of every open tab,
+    # queried from the SQL console. Tables follow the models: a refresh rewrites only the
+    # rows it changed, keyed on _row (the 1-based sheet row), and a change of header or
+    # width rebuilds the table. Columns are named like the SQLite export names them.
+    # The connection is only used by jobs on this workspace's worker, so writes and
+    # queries never overlap.
+    tables_changed = Signal()
+    sync_failed = Signal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.conn = sqlite3.connect(':memory:', check_same_thread=False, isolation_level=None)
+        self.worker = ApiWorker(self)
+        self.tables = {}  # (tab, sheet_id) -> SqlTable
+        self.cancelled = False
+
+    def table_name(self, key, label):
+        base = name = sql_identifier(label)
+        taken = {table.name for other, table in self.tables.items() if other != key}
+        n = 1
+        while name in taken:
+            n += 1
+            name = f"{base}_{n}"
+        return name
+
+    def publish(self, key, label, store, dirty_rows=None):
+        # Called on the GUI thread after a worksheet's model changed; dirty_rows=None means
+        # all of it. Values are copied out of the store here and written by the worker.
+        width = store.column_count
+        names, header = sqlite_column_names(store.row(0) if store.row_count else None, width)
+        first = 1 if header else 0
+        table = self.tables.get(key)
+        name = self.table_name(key, label)
+        if dirty_rows is None or table is None or table.name != name or table.columns != names:
+            old = table.name if table is not None else None
+            self.tables[key] = SqlTable(name, names)
+            columns = [list(column[first:]) for column in store.columns]
+            self.worker.submit(
+                lambda: self.create_table(old, name, names, first, columns),
+                lambda _: self.tables_changed.emit(),
+                lambda e: self.sync_failed.emit(f"{name}: {e}")
+            )
+            return
+        rows = [
+            (r + 1, *(column[r] for column in store.columns))
+            for r in sorted(dirty_rows) if first <= r < store.row_count
+        ]
+        row_count = store.row_count
+        self.worker.submit(
+            lambda: self.update_rows(name, len(names), rows, row_count),
+            on_error=lambda e: self.sync_failed.emit(f"{name}: {e}")
+        )
+
+    def create_table(self, old, name, names, first, columns):
+        rows = list(zip(range(first + 1, first + 1 + len(columns[0]) if columns else 0), *columns))
+        types = [infer_sqlite_type(column[:1000], parse_strings=True) for column in columns]
+        col_defs = ''.join(f', "{column}" {kind}' for column, kind in zip(names, types))
+        self.conn.execute("BEGIN")
+        try:
+            if old is not None:
+                self.conn.execute(f'DROP TABLE IF EXISTS "{old}"')
+            self.conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+            self.conn.execute(f'CREATE TABLE "{name}" (_row INTEGER PRIMARY KEY{col_defs})')
+            self.insert_rows(name, len(names), rows)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def update_rows(self, name, width, rows, row_count):
+        self.conn.execute("BEGIN")
+        try:
+            self.insert_rows(name, width, rows)
+            self.conn.execute(f'DELETE FROM "{name}" WHERE _row > ?', (row_count,))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def insert_rows(self, name, width, rows):
+        self.conn.executemany(
+            f'INSERT OR REPLACE INTO "{name}" VALUES ({",".join("?" * (width + 1))})',
+            (tuple(None if value == '' else value for value in row) for row in rows)
+        )
+
+    def drop(self, key):
+        table = self.tables.pop(key, None)
+        if table is not None:
+            self.worker.submit(
+                lambda: self.conn.execute(f'DROP TABLE IF EXISTS "{table.name}"'),
+                lambda _: self.tables_changed.emit()
+            )
+
+    def query(self, sql, on_batch, on_result, on_error):
+        # Runs after any pending table writes. on_batch gets (column names, rows) for every
+        # QUERY_BATCH_ROWS rows as they are read; on_result the total row count, which can
+        # exceed the QUERY_ROW_LIMIT rows that were sent.
+        self.cancelled = False
+        def run(report):
+            self.conn.set_progress_handler(lambda: 1 if self.cancelled else 0, 10000)
+            try:
+                cursor = self.conn.execute(sql)
+                columns = [d[0] for d in cursor.description or ()]
+                report((columns, []))
+                total = 0
+                while rows := cursor.fetchmany(QUERY_BATCH_ROWS):
+                    if total < QUERY_ROW_LIMIT:
+                        report((columns, rows[:QUERY_ROW_LIMIT - total]))
+                    total += len(rows)
+                return total
+            finally:
+                self.conn.set_progress_handler(None, 0)
+        self.worker.submit(run, on_result, on_error, on_progress=on_batch)
+
+    def cancel(self):
+        # Stops the running query at its next progress check ("interrupted")
+        self.cancelled = True
+
+class QueryResultModel(QAbstractTableModel):
+    # Rows of a SQL console query, appended batch by batch as the workspace streams them
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.columns = []
+        self.rows = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        value = self.rows[index.row()][index.column()]
+        if role == Qt.DisplayRole:
+            return '' if value is None else str(value)
+        if role == Qt.TextAlignmentRole:
+            if isinstance(value, (int, float)):
+                return int(Qt.AlignRight | Qt.AlignVCenter)
+            return int(Qt.AlignLeft | Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.columns[section] if section < len(self.columns) else None
+        return str(section + 1)
+
+    def reset(self, columns=()):
+        self.beginResetModel()
+        self.columns = list(columns)
+        self.rows = []
+        self.endResetModel()
+
+    def append(self, rows):
+        if not rows:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(rows) - 1)
+        self.rows.extend(rows)
+        self.endInsertRows()
+
+class Worksheet:
+    # One worksheet of a tab's spreadsheet. It only gets a model, and costs fetches, once it
+    # has been viewed; until then it is just a sheetId and a title.
+    def __init__(self, props):
+        self.sheet_id = props.get('sheetId', 0)
+        self.title = props.get('title', SHEET_TITLE)
+        self.model = None
+        self.grid_size = None
+        self.last_marker = None
+        self.polls_since_fetch = 0
+        self.last_snapshot = 0.0
+        self.snapshot_dirty = False
+        self.mirror = None
+        self.filter_model = None
+        self.last_viewed = 0.0
+
+    @property
+    def loaded(self):
+        return self.model is not None
+
+    def range(self, cells=None):
+        return a1_range(self.title, cells)
 
 class SheetTabWidget(QWidget):
-    def __init__(self, spreadsheet_id, credentials_path, parent=None):
+    def __init__(self, spreadsheet_id, credentials_path, worksheets=None, parent=None):
         super().__init__(parent)
         self.spreadsheet_id = spreadsheet_id
         self.credentials_path = credentials_path
@@ -46,24 +1210,55 @@ class SheetTabWidget(QWidget):
         self.build_row_operations()
         self.build_column_operations()
         self.build_cell_operations()
+        self.build_history_section()
         self.build_export_button()
 
         # Display panel
         self.sheet_data_group = QGroupBox("Sheet Data")
         self.sheet_data_layout = QVBoxLayout()
 
-        # Create tree widget before using it
-        self.sheet_tree = QTreeWidget()
-        self.sheet_tree.setUniformRowHeights(True)
-        self.sheet_tree.setAlternatingRowColors(True)
-        self.sheet_tree.setSelectionMode(QAbstractItemView.ExtendedSelection)
-        self.sheet_tree.setSelectionBehavior(QTreeWidget.SelectItems)
-        self.sheet_tree.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.sheet_tree.customContextMenuRequested.connect(self.open_context_menu)
-        self.sheet_tree.itemClicked.connect(self.handle_item_click)
+        # Filter bar; matching runs on per-column indexes of the loaded rows, not the API
+        filter_layout = QHBoxLayout()
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText('Filter rows, e.g.  smith   B=open   C>=100   D~acme   "Due date"=1..7   OR ...')
+        self.filter_edit.setClearButtonEnabled(True)
+        self.filter_status = QLabel("")
+        filter_layout.addWidget(self.filter_edit, 1)
+        filter_layout.addWidget(self.filter_status)
+        self.sheet_data_layout.addLayout(filter_layout)
+
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(FILTER_DELAY)
+        self.filter_timer.timeout.connect(self.apply_filter)
+        self.filter_edit.textChanged.connect(self.filter_timer.start)
+        self.filter_edit.returnPressed.connect(self.apply_filter)
+
+        # Create the table view before using it. Fixed row heights let the view
+        # lay out any number of rows without measuring them.
+        self.sheet_view = QTableView()
+        self.sheet_view.setWordWrap(False)
+        self.sheet_view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.sheet_view.setSelectionBehavior(QAbstractItemView.SelectItems)
+        self.sheet_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.sheet_view.verticalHeader().setDefaultSectionSize(24)
+        self.sheet_view.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.sheet_view.customContextMenuRequested.connect(self.open_context_menu)
+        self.sheet_view.clicked.connect(self.handle_item_click)
+        QShortcut(QKeySequence.Copy, self.sheet_view, self.copy_selection)
+        QShortcut(QKeySequence.Paste, self.sheet_view, self.paste_selection)
+        QShortcut(QKeySequence.Undo, self.sheet_view, self.undo)
+        QShortcut(QKeySequence.Redo, self.sheet_view, self.redo)
+
+        # One tab per worksheet under the table, like in Sheets itself
+        self.worksheet_bar = QTabBar()
+        self.worksheet_bar.setExpanding(False)
+        self.worksheet_bar.setUsesScrollButtons(True)
+        self.worksheet_bar.currentChanged.connect(self.on_worksheet_changed)
 
         # Add to layout once it's fully created
-        self.sheet_data_layout.addWidget(self.sheet_tree)
+        self.sheet_data_layout.addWidget(self.sheet_view)
+        self.sheet_data_layout.addWidget(self.worksheet_bar)
         self.sheet_data_group.setLayout(self.sheet_data_layout)
 
         # Add to main window layout
@@ -72,16 +1267,29 @@ class SheetTabWidget(QWidget):
 
         # Spreadsheet config
         self.service = self.get_service()
-
-        self.last_data = []
-        self.refresh_sheet_display()
-
-        # Timer-based auto-refresh
-        self.timer = QTimer()
-        self.sheet_tree.setAlternatingRowColors(True)
+        self.worker = ApiWorker(self)
+        self.change_detector = CHANGE_DETECTORS[CHANGE_DETECTION](self.credentials_path, self.spreadsheet_id)
+        self.mirror_path = None
+        self.sql_workspace = None
+        self.sql_label = None
+        # Edited cells not yet confirmed by the API: (sheet_id, row, column) -> (base, value).
+        # The model shows value; base is what the cell held when last fetched.
+        self.pending_cells = {}
+        self.mutations = MutationQueue(self.service, self.spreadsheet_id, self.worker, self)
+        self.mutations.flushed.connect(self.on_mutations_flushed)
+        self.mutations.failed.connect(self.on_mutations_failed)
+        self.journal = EditJournal(self)
+        self.journal.changed.connect(self.update_history_buttons)
+
+        # Worksheets are loaded lazily, the first time each one is shown
+        self.worksheets = [Worksheet(props) for props in worksheets or [{}]]
+        self.current = None
+        self.populate_worksheet_bar()
+        self.show_worksheet(self.worksheets[0])
+
+        # Auto-refresh is driven by MainWindow's RefreshScheduler through poll()
+        self.sheet_view.setAlternatingRowColors(True)
         self.apply_modern_style()
-        self.timer.timeout.connect(self.auto_refresh_loop)
-        self.timer.start(REFRESH_INTERVAL)
 
     def build_update_section(self):
         group = QGroupBox("Update Cell")
@@ -90,15 +1298,15 @@ class SheetTabWidget(QWidget):
         self.entry = QLineEdit()
         self.column_combo = QComboBox()
         self.column_combo.addItems([col_num_to_letter(i) for i in range(1, 27)])
-        self.row_combo = QComboBox()
-        self.row_combo.addItems([str(i) for i in range(1, 101)])
+        self.row_spin = QSpinBox()
+        self.row_spin.setRange(1, 100)
 
         layout.addWidget(QLabel("Enter new cell value:"))
         layout.addWidget(self.entry)
         layout.addWidget(QLabel("Select column:"))
         layout.addWidget(self.column_combo)
         layout.addWidget(QLabel("Select row:"))
-        layout.addWidget(self.row_combo)
+        layout.addWidget(self.row_spin)
 
         update_btn = QPushButton("Update Cell")
         update_btn.clicked.connect(self.update_sheet)
@@ -111,11 +1319,11 @@ class SheetTabWidget(QWidget):
         group = QGroupBox("Row Operations")
         layout = QVBoxLayout()
 
-        self.row_delete_combo = QComboBox()
-        self.row_delete_combo.addItems([str(i) for i in range(1, 101)])
+        self.row_delete_spin = QSpinBox()
+        self.row_delete_spin.setRange(1, 100)
 
         layout.addWidget(QLabel("Select row:"))
-        layout.addWidget(self.row_delete_combo)
+        layout.addWidget(self.row_delete_spin)
 
         clear_btn = QPushButton("Clear Row")
         clear_btn.clicked.connect(self.clear_row)
@@ -163,13 +1371,13 @@ class SheetTabWidget(QWidget):
 
         self.cell_op_col_combo = QComboBox()
         self.cell_op_col_combo.addItems([col_num_to_letter(i) for i in range(1, 27)])
-        self.cell_op_row_combo = QComboBox()
-        self.cell_op_row_combo.addItems([str(i) for i in range(1, 101)])
+        self.cell_op_row_spin = QSpinBox()
+        self.cell_op_row_spin.setRange(1, 100)
 
         layout.addWidget(QLabel("Select column:"))
         layout.addWidget(self.cell_op_col_combo)
         layout.addWidget(QLabel("Select row:"))
-        layout.addWidget(self.cell_op_row_combo)
+        layout.addWidget(self.cell_op_row_spin)
 
         clear_btn = QPushButton("Clear Cell")
         clear_btn.clicked.connect(self.clear_cell)
@@ -182,93 +1390,300 @@ class SheetTabWidget(QWidget):
         group.setLayout(layout)
         self.control_panel.addWidget(group)
 
+    def build_history_section(self):
+        group = QGroupBox("Edit History")
+        layout = QVBoxLayout()
+
+        self.undo_btn = QPushButton("Undo")
+        self.undo_btn.setEnabled(False)
+        self.undo_btn.clicked.connect(self.undo)
+        layout.addWidget(self.undo_btn)
+
+        self.redo_btn = QPushButton("Redo")
+        self.redo_btn.setEnabled(False)
+        self.redo_btn.clicked.connect(self.redo)
+        layout.addWidget(self.redo_btn)
+
+        group.setLayout(layout)
+        self.control_panel.addWidget(group)
+
     def build_export_button(self):
-        export_btn = QPushButton("Export to SQLite")
-        export_btn.clicked.connect(self.export_to_sqlite)
+        export_btn = QPushButton("Export...")
+        export_btn.clicked.connect(self.export_worksheet)
         self.control_panel.addWidget(export_btn)
+
+        self.mirror_check = QCheckBox("Keep SQLite mirror in sync")
+        self.mirror_check.toggled.connect(self.toggle_mirror)
+        self.control_panel.addWidget(self.mirror_check)
+
+        self.status_label = QLabel("")
+        self.control_panel.addWidget(self.status_label)
         
     def open_context_menu(self, pos):
-        item = self.sheet_tree.itemAt(pos)
-        if not item:
+        if not self.sheet_view.indexAt(pos).isValid():
             return
 
         menu = QMenu(self)
 
-        copy_cell_action = QAction("Copy Cell", self)
-        copy_row_action = QAction("Copy Row", self)
-        copy_col_action = QAction("Copy Column", self)
-        paste_cell_action = QAction("Paste into Cell", self)
+        copy_cell_action = QAction("Copy", self)
+        copy_row_action = QAction("Copy Rows", self)
+        copy_col_action = QAction("Copy Columns", self)
+        paste_cell_action = QAction("Paste", self)
+        copy_cell_action.setShortcut(QKeySequence.Copy)
+        paste_cell_action.setShortcut(QKeySequence.Paste)
 
-        copy_cell_action.triggered.connect(self.copy_cell)
+        copy_cell_action.triggered.connect(self.copy_selection)
         copy_row_action.triggered.connect(self.copy_row)
         copy_col_action.triggered.connect(self.copy_column)
-        paste_cell_action.triggered.connect(self.paste_cell)
+        paste_cell_action.triggered.connect(self.paste_selection)
+        undo_action = QAction(self.undo_btn.text(), self)
+        redo_action = QAction(self.redo_btn.text(), self)
+        undo_action.setShortcut(QKeySequence.Undo)
+        redo_action.setShortcut(QKeySequence.Redo)
+        undo_action.setEnabled(self.undo_btn.isEnabled())
+        redo_action.setEnabled(self.redo_btn.isEnabled())
+        undo_action.triggered.connect(self.undo)
+        redo_action.triggered.connect(self.redo)
 
         menu.addAction(copy_cell_action)
         menu.addAction(copy_row_action)
         menu.addAction(copy_col_action)
         menu.addSeparator()
         menu.addAction(paste_cell_action)
+        menu.addSeparator()
+        menu.addAction(undo_action)
+        menu.addAction(redo_action)
         menu.exec(QCursor.pos())
 
-    def handle_item_click(self, item, column):
-        if column == 0:
+    @property
+    def sheet_model(self):
+        return self.current.model
+
+    def populate_worksheet_bar(self):
+        self.worksheet_bar.blockSignals(True)
+        while self.worksheet_bar.count():
+            self.worksheet_bar.removeTab(0)
+        for ws in self.worksheets:
+            self.worksheet_bar.addTab(ws.title)
+        if self.current in self.worksheets:
+            self.worksheet_bar.setCurrentIndex(self.worksheets.index(self.current))
+        self.worksheet_bar.blockSignals(False)
+
+    def on_worksheet_changed(self, index):
+        if 0 <= index < len(self.worksheets):
+            self.show_worksheet(self.worksheets[index])
+
+    def show_worksheet(self, ws):
+        self.current = ws
+        ws.last_viewed = time.monotonic()
+        self.last_selected_row = None
+        self.last_selected_col = None
+        if not ws.loaded:
+            ws.model = SheetTableModel(self)
+            self.load_from_cache(ws)
+            self.unload_idle_worksheets()
+        self.apply_filter()
+        if ws.grid_size is not None:
+            self.update_grid_limits(*ws.grid_size)
+        if self.mirror_path and ws.mirror is None:
+            try:
+                self.open_mirror(ws)
+            except Exception as e:
+                self.status_label.setText(f"Failed to mirror {ws.title}: {e}")
+        # The scheduler polls the visible tab every REFRESH_INTERVAL, which also brings an
+        # already loaded worksheet up to date if the spreadsheet changed while it was hidden
+
+    def unload_idle_worksheets(self):
+        # Keep at most MAX_LOADED_WORKSHEETS models; their snapshots stay in the cache
+        idle = sorted(
+            (ws for ws in self.worksheets if ws.loaded and ws is not self.current),
+            key=lambda ws: ws.last_viewed
+        )
+        while idle and len(idle) >= MAX_LOADED_WORKSHEETS:
+            self.unload_worksheet(idle.pop(0))
+
+    def unload_worksheet(self, ws):
+        self.save_snapshot(ws)
+        if ws.mirror is not None:
+            self.worker.submit(ws.mirror.close)
+            ws.mirror = None
+        if self.sql_workspace is not None:
+            self.sql_workspace.drop((self, ws.sheet_id))
+        # Jobs still in flight for the old model see ws.model change and drop their results
+        ws.model.deleteLater()
+        ws.model = None
+        ws.filter_model = None
+        ws.grid_size = None
+        ws.last_marker = None
+
+    def sync_worksheets(self, sheets):
+        # Follow worksheets being added, renamed, moved or deleted in the spreadsheet
+        if not sheets:
+            return
+        known = {ws.sheet_id: ws for ws in self.worksheets}
+        worksheets = []
+        for props in sheets:
+            ws = known.pop(props.get('sheetId', 0), None) or Worksheet(props)
+            ws.title = props.get('title', ws.title)
+            worksheets.append(ws)
+        layout = [(ws.sheet_id, ws.title) for ws in worksheets]
+        if layout == [(ws.sheet_id, ws.title) for ws in self.worksheets]:
+            return
+        for ws in known.values():
+            if ws.loaded:
+                self.unload_worksheet(ws)
+        self.worksheets = worksheets
+        self.populate_worksheet_bar()
+        for ws in worksheets:
+            if ws.loaded:
+                self.publish_sql(ws)  # picks up renames
+        if self.current not in worksheets:
+            self.show_worksheet(worksheets[0])
+
+    def apply_filter(self):
+        self.filter_timer.stop()
+        ws = self.current
+        text = self.filter_edit.text().strip()
+        if not text:
+            self.sheet_view.setModel(ws.model)
+            self.filter_status.setText("")
             return
-        self.last_selected_row = self.sheet_tree.indexOfTopLevelItem(item)
-        self.last_selected_col = column
-        self.sheet_tree.clearSelection()
-        item.setSelected(True)
+        if ws.filter_model is None:
+            ws.filter_model = FilterProxyModel(ws.model, ws.model)
+            ws.filter_model.modelReset.connect(lambda ws=ws: self.show_filter_status(ws))
+        started = time.perf_counter()
+        try:
+            ws.filter_model.set_filter(text)
+        except ValueError as e:
+            self.filter_status.setText(f"Bad filter: {e}")
+            return
+        elapsed = (time.perf_counter() - started) * 1000
+        if self.sheet_view.model() is not ws.filter_model:
+            self.sheet_view.setModel(ws.filter_model)
+        self.show_filter_status(ws, elapsed)
 
-    def copy_cell(self):
-        if self.last_selected_row is not None and self.last_selected_col is not None:
-            if self.last_selected_col == 0:
-                QMessageBox.warning(self, "Warning", "Row number column can't be copied.")
-                return
-            item = self.sheet_tree.topLevelItem(self.last_selected_row)
-            value = item.text(self.last_selected_col)
-            self.clipboard.setText(value)
-
-    def paste_cell(self):
-        if self.last_selected_row is not None and self.last_selected_col is not None:
-            if self.last_selected_col == 0:
-                QMessageBox.warning(self, "Warning", "Can't paste into row number column.")
-                return
-            value = self.clipboard.text()
-            item = self.sheet_tree.topLevelItem(self.last_selected_row)
-            item.setText(self.last_selected_col, value)
-            self.update_cell_in_sheet(self.last_selected_row, self.last_selected_col, value)
+    def show_filter_status(self, ws, elapsed=None):
+        if ws is not self.current or ws.filter_model is None:
+            return
+        status = f"{ws.filter_model.rowCount()} of {ws.model.rowCount()} rows"
+        self.filter_status.setText(status if elapsed is None else f"{status} ({elapsed:.0f} ms)")
+
+    def handle_item_click(self, index):
+        # Columns are tracked 1-based to match sheet column letters; rows are sheet rows
+        # even while the view is filtered
+        self.last_selected_row = self.sheet_view.model().source_row(index.row())
+        self.last_selected_col = index.column() + 1
+
+    def selected_cells(self):
+        # (sheet row, column) of every selected cell, or of the last clicked one
+        model = self.sheet_view.model()
+        selection = self.sheet_view.selectionModel()
+        cells = [
+            (model.source_row(index.row()), index.column())
+            for index in (selection.selectedIndexes() if selection is not None else [])
+        ]
+        if not cells and self.last_selected_row is not None and self.last_selected_col is not None:
+            cells = [(self.last_selected_row, self.last_selected_col - 1)]
+        return cells
+
+    def copy_block(self, rows, columns):
+        store = self.sheet_model.store
+        self.clipboard.setText(format_tsv(
+            [store.cell(r, c) for c in columns] for r in rows
+        ))
+
+    def copy_selection(self):
+        # The selection's bounding box as TSV; while filtered only the rows on screen are copied
+        cells = self.selected_cells()
+        if cells:
+            columns = [c for _, c in cells]
+            self.copy_block(sorted({r for r, _ in cells}), range(min(columns), max(columns) + 1))
 
     def copy_row(self):
-        if self.last_selected_row is not None:
-            item = self.sheet_tree.topLevelItem(self.last_selected_row)
-            values = [item.text(i) for i in range(item.columnCount())]
-            self.clipboard.setText('\t'.join(values))
+        cells = self.selected_cells()
+        if cells:
+            self.copy_block(sorted({r for r, _ in cells}), range(self.sheet_model.store.column_count))
 
     def copy_column(self):
-        if self.last_selected_col is not None:
-            if self.last_selected_col == 0:
-                QMessageBox.warning(self, "Warning", "Can't copy row number column.")
-                return
-            values = []
-            for i in range(self.sheet_tree.topLevelItemCount()):
-                item = self.sheet_tree.topLevelItem(i)
-                values.append(item.text(self.last_selected_col))
-            self.clipboard.setText('\n'.join(values))
-    
-    def update_cell_in_sheet(self, row_idx, col_idx, new_value):
-        col_letter = col_num_to_letter(col_idx)
-        cell_ref = f"Sheet1!{col_letter}{row_idx + 1}"
-        body = {'values': [[new_value]]}
-        try:
-            self.service.spreadsheets().values().update(
+        cells = self.selected_cells()
+        if cells:
+            columns = sorted({c for _, c in cells})
+            self.copy_block(range(self.sheet_model.store.row_count), columns)
+
+    def paste_selection(self):
+        # Pastes the clipboard's TSV block with its top-left at the selection's top-left, into
+        # consecutive sheet rows. A single value fills the whole selection, as in Sheets.
+        cells = self.selected_cells()
+        block = parse_tsv(self.clipboard.text())
+        if not cells or not block:
+            return
+        top = min(r for r, _ in cells)
+        left = min(c for _, c in cells)
+        if len(block) == 1 and len(block[0]) == 1 and len(cells) > 1:
+            height = max(r for r, _ in cells) - top + 1
+            width = max(c for _, c in cells) - left + 1
+            block = [block[0] * width for _ in range(height)]
+        width = max(len(row) for row in block)
+        block = [row + [''] * (width - len(row)) for row in block]
+        self.paste_block(self.current, top, left, block)
+
+    def grow_grid_requests(self, ws, bottom, right):
+        # appendDimension requests so the worksheet's grid reaches `bottom` rows, `right` columns
+        if ws.grid_size is None:
+            return []
+        grid_rows, grid_cols = ws.grid_size
+        requests = []
+        for dimension, have, need in (("ROWS", grid_rows, bottom), ("COLUMNS", grid_cols, right)):
+            if need > have:
+                requests.append({"appendDimension": {
+                    "sheetId": ws.sheet_id, "dimension": dimension, "length": need - have
+                }})
+        ws.grid_size = [max(grid_rows, bottom), max(grid_cols, right)]
+        return requests
+
+    def paste_block(self, ws, top, left, block):
+        # A block of up to PASTE_CHUNK_CELLS cells joins the other queued edits as one range;
+        # a larger one goes out in PASTE_CHUNK_CELLS-sized values.update calls, after the queue,
+        # without the conflict check
+        width = len(block[0])
+        grow = self.grow_grid_requests(ws, top + len(block), left + width)
+        cells = block_cells(top, left, len(block), width)
+        old = self.cached_block(ws, top, left, len(block), width)
+        kept = self.record_value_step(ws, ValueStep(f"paste {cells}", ws.sheet_id, top, left, old, block))
+        tag = self.apply_local_edit(ws, top, left, block)
+        if len(block) * width <= PASTE_CHUNK_CELLS:
+            for request in grow:
+                self.mutations.structural(request)
+            self.mutations.write(ws.range(cells), block, tag[3], tag, kept)
+            self.show_pending_changes()
+            return
+        self.mutations.flush()
+        cells = len(block) * width
+        self.status_label.setText(f"Pasting {cells} cells...")
+        self.worker.submit(
+            lambda report: self.send_block(ws, top, left, block, grow, report),
+            lambda _: self.on_mutations_flushed(cells, ([tag], [], False, [])),
+            lambda e: self.on_mutations_failed(e, [tag]),
+            on_progress=lambda sent: self.status_label.setText(f"Pasting... {sent * width} of {cells} cells sent")
+        )
+
+    def send_block(self, ws, top, left, block, grow, report):
+        # Runs on the worker; reports the number of rows sent after every call
+        spreadsheets = self.service.spreadsheets()
+        if grow:
+            spreadsheets.batchUpdate(spreadsheetId=self.spreadsheet_id, body={"requests": grow}).execute()
+        width = len(block[0])
+        chunk = max(1, PASTE_CHUNK_CELLS // width)
+        for start in range(0, len(block), chunk):
+            rows = block[start:start + chunk]
+            spreadsheets.values().update(
                 spreadsheetId=self.spreadsheet_id,
-                range=cell_ref,
-                valueInputOption='USER_ENTERED',
-                body=body
+                range=ws.range(block_cells(top + start, left, len(rows), width)),
+                valueInputOption="USER_ENTERED",
+                body={"values": rows}
             ).execute()
-        except Exception as e:
-            QMessageBox.critical(self, "Update Error", f"Failed to update cell {cell_ref}: {e}")
-        
+            report(start + len(rows))
+
     def apply_modern_style(self):
         self.setStyleSheet("""
             QWidget {
@@ -303,19 +1718,19 @@ class SheetTabWidget(QWidget):
                 background-color: #dcdcdc;
             }
 
-            QLineEdit, QComboBox {
+            QLineEdit, QComboBox, QSpinBox {
                 border: 1px solid #ccc;
                 border-radius: 4px;
                 padding: 4px;
             }
 
-            QTreeWidget {
+            QTableView {
                 background-color: #ffffff;
                 alternate-background-color: #f5f5f5;
                 border: 1px solid #ccc;
+                gridline-color: #e0e0e0;
                 selection-background-color: #0078d7;  /* bright blue */
                 selection-color: #ffffff;             /* white text on selection */
-                show-decoration-selected: 1;
             }
 
             QHeaderView::section {
@@ -326,285 +1741,842 @@ class SheetTabWidget(QWidget):
         """)
 
     def get_service(self):
-        creds = None
-        token_path = os.path.join(os.path.dirname(self.credentials_path), 'token.json')
-        if os.path.exists(token_path):
-            creds = Credentials.from_authorized_user_file(token_path, SCOPES)
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, SCOPES)
-                creds = flow.run_local_server(port=0)
-            with open(token_path, 'w') as token:
-                token.write(creds.to_json())
-        return build('sheets', 'v4', credentials=creds)
-
-    def fetch_sheet_data(self):
-        result = self.service.spreadsheets().values().get(
-            spreadsheetId=self.spreadsheet_id,
-            range='Sheet1!A1:Z100'
-        ).execute()
-        return result.get('values', [])
-
-    def auto_refresh_loop(self):
-        try:
-            new_data = self.fetch_sheet_data()
-            if new_data != self.last_data:
-                self.refresh_sheet_display()
-        except Exception:
-            pass
+        # Looked up on gsdbe_core each time, so a swapped registry (fake_sheets) is seen
+        return gsdbe_core.SERVICES.get_service(self.credentials_path)
+
+    def fetch_sheet_data(self, ws, report):
+        # Runs on the worker; each page goes to report() so the view fills in while the rest
+        # downloads
+        return fetch_worksheet_data(
+            self.service, self.spreadsheet_id, ws.sheet_id, ws.title,
+            lambda start, rows: report((start, page_columns(rows), len(rows), FETCH_PAGE_ROWS))
+        )
+
+    def fetch_if_changed(self, ws, report, force=False):
+        # Runs on the worker: ask the change detector first and only pull the values when the
+        # marker moved (or every FULL_FETCH_EVERY polls, in case the detector missed something).
+        # Returns None when nothing changed, else (marker, extent of the fetched data).
+        marker = self.change_detector.marker(ws.title)
+        ws.polls_since_fetch += 1
+        if (not force and marker is not None and marker == ws.last_marker
+                and ws.polls_since_fetch < FULL_FETCH_EVERY):
+            return None
+        report(None)
+        return marker, self.fetch_sheet_data(ws, report)
+
+    def submit_fetch(self, ws, on_result, on_error, force=False):
+        # Pages and the result are applied to the model the fetch was started for; if the
+        # worksheet was unloaded meanwhile they are dropped
+        model = ws.model
+        return self.worker.submit(
+            lambda report: self.fetch_if_changed(ws, report, force),
+            lambda result: on_result(self.apply_fetch_result(ws, model, result)),
+            on_error,
+            key=("fetch", ws.sheet_id),
+            on_progress=lambda page: self.apply_fetched_page(ws, model, page)
+        )
+
+    def apply_fetched_page(self, ws, model, page):
+        # None marks the start of a full fetch; pages follow in sheet order
+        if ws.model is not model:
+            return
+        if page is None:
+            model.begin_fetch()
+        else:
+            model.apply_page(*page)
+            start, _, length, window = page
+            self.overlay_pending(ws, start, start + min(length, window))
+
+    def apply_fetch_result(self, ws, model, result):
+        if result is None or ws.model is not model:
+            return False
+        ws.last_marker, (data_rows, width, grid_rows, grid_cols, sheets) = result
+        ws.polls_since_fetch = 0
+        ws.grid_size = [grid_rows, grid_cols]
+        if ws is self.current:
+            self.update_grid_limits(grid_rows, grid_cols)
+        changed = model.finish_fetch(data_rows, width)
+        self.overlay_pending(ws)
+        if changed and ws.mirror is not None:
+            self.sync_mirror(ws, model.dirty_rows)
+        if changed:
+            self.publish_sql(ws, model.dirty_rows)
+        ws.snapshot_dirty = True
+        if time.time() - ws.last_snapshot >= CACHE_SAVE_INTERVAL:
+            self.save_snapshot(ws)
+        self.sync_worksheets(sheets)
+        return changed
+
+    def load_from_cache(self, ws):
+        # Render the worksheet's last snapshot straight away and reconcile with the API in the
+        # background
+        model = ws.model
+        self.worker.submit(
+            lambda: self.load_snapshot(ws),
+            lambda snapshot: self.on_cache_loaded(ws, model, snapshot),
+            lambda e: self.refresh_sheet_display(ws)
+        )
+
+    def load_snapshot(self, ws):
+        # Runs on the worker: the snapshot with its rows already transposed for the model
+        snapshot = snapshot_cache().load(self.spreadsheet_id, ws.sheet_id)
+        if snapshot is not None:
+            rows = snapshot.pop('rows')
+            snapshot['columns'], snapshot['length'] = page_columns(rows), len(rows)
+        return snapshot
+
+    def on_cache_loaded(self, ws, model, snapshot):
+        if ws.model is not model:
+            return
+        if snapshot is None:
+            self.refresh_sheet_display(ws)
+            return
+        model.apply_grid(snapshot['columns'], snapshot['length'])
+        ws.grid_size = snapshot['grid']
+        if ws is self.current:
+            self.update_grid_limits(*ws.grid_size)
+            fetched = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snapshot['fetched_at']))
+            self.status_label.setText(f"Showing cached data from {fetched}.")
+        if ws.mirror is not None:
+            self.sync_mirror(ws, range(model.store.row_count))
+        self.publish_sql(ws)
+        if time.time() - snapshot['fetched_at'] <= CACHE_MAX_STALENESS:
+            # Recent enough: the first poll only pulls values if the sheet changed since
+            ws.last_marker = snapshot['marker']
+        else:
+            self.refresh_sheet_display(ws)
 
-    def refresh_sheet_display(self):
+    def save_snapshot(self, ws):
+        if not ws.snapshot_dirty or ws.grid_size is None:
+            return
+        ws.snapshot_dirty = False
+        ws.last_snapshot = time.time()
+        # Only the column lists are copied here; the worker turns them into rows
+        store = ws.model.store.copy()
+        grid, marker, fetched_at = ws.grid_size, ws.last_marker, ws.last_snapshot
+        self.worker.submit(
+            lambda: snapshot_cache().save(self.spreadsheet_id, ws.sheet_id, store.rows(), grid, marker, fetched_at),
+            on_error=lambda e: print(f"Failed to save snapshot of {self.spreadsheet_id}/{ws.title}: {e}")
+        )
+
+    def toggle_mirror(self, enabled):
+        if not enabled:
+            for ws in self.worksheets:
+                if ws.mirror is not None:
+                    self.worker.submit(ws.mirror.close)
+                    ws.mirror = None
+            if self.mirror_path:
+                self.mirror_path = None
+                self.status_label.setText("SQLite mirror stopped.")
+            return
+        db_path, _ = QFileDialog.getSaveFileName(
+            self, "Mirror To", f"{self.spreadsheet_id}_mirror.db", "SQLite Database (*.db)"
+        )
+        if not db_path:
+            self.mirror_check.setChecked(False)
+            return
         try:
-            data = self.fetch_sheet_data()
-            self.last_data = data
-
-            self.sheet_tree.clear()
-            max_cols = max((len(row) for row in data), default=0)
-            headers = ["Row"] + [col_num_to_letter(i) for i in range(1, max_cols + 1)]
-            self.sheet_tree.setHeaderLabels(headers)
-
-            for idx, row in enumerate(data, start=1):
-                display_row = [str(idx)] + row + [''] * (max_cols - len(row))
-                row_item = QTreeWidgetItem(display_row)
-
-                # This part must be INSIDE the loop!
-                for col in range(len(display_row)):
-                    row_item.setTextAlignment(col, Qt.AlignLeft)
-                    row_item.setFlags(row_item.flags() | Qt.ItemIsSelectable | Qt.ItemIsEnabled)
-
-                self.sheet_tree.addTopLevelItem(row_item)
-
-            print(f"Loaded {self.sheet_tree.topLevelItemCount()} rows")
-
+            self.mirror_path = db_path
+            self.open_mirror(self.current)
         except Exception as e:
-            QMessageBox.critical(self, "Display Error", f"Failed to fetch sheet data: {e}")
+            self.mirror_path = None
+            QMessageBox.critical(self, "Mirror Error", f"Failed to open SQLite mirror:\n{e}")
+            self.mirror_check.setChecked(False)
+
+    def open_mirror(self, ws):
+        # Each worksheet mirrors into its own table once it has been viewed. The first sync
+        # offers every row; the row hashes skip the ones already mirrored.
+        ws.mirror = SqliteMirror(
+            self.mirror_path, self.spreadsheet_id, ws.title, table=f"sheet_rows_{ws.sheet_id}"
+        )
+        self.sync_mirror(ws, range(ws.model.store.row_count))
+
+    def sync_mirror(self, ws, row_indexes):
+        store = ws.model.store
+        rows = [(r, store.row(r)) for r in sorted(row_indexes) if r < store.row_count]
+        mirror, row_count = ws.mirror, store.row_count
+        self.worker.submit(
+            lambda: mirror.apply(rows, row_count),
+            lambda written: self.status_label.setText(f"Mirror of {ws.title} synced ({written} row(s) written)."),
+            lambda e: self.status_label.setText(f"Mirror sync failed: {e}")
+        )
+
+    def attach_sql(self, workspace, label):
+        # From now on every loaded worksheet is a table in the SQL console's database
+        self.sql_workspace = workspace
+        self.sql_label = label
+        for ws in self.worksheets:
+            if ws.loaded:
+                self.publish_sql(ws)
+
+    def publish_sql(self, ws, dirty_rows=None):
+        if self.sql_workspace is not None and ws.loaded:
+            self.sql_workspace.publish(
+                (self, ws.sheet_id), f"{self.sql_label} {ws.title}", ws.model.store, dirty_rows
+            )
+
+    def update_grid_limits(self, grid_rows, grid_cols):
+        for spin in (self.row_spin, self.row_delete_spin, self.cell_op_row_spin):
+            spin.setMaximum(max(1, grid_rows))
+        letters = [col_num_to_letter(i) for i in range(1, max(1, grid_cols) + 1)]
+        for combo in (self.column_combo, self.column_delete_combo, self.cell_op_col_combo):
+            if combo.count() != len(letters):
+                current = combo.currentText()
+                combo.clear()
+                combo.addItems(letters)
+                combo.setCurrentIndex(max(0, combo.findText(current)))
+
+    def poll(self, on_done):
+        # Called by the RefreshScheduler for the worksheet on screen; hidden worksheets are
+        # not polled. Returns False when no poll was started: while edits are queued the sheet
+        # is about to change anyway, and polls share the worksheet's "fetch" key so a slow API
+        # never lets them pile up. on_done(tab, changed, error) reports the outcome.
+        if self.mutations.has_pending():
+            return False
+        return self.submit_fetch(
+            self.current,
+            lambda changed: on_done(self, changed, None),
+            lambda e: on_done(self, False, e)
+        )
+
+    def refresh_sheet_display(self, ws=None):
+        ws = ws or self.current
+        self.submit_fetch(
+            ws,
+            lambda changed: self.on_sheet_data_loaded(ws),
+            lambda e: self.on_refresh_failed(ws, e),
+            force=True
+        )
+
+    def on_refresh_failed(self, ws, error):
+        if ws.loaded and ws.model.rowCount():
+            # Keep working from the cached values while the API is unreachable
+            self.status_label.setText(f"Offline, showing cached data: {error}")
+        elif ws is self.current:
+            QMessageBox.critical(self, "Display Error", f"Failed to fetch sheet data: {error}")
+
+    def on_sheet_data_loaded(self, ws):
+        if ws.loaded:
+            print(f"Loaded {ws.model.rowCount()} rows of {ws.title}")
 
     def update_sheet(self):
         new_value = self.entry.text().strip()
         if not new_value:
             QMessageBox.critical(self, "Input Error", "Please enter a value to update.")
             return
-        selected_column = self.column_combo.currentText()
-        selected_row = self.row_combo.currentText()
-        cell_address = f"{selected_column}{selected_row}"
-        update_range = f"Sheet1!{cell_address}"
-        values = [[new_value]]
-        body = {'values': values}
-        try:
-            result = self.service.spreadsheets().values().update(
-                spreadsheetId=self.spreadsheet_id,
-                range=update_range,
-                valueInputOption='USER_ENTERED',
-                body=body
-            ).execute()
-            updated_cells = result.get('updatedCells')
-            QMessageBox.information(self, "Success", f"{updated_cells} cell(s) updated at {cell_address}.")
-            self.refresh_sheet_display()
-        except Exception as e:
-            QMessageBox.critical(self, "Update Error", f"An error occurred: {e}")
+        row = self.row_spin.value() - 1
+        col = col_letter_to_num(self.column_combo.currentText()) - 1
+        self.edit_block(self.current, row, col, [[new_value]], f"update {col_num_to_letter(col + 1)}{row + 1}")
 
-    def export_to_sqlite(self):
-        data = self.last_data
-        if not data:
+    def export_worksheet(self):
+        if not self.sheet_model.rowCount():
             QMessageBox.critical(self, "Export Error", "No data to export.")
             return
 
-        db_path, _ = QFileDialog.getSaveFileName(self, "Save As", "gsdbe_export.db", "SQLite Database (*.db)")
-        if not db_path:
+        path, selected = QFileDialog.getSaveFileName(
+            self, "Save As", "gsdbe_export.db", ";;".join(EXPORT_FILTERS)
+        )
+        if not path:
             return
+        export_format = EXPORT_FILTERS.get(selected, 'sqlite')
+        if export_format in ('parquet', 'arrow'):
+            try:
+                import_pyarrow()
+            except ImportError as e:
+                QMessageBox.critical(self, "Export Error", str(e))
+                return
 
-        try:
-            conn = sqlite3.connect(db_path)
-            c = conn.cursor()
-
-            max_cols = max(len(row) for row in data)
-            if len(data[0]) == max_cols and all(cell.strip() != '' for cell in data[0]):
-                headers = [cell.strip().replace(" ", "_") or f"col{i+1}" for i, cell in enumerate(data[0])]
-                rows = data[1:]
-            else:
-                headers = [f"col{i+1}" for i in range(max_cols)]
-                rows = data
-
-            c.execute("DROP TABLE IF EXISTS sheet_data")
-            col_defs = ', '.join([f'"{col}" TEXT' for col in headers])
-            c.execute(f"CREATE TABLE sheet_data ({col_defs})")
-
-            for row in rows:
-                padded_row = row + [''] * (max_cols - len(row))
-                c.execute(f"INSERT INTO sheet_data VALUES ({','.join('?' * max_cols)})", padded_row)
-
-            conn.commit()
-            conn.close()
-            QMessageBox.information(self, "Success", f"Data exported to:\n{db_path}")
-        except Exception as e:
-            QMessageBox.critical(self, "Export Error", f"Failed to export to SQLite:\n{e}")
+        # Pages of the current worksheet go straight from the API into the file on the worker,
+        # with unformatted values so numbers land in typed columns
+        ws = self.current
+        def export(report):
+            props = find_worksheet(fetch_worksheets(self.service, self.spreadsheet_id), ws.sheet_id)
+            grid_rows, _ = worksheet_grid(props)
+            pages = iter_sheet_pages(
+                self.service, self.spreadsheet_id, grid_rows, props.get('title', ws.title),
+                value_render_option='UNFORMATTED_VALUE'
+            )
+            exporter = EXPORTERS[export_format](path)
+            export_pages(pages, [exporter], report)
+            return exporter
+
+        def on_done(exporter):
+            status = f"Exported {exporter.written} rows."
+            if exporter.dropped:
+                status += f" {exporter.dropped} cell(s) right of the first page's columns were left out."
+            if getattr(exporter, 'rejected', 0):
+                status += f" {exporter.rejected} value(s) didn't fit their column's type and were written as null."
+            self.status_label.setText(status)
+            QMessageBox.information(self, "Success", f"Data exported to:\n{path}")
+
+        self.status_label.setText("Exporting...")
+        self.worker.submit(
+            export, on_done,
+            lambda e: QMessageBox.critical(self, "Export Error", f"Failed to export:\n{e}"),
+            on_progress=lambda written: self.status_label.setText(f"Exporting... {written} rows written")
+        )
 
     def add_row(self):
-        try:
-            row_index = int(self.row_delete_combo.currentText()) - 1
-            body = {
-                "requests": [{
-                    "insertDimension": {
-                        "range": {
-                            "sheetId": 0,
-                            "dimension": "ROWS",
-                            "startIndex": row_index,
-                            "endIndex": row_index + 1
-                        },
-                        "inheritFromBefore": False
-                    }
-                }]
+        row_index = self.row_delete_spin.value() - 1
+        self.journal.record(DimensionStep(f"add row {row_index + 1}", self.current.sheet_id, "ROWS", row_index, True))
+        self.mutations.structural({
+            "insertDimension": {
+                "range": {
+                    "sheetId": self.current.sheet_id,
+                    "dimension": "ROWS",
+                    "startIndex": row_index,
+                    "endIndex": row_index + 1
+                },
+                "inheritFromBefore": False
             }
-            self.service.spreadsheets().batchUpdate(
-                spreadsheetId=self.spreadsheet_id,
-                body=body
-            ).execute()
-            QMessageBox.information(self, "Success", f"Blank row inserted before row {row_index + 1}.")
-            self.refresh_sheet_display()
-        except Exception as e:
-            QMessageBox.critical(self, "Add Error", f"Failed to insert row: {e}")
+        })
+        self.show_pending_changes()
 
     def add_column(self):
-        try:
-            col_index = ord(self.column_delete_combo.currentText().upper()) - ord('A')
-            body = {
-                "requests": [{
-                    "insertDimension": {
-                        "range": {
-                            "sheetId": 0,
-                            "dimension": "COLUMNS",
-                            "startIndex": col_index,
-                            "endIndex": col_index + 1
-                        },
-                        "inheritFromBefore": False
-                    }
-                }]
+        col = self.column_delete_combo.currentText()
+        col_index = col_letter_to_num(col) - 1
+        self.journal.record(DimensionStep(f"add column {col}", self.current.sheet_id, "COLUMNS", col_index, True))
+        self.mutations.structural({
+            "insertDimension": {
+                "range": {
+                    "sheetId": self.current.sheet_id,
+                    "dimension": "COLUMNS",
+                    "startIndex": col_index,
+                    "endIndex": col_index + 1
+                },
+                "inheritFromBefore": False
             }
-            self.service.spreadsheets().batchUpdate(
-                spreadsheetId=self.spreadsheet_id,
-                body=body
-            ).execute()
-            QMessageBox.information(self, "Success", f"Blank column inserted before column {self.column_delete_combo.currentText()}.")
-            self.refresh_sheet_display()
-        except Exception as e:
-            QMessageBox.critical(self, "Add Error", f"Failed to insert column: {e}")
+        })
+        self.show_pending_changes()
 
     def clear_row(self):
-        row = self.row_delete_combo.currentText()
-        try:
-            self.service.spreadsheets().values().clear(
-                spreadsheetId=self.spreadsheet_id,
-                range=f"Sheet1!A{row}:Z{row}"
-            ).execute()
-            QMessageBox.information(self, "Success", f"Row {row} cleared.")
-            self.refresh_sheet_display()
-        except Exception as e:
-            QMessageBox.critical(self, "Clear Error", f"Failed to clear row: {e}")
+        row = self.row_delete_spin.value()
+        width = self.sheet_model.store.column_count
+        self.edit_block(
+            self.current, row - 1, 0, [[''] * width], f"clear row {row}", self.current.range(f"{row}:{row}")
+        )
 
     def clear_column(self):
         col = self.column_delete_combo.currentText()
-        try:
-            self.service.spreadsheets().values().clear(
-                spreadsheetId=self.spreadsheet_id,
-                range=f"Sheet1!{col}:{col}"
-            ).execute()
-            QMessageBox.information(self, "Success", f"Column {col} cleared.")
-            self.refresh_sheet_display()
-        except Exception as e:
-            QMessageBox.critical(self, "Clear Error", f"Failed to clear column: {e}")
+        rows = self.sheet_model.store.row_count
+        self.edit_block(
+            self.current, 0, col_letter_to_num(col) - 1, [['']] * rows, f"clear column {col}", self.current.range(f"{col}:{col}")
+        )
 
     def delete_row(self):
-        try:
-            row_index = int(self.row_delete_combo.currentText()) - 1
-            body = {
-                "requests": [{
-                    "deleteDimension": {
-                        "range": {
-                            "sheetId": 0,
-                            "dimension": "ROWS",
-                            "startIndex": row_index,
-                            "endIndex": row_index + 1
-                        }
-                    }
-                }]
+        row_index = self.row_delete_spin.value() - 1
+        store = self.sheet_model.store
+        removed = store.row(row_index) if row_index < store.row_count else []
+        self.journal.record(DimensionStep(
+            f"delete row {row_index + 1}", self.current.sheet_id, "ROWS", row_index, False, removed
+        ))
+        self.mutations.structural({
+            "deleteDimension": {
+                "range": {
+                    "sheetId": self.current.sheet_id,
+                    "dimension": "ROWS",
+                    "startIndex": row_index,
+                    "endIndex": row_index + 1
+                }
             }
-            self.service.spreadsheets().batchUpdate(
-                spreadsheetId=self.spreadsheet_id,
-                body=body
-            ).execute()
-            QMessageBox.information(self, "Success", f"Row {row_index + 1} deleted.")
-            self.refresh_sheet_display()
-        except Exception as e:
-            QMessageBox.critical(self, "Delete Error", f"Failed to delete row: {e}")
+        })
+        self.show_pending_changes()
 
     def delete_column(self):
-        try:
-            col_index = ord(self.column_delete_combo.currentText().upper()) - ord('A')
-            body = {
-                "requests": [{
-                    "deleteDimension": {
-                        "range": {
-                            "sheetId": 0,
-                            "dimension": "COLUMNS",
-                            "startIndex": col_index,
-                            "endIndex": col_index + 1
-                        }
-                    }
-                }]
+        col = self.column_delete_combo.currentText()
+        col_index = col_letter_to_num(col) - 1
+        store = self.sheet_model.store
+        removed = [store.cell(r, col_index) for r in range(store.row_count)] if col_index < store.column_count else []
+        self.journal.record(DimensionStep(
+            f"delete column {col}", self.current.sheet_id, "COLUMNS", col_index, False, removed
+        ))
+        self.mutations.structural({
+            "deleteDimension": {
+                "range": {
+                    "sheetId": self.current.sheet_id,
+                    "dimension": "COLUMNS",
+                    "startIndex": col_index,
+                    "endIndex": col_index + 1
+                }
             }
-            self.service.spreadsheets().batchUpdate(
-                spreadsheetId=self.spreadsheet_id,
-                body=body
-            ).execute()
-            QMessageBox.information(self, "Success", f"Column {self.column_delete_combo.currentText()} deleted.")
-            self.refresh_sheet_display()
-        except Exception as e:
-            QMessageBox.critical(self, "Delete Error", f"Failed to delete column: {e}")
+        })
+        self.show_pending_changes()
 
     def clear_cell(self):
         col = self.cell_op_col_combo.currentText()
-        row = self.cell_op_row_combo.currentText()
-        try:
-            self.service.spreadsheets().values().clear(
-                spreadsheetId=self.spreadsheet_id,
-                range=f"Sheet1!{col}{row}"
-            ).execute()
-            QMessageBox.information(self, "Success", f"Cell {col}{row} cleared.")
-            self.refresh_sheet_display()
-        except Exception as e:
-            QMessageBox.critical(self, "Clear Error", f"Failed to clear cell: {e}")
+        row = self.cell_op_row_spin.value()
+        self.edit_block(
+            self.current, row - 1, col_letter_to_num(col) - 1, [['']], f"clear {col}{row}", self.current.range(f"{col}{row}")
+        )
 
     def delete_cell(self):
-        try:
-            col = self.cell_op_col_combo.currentText()
-            row = self.cell_op_row_combo.currentText()
-            col_index = ord(col.upper()) - ord('A')
-            row_index = int(row) - 1
-            body = {
-                "requests": [{
-                    "deleteRange": {
-                        "range": {
-                            "sheetId": 0,
-                            "startRowIndex": row_index,
-                            "endRowIndex": row_index + 1,
-                            "startColumnIndex": col_index,
-                            "endColumnIndex": col_index + 1,
-                        },
-                        "shiftDimension": "ROWS"
-                    }
-                }]
+        col = self.cell_op_col_combo.currentText()
+        row = self.cell_op_row_spin.value()
+        col_index = col_letter_to_num(col) - 1
+        row_index = row - 1
+        store = self.sheet_model.store
+        removed = store.cell(row_index, col_index) if row_index < store.row_count and col_index < store.column_count else ''
+        self.journal.record(CellShiftStep(f"delete {col}{row}", self.current.sheet_id, row_index, col_index, removed))
+        self.mutations.structural({
+            "deleteRange": {
+                "range": {
+                    "sheetId": self.current.sheet_id,
+                    "startRowIndex": row_index,
+                    "endRowIndex": row_index + 1,
+                    "startColumnIndex": col_index,
+                    "endColumnIndex": col_index + 1,
+                },
+                "shiftDimension": "ROWS"
             }
-            self.service.spreadsheets().batchUpdate(
-                spreadsheetId=self.spreadsheet_id,
-                body=body
-            ).execute()
-            QMessageBox.information(self, "Success", f"Cell {col}{row} deleted (cells shifted upward).")
+        })
+        self.show_pending_changes()
+
+    def show_pending_changes(self):
+        self.status_label.setText(f"{self.mutations.pending} change(s) waiting to be saved...")
+
+    def edit_block(self, ws, top, left, block, label, clear_range=None):
+        # Value edits are shown at once and written with their base for the conflict check;
+        # clears (clear_range) are shown at once too but sent as a plain clear of that range.
+        # label names the edit in the undo history.
+        width = max((len(row) for row in block), default=0)
+        old = self.cached_block(ws, top, left, len(block), width)
+        kept = self.record_value_step(ws, ValueStep(label, ws.sheet_id, top, left, old, block))
+        tag = self.apply_local_edit(ws, top, left, block)
+        if clear_range is not None:
+            self.mutations.clear(clear_range, tag)
+        else:
+            height, width = len(block), max((len(row) for row in block), default=0)
+            self.mutations.write(ws.range(block_cells(top, left, height, width)), block, tag[3], tag, kept)
+        self.show_pending_changes()
+
+    def record_value_step(self, ws, step):
+        # Journals a value edit (before apply_local_edit) and returns what its write passes as
+        # kept, so the formulas it overwrites come back with the conflict check; None if the
+        # step wasn't kept or overwrote nothing
+        self.journal.record(step)
+        if not step.old or step.size > JOURNAL_MAX_CELLS:
+            return None
+        skip = {(r - step.top, c - step.left) for sheet_id, r, c in self.pending_cells
+                if sheet_id == ws.sheet_id and step.top <= r < step.top + step.height
+                and step.left <= c < step.left + step.width}
+        return step, skip
+
+    def cached_block(self, ws, top, left, height, width):
+        # What the model shows for a block right now, pending edits included; '' past the data
+        store = ws.model.store
+        rows = min(top + height, store.row_count) - top
+        columns = min(left + width, store.column_count) - left
+        if rows <= 0 or columns <= 0:
+            return []
+        return [[store.cell(r, c) for c in range(left, left + columns)] for r in range(top, top + rows)]
+
+    def undo(self):
+        step = self.journal.undo()
+        if step is not None:
+            self.replay(step, undo=True)
+
+    def redo(self):
+        step = self.journal.redo()
+        if step is not None:
+            self.replay(step, undo=False)
+
+    def replay(self, step, undo):
+        # The step's requests are queued as structural edits, so undos made in quick succession
+        # go out together in one spreadsheets.batchUpdate, in order with the edits around them.
+        # Replayed values show at once; rows and columns move once the worksheet reloads.
+        ws = next((ws for ws in self.worksheets if ws.sheet_id == step.sheet_id), None)
+        if ws is None:
+            self.journal.clear()
+            self.status_label.setText(f"Can't {'undo' if undo else 'redo'} {step.label}: its worksheet was removed.")
+            return
+        tag = None
+        if isinstance(step, ValueStep) and ws.loaded:
+            tag = self.apply_local_edit(ws, step.top, step.left, step.block(undo))
+        requests = step.undo_requests() if undo else step.redo_requests()
+        for request in requests[:-1]:
+            self.mutations.structural(request)
+        self.mutations.structural(requests[-1], tag)
+        self.show_pending_changes()
+
+    def update_history_buttons(self):
+        undo_steps, redo_steps = self.journal.undo_steps, self.journal.redo_steps
+        self.undo_btn.setEnabled(bool(undo_steps))
+        self.undo_btn.setText(f"Undo {undo_steps[-1].label}" if undo_steps else "Undo")
+        self.redo_btn.setEnabled(bool(redo_steps))
+        self.redo_btn.setText(f"Redo {redo_steps[-1].label}" if redo_steps else "Redo")
+
+    def apply_local_edit(self, ws, top, left, block):
+        # Shows an edit in the model and returns its tag for the write queue:
+        # (ws, top, left, base, block), base being what the cells held when last fetched
+        store = ws.model.store
+        base = []
+        for r, row in enumerate(block, top):
+            base_row = []
+            for c, value in enumerate(row, left):
+                key = (ws.sheet_id, r, c)
+                if key in self.pending_cells:
+                    was = self.pending_cells[key][0]
+                else:
+                    was = store.cell(r, c) if r < store.row_count and c < store.column_count else ''
+                base_row.append(was)
+                self.pending_cells[key] = (was, value)
+            base.append(base_row)
+        ws.model.set_block(top, left, block)
+        return ws, top, left, base, block
+
+    def overlay_pending(self, ws, start=0, end=None):
+        # Fetches that land before an edit is confirmed would show the old value again
+        if not self.pending_cells:
+            return
+        store = ws.model.store
+        for (sheet_id, r, c), (_, value) in self.pending_cells.items():
+            if sheet_id != ws.sheet_id or r < start or (end is not None and r >= end):
+                continue
+            if r >= store.row_count or c >= store.column_count or store.cell(r, c) != value:
+                ws.model.set_block(r, c, [[value]])
+
+    def settle_edit(self, tag, restore):
+        # Drops the edit's cells from pending_cells unless a later edit changed them again;
+        # with restore, their base values go back into the model. Returns the rows touched.
+        ws, top, left, base, block = tag
+        rows = set()
+        for i, row in enumerate(block):
+            for j, value in enumerate(row):
+                key = (ws.sheet_id, top + i, left + j)
+                entry = self.pending_cells.get(key)
+                if entry is None or entry[1] != value:
+                    continue
+                del self.pending_cells[key]
+                rows.add(top + i)
+                store = ws.model.store if ws.loaded else None
+                if restore and store is not None and top + i < store.row_count and left + j < store.column_count:
+                    ws.model.set_cell_value(top + i, left + j, entry[0])
+        return rows
+
+    def on_mutations_flushed(self, count, result):
+        # Edits already show; only conflicting cells change, to the value found in the sheet.
+        # Structural changes move cells around, so those still reload the worksheet.
+        tags, conflicts, structural, formulas = result
+        for (step, skip), rows in formulas:
+            step.keep_formulas(rows, skip)
+        touched = {}
+        for tag in tags:
+            touched.setdefault(tag[0], set()).update(self.settle_edit(tag, restore=False))
+        messages = []
+        for (ws, top, left, base, block), i, j, remote in conflicts:
+            if ws.loaded:
+                ws.model.set_block(top + i, left + j, [[remote]])
+            messages.append(f"{ws.title}!{col_num_to_letter(left + j + 1)}{top + i + 1}")
+        for ws, rows in touched.items():
+            if ws.loaded:
+                ws.snapshot_dirty = True
+                if ws.mirror is not None:
+                    self.sync_mirror(ws, rows)
+                self.publish_sql(ws, rows)
+        status = f"Saved {count} change(s)."
+        if messages:
+            status += f" {len(messages)} cell(s) were changed by someone else meanwhile and kept their new value: {', '.join(messages[:10])}"
+        self.status_label.setText(status)
+        if structural:
             self.refresh_sheet_display()
-        except Exception as e:
-            QMessageBox.critical(self, "Delete Error", f"Failed to delete cell: {e}")
-            
+
+    def on_mutations_failed(self, error, tags):
+        # Roll the edits back, newest first, then reload the worksheet. The undo history no
+        # longer matches the sheet, so it is dropped.
+        for tag in reversed(tags):
+            self.settle_edit(tag, restore=True)
+        self.journal.clear()
+        self.status_label.setText("Saving changes failed.")
+        QMessageBox.critical(self, "Update Error", f"Failed to save changes: {error}")
+        self.refresh_sheet_display()
+
+    def shutdown(self):
+        # Push out any queued edits and delete the tab once its worker is idle
+        self.mutations.flush()
+        for ws in self.worksheets:
+            if ws.loaded:
+                self.save_snapshot(ws)
+            if ws.mirror is not None:
+                self.worker.submit(ws.mirror.close)
+                ws.mirror = None
+            if self.sql_workspace is not None:
+                self.sql_workspace.drop((self, ws.sheet_id))
+        if self.worker.is_idle():
+            self.deleteLater()
+        else:
+            self.worker.idle.connect(self.deleteLater)
+
+class SqlConsoleWidget(QWidget):
+    # Query console over a SqlWorkspace. Results stream into a table view with fixed row
+    # heights, so a large result only costs the rows on screen to paint.
+    def __init__(self, workspace, parent=None):
+        super().__init__(parent)
+        self.workspace = workspace
+        self.running = False
+        self.started = 0.0
+
+        layout = QVBoxLayout(self)
+        splitter = QSplitter(Qt.Vertical)
+
+        editor_panel = QWidget()
+        editor_layout = QVBoxLayout(editor_panel)
+        editor_layout.setContentsMargins(0, 0, 0, 0)
+        self.editor = QPlainTextEdit()
+        self.editor.setPlaceholderText(
+            "SELECT status, COUNT(*), SUM(amount) FROM orders_sheet1 GROUP BY status\n\n"
+            "Ctrl+Enter runs the query. Every loaded worksheet of every open tab is a table; "
+            "_row is its sheet row number."
+        )
+        editor_layout.addWidget(self.editor)
+
+        buttons = QHBoxLayout()
+        self.run_btn = QPushButton("Run")
+        self.run_btn.clicked.connect(self.run_query)
+        self.stop_btn = QPushButton("Stop")
+        self.stop_btn.setEnabled(False)
+        self.stop_btn.clicked.connect(self.workspace.cancel)
+        self.status_label = QLabel("")
+        buttons.addWidget(self.run_btn)
+        buttons.addWidget(self.stop_btn)
+        buttons.addWidget(self.status_label, 1)
+        editor_layout.addLayout(buttons)
+
+        self.tables_label = QLabel("")
+        self.tables_label.setWordWrap(True)
+        self.tables_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        editor_layout.addWidget(self.tables_label)
+        splitter.addWidget(editor_panel)
+
+        self.result_model = QueryResultModel(self)
+        self.result_view = QTableView()
+        self.result_view.setModel(self.result_model)
+        self.result_view.setWordWrap(False)
+        self.result_view.setAlternatingRowColors(True)
+        self.result_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.result_view.verticalHeader().setDefaultSectionSize(24)
+        splitter.addWidget(self.result_view)
+        splitter.setStretchFactor(1, 3)
+        layout.addWidget(splitter)
+
+        QShortcut(QKeySequence("Ctrl+Return"), self.editor, self.run_query)
+        self.workspace.tables_changed.connect(self.show_tables)
+        self.workspace.sync_failed.connect(lambda message: self.status_label.setText(f"Sync failed: {message}"))
+        self.show_tables()
+
+    def show_tables(self):
+        tables = sorted(self.workspace.tables.values(), key=lambda table: table.name)
+        if not tables:
+            self.tables_label.setText("No worksheets loaded yet.")
+            return
+        self.tables_label.setText("Tables:  " + "   ".join(
+            f"{table.name}(_row, {', '.join(table.columns)})" for table in tables
+        ))
+
+    def run_query(self):
+        sql = self.editor.textCursor().selectedText().replace('\u2029', '\n') or self.editor.toPlainText()
+        if self.running or not sql.strip():
+            return
+        self.running = True
+        self.run_btn.setEnabled(False)
+        self.stop_btn.setEnabled(True)
+        self.status_label.setText("Running...")
+        self.result_model.reset()
+        self.started = time.perf_counter()
+        self.workspace.query(sql, self.on_batch, self.on_query_done, self.on_query_failed)
+
+    def on_batch(self, batch):
+        columns, rows = batch
+        if not rows:
+            self.result_model.reset(columns)
+            return
+        self.result_model.append(rows)
+        self.status_label.setText(f"Running... {self.result_model.rowCount()} row(s)")
+
+    def on_query_done(self, total):
+        elapsed = time.perf_counter() - self.started
+        shown = self.result_model.rowCount()
+        status = f"{total} row(s) in {elapsed:.2f} s"
+        if shown < total:
+            status += f", first {shown} shown"
+        self.finish_query(status)
+
+    def on_query_failed(self, error):
+        self.finish_query(f"Error: {error}")
+
+    def finish_query(self, status):
+        self.running = False
+        self.run_btn.setEnabled(True)
+        self.stop_btn.setEnabled(False)
+        self.status_label.setText(status)
+
+    def shutdown(self):
+        # Stop a running query and delete the console once its results stop arriving
+        self.workspace.cancel()
+        if self.workspace.worker.is_idle():
+            self.deleteLater()
+        else:
+            self.workspace.worker.idle.connect(self.deleteLater)
+
+class DiagnosticsWidget(QWidget):
+    # API_METRICS as a table of calls per spreadsheet and operation, refreshed while the tab
+    # is visible, with the latency histogram of the selected row and the latest errors.
+    # spreadsheet_name(id) gives the tab name to show for a spreadsheet id.
+    COLUMNS = ["Spreadsheet", "Operation", "Calls", "Calls/min", "Errors", "429s", "Retries",
+               "Mean ms", "p50 ms", "p95 ms", "Max ms", "Sent KB", "Received KB"]
+
+    def __init__(self, scheduler, spreadsheet_name, parent=None):
+        super().__init__(parent)
+        self.scheduler = scheduler
+        self.spreadsheet_name = spreadsheet_name
+        self.snapshot = None
+
+        layout = QVBoxLayout(self)
+        buttons = QHBoxLayout()
+        self.summary_label = QLabel("")
+        self.summary_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        reset_btn = QPushButton("Reset")
+        reset_btn.clicked.connect(self.reset_metrics)
+        export_btn = QPushButton("Export JSON...")
+        export_btn.clicked.connect(self.export_json)
+        buttons.addWidget(self.summary_label, 1)
+        buttons.addWidget(reset_btn)
+        buttons.addWidget(export_btn)
+        layout.addLayout(buttons)
+
+        splitter = QSplitter(Qt.Vertical)
+        self.stats_model = QueryResultModel(self)
+        self.stats_view = QTableView()
+        self.stats_view.setModel(self.stats_model)
+        self.stats_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.stats_view.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.stats_view.setAlternatingRowColors(True)
+        self.stats_view.verticalHeader().setVisible(False)
+        self.stats_view.selectionModel().selectionChanged.connect(self.show_histogram)
+        splitter.addWidget(self.stats_view)
+
+        details = QWidget()
+        details_layout = QVBoxLayout(details)
+        details_layout.setContentsMargins(0, 0, 0, 0)
+        self.histogram_label = QLabel("Select a row for its latency histogram.")
+        self.histogram_label.setWordWrap(True)
+        details_layout.addWidget(self.histogram_label)
+        self.errors_view = QPlainTextEdit()
+        self.errors_view.setReadOnly(True)
+        self.errors_view.setPlaceholderText("No failed API calls.")
+        details_layout.addWidget(self.errors_view)
+        splitter.addWidget(details)
+        splitter.setStretchFactor(0, 3)
+        layout.addWidget(splitter)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(DIAGNOSTICS_REFRESH)
+        self.refresh()
+
+    def refresh(self):
+        if not self.isVisible() and self.snapshot is not None:
+            return
+        self.snapshot = API_METRICS.snapshot()
+        totals = self.snapshot['totals']
+        minutes = max(self.snapshot['time'] - self.snapshot['started'], 1.0) / 60
+        summary = (
+            f"{totals['calls']} API call(s), {totals['calls_per_minute']}/min, "
+            f"{totals['errors']} error(s) ({totals['rate_limited']} rate limited), {totals['retries']} retries, "
+            f"{totals['bytes_sent'] / 1024:.0f} KB sent, {totals['bytes_received'] / 1024:.0f} KB received"
+        )
+        paused = self.scheduler.paused_until - time.monotonic()
+        if paused > 0:
+            summary += f". Polling paused for {paused:.0f} s after {self.scheduler.rate_limit_hits} rate limit(s)"
+        self.summary_label.setText(summary)
+
+        selected = self.selected_key()
+        rows = []
+        for entry in self.snapshot['calls']:
+            latency = entry['latency_ms']
+            rows.append((
+                self.spreadsheet_name(entry['spreadsheet_id']), entry['operation'], entry['calls'],
+                round(entry['calls'] / minutes, 1), entry['errors'], entry['errors_by_status'].get('429', 0),
+                entry['retries'], latency['mean'], latency['p50'], latency['p95'], latency['max'],
+                round(entry['bytes_sent'] / 1024, 1), round(entry['bytes_received'] / 1024, 1),
+            ))
+        self.stats_model.reset(self.COLUMNS)
+        self.stats_model.append(rows)
+        for r, entry in enumerate(self.snapshot['calls']):
+            if (entry['spreadsheet_id'], entry['operation']) == selected:
+                self.stats_view.selectRow(r)
+                break
+
+        self.errors_view.setPlainText('\n'.join(
+            f"{time.strftime('%H:%M:%S', time.localtime(error['time']))}  "
+            f"{self.spreadsheet_name(error['spreadsheet_id'])}  {error['operation']}  "
+            f"{error['status']}: {error['message']}"
+            for error in reversed(self.snapshot['recent_errors'])
+        ))
+
+    def selected_key(self):
+        rows = self.stats_view.selectionModel().selectedRows()
+        if not rows or self.snapshot is None or rows[0].row() >= len(self.snapshot['calls']):
+            return None
+        entry = self.snapshot['calls'][rows[0].row()]
+        return entry['spreadsheet_id'], entry['operation']
+
+    def show_histogram(self, *_):
+        key = self.selected_key()
+        entry = next((entry for entry in self.snapshot['calls']
+                      if (entry['spreadsheet_id'], entry['operation']) == key), None) if key else None
+        if entry is None:
+            self.histogram_label.setText("Select a row for its latency histogram.")
+            return
+        bounds = [f"<= {bound * 1000:g} ms" for bound in LATENCY_BUCKETS] + [f"> {LATENCY_BUCKETS[-1] * 1000:g} ms"]
+        self.histogram_label.setText(
+            f"{entry['operation']} latency:  " + "   ".join(
+                f"{bound}: {bucket['calls']}" for bound, bucket in zip(bounds, entry['histogram'])
+            )
+        )
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+
+    def reset_metrics(self):
+        API_METRICS.reset()
+        self.refresh()
+
+    def export_json(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export API Statistics", "gsdbe_api_stats.json", "JSON (*.json)")
+        if not path:
+            return
+        snapshot = API_METRICS.snapshot()
+        for entry in snapshot['calls'] + snapshot['recent_errors']:
+            entry['name'] = self.spreadsheet_name(entry['spreadsheet_id'])
+        try:
+            with open(path, 'w') as f:
+                json.dump(snapshot, f, indent=2)
+        except OSError as e:
+            QMessageBox.critical(self, "Export Error", f"Failed to write {path}:\n{e}")
+
+    def shutdown(self):
+        self.timer.stop()
+        self.deleteLater()
+
+class PlaceholderTab(QWidget):
+    # Holds a spreadsheet's place in the tab bar while its metadata loads
+    def __init__(self, spreadsheet_id, parent=None):
+        super().__init__(parent)
+        self.spreadsheet_id = spreadsheet_id
+        self.worker = ApiWorker(self)
+        layout = QVBoxLayout(self)
+        self.label = QLabel(f"Loading {spreadsheet_id}...")
+        self.label.setAlignment(Qt.AlignCenter)
+        self.label.setWordWrap(True)
+        layout.addWidget(self.label)
+
+    def shutdown(self):
+        if self.worker.is_idle():
+            self.deleteLater()
+        else:
+            self.worker.idle.connect(self.deleteLater)
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -618,6 +2590,11 @@ class MainWindow(QMainWindow):
         self.tab_widget.tabCloseRequested.connect(self.close_tab)  # Connect to handler
         self.setCentralWidget(self.tab_widget)
 
+        self.scheduler = RefreshScheduler(self.tab_widget, self)
+        self.sql_workspace = None  # created with the first SQL console
+        self.sql_console = None
+        self.diagnostics = None
+
         self.init_menu()
 
     def init_menu(self):
@@ -632,6 +2609,46 @@ class MainWindow(QMainWindow):
         load_action.triggered.connect(self.prompt_for_sheets_file)
         file_menu.addAction(load_action)
 
+        file_menu.addSeparator()
+        console_action = QAction("SQL Console", self)
+        console_action.triggered.connect(self.open_sql_console)
+        file_menu.addAction(console_action)
+
+        diagnostics_action = QAction("API Diagnostics", self)
+        diagnostics_action.triggered.connect(self.open_diagnostics)
+        file_menu.addAction(diagnostics_action)
+
+    def open_sql_console(self):
+        if self.sql_workspace is None:
+            self.sql_workspace = SqlWorkspace(self)
+            for i in range(self.tab_widget.count()):
+                widget = self.tab_widget.widget(i)
+                if isinstance(widget, SheetTabWidget):
+                    widget.attach_sql(self.sql_workspace, self.tab_widget.tabText(i))
+        if self.sql_console is None:
+            self.sql_console = SqlConsoleWidget(self.sql_workspace)
+            self.tab_widget.addTab(self.sql_console, "SQL Console")
+        self.tab_widget.setCurrentWidget(self.sql_console)
+
+    def open_diagnostics(self):
+        if self.diagnostics is None:
+            self.diagnostics = DiagnosticsWidget(self.scheduler, self.spreadsheet_name)
+            self.tab_widget.addTab(self.diagnostics, "API Diagnostics")
+        self.tab_widget.setCurrentWidget(self.diagnostics)
+
+    def spreadsheet_name(self, spreadsheet_id):
+        # Tab name of an open spreadsheet, else its id
+        for i in range(self.tab_widget.count()):
+            if getattr(self.tab_widget.widget(i), 'spreadsheet_id', None) == spreadsheet_id:
+                return self.tab_widget.tabText(i)
+        return spreadsheet_id or ''
+
+    def add_sheet_tab(self, sheet_widget, tab_name, index=-1):
+        self.tab_widget.insertTab(index, sheet_widget, tab_name)
+        self.scheduler.register(sheet_widget)
+        if self.sql_workspace is not None:
+            sheet_widget.attach_sql(self.sql_workspace, tab_name)
+
     def prompt_for_sheets_file(self):
         filepath, _ = QFileDialog.getOpenFileName(self, "Select sheets.txt file", "", "Text Files (*.txt)")
         if filepath:
@@ -653,85 +2670,71 @@ class MainWindow(QMainWindow):
             return  # user cancelled
 
         self.credentials_path = credentials_path.strip()
+        # Use custom tab name if provided, else the spreadsheet's title once it is known
+        self.open_spreadsheet(spreadsheet_id, self.credentials_path, tab_name.strip() or None)
+
+    def open_spreadsheet(self, spreadsheet_id, credentials_path, tab_name=None):
+        # The tab appears at once as a placeholder and becomes a SheetTabWidget when the
+        # metadata arrives. Each placeholder has its own worker on the shared API pool, so
+        # opening many spreadsheets runs up to API_THREADS requests at a time.
+        placeholder = PlaceholderTab(spreadsheet_id)
+        self.tab_widget.addTab(placeholder, tab_name or spreadsheet_id)
         self.open_spreadsheet_ids.add(spreadsheet_id)
+        placeholder.worker.submit(
+            lambda: gsdbe_core.SERVICES.get_service(credentials_path).spreadsheets().get(
+                spreadsheetId=spreadsheet_id, fields='properties.title,sheets.properties'
+            ).execute(),
+            lambda metadata: self.on_metadata_loaded(placeholder, credentials_path, tab_name, metadata),
+            lambda e: self.on_metadata_failed(placeholder, e)
+        )
+
+    def on_metadata_loaded(self, placeholder, credentials_path, tab_name, metadata):
+        index = self.tab_widget.indexOf(placeholder)
+        if index < 0:
+            return  # closed while loading
+        spreadsheet_id = placeholder.spreadsheet_id
+        sheet_title = metadata.get("properties", {}).get("title", spreadsheet_id[:12] + "...")
+        worksheets = [sheet['properties'] for sheet in metadata.get('sheets', [])]
+        # The new tab loads its first worksheet on its own worker, from the cache if it can
+        sheet_widget = SheetTabWidget(spreadsheet_id, credentials_path, worksheets)
+        was_current = self.tab_widget.currentIndex() == index
+        self.tab_widget.removeTab(index)
+        self.add_sheet_tab(sheet_widget, tab_name or sheet_title, index)
+        if was_current:
+            self.tab_widget.setCurrentIndex(index)
+        placeholder.shutdown()
 
-        # Authorize and get sheet metadata
-        SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
-        token_path = os.path.join(os.path.dirname(credentials_path), 'token.json')
-        if os.path.exists(token_path):
-            creds = Credentials.from_authorized_user_file(token_path, SCOPES)
-            if creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(credentials_path, SCOPES)
-            creds = flow.run_local_server(port=0)
-            with open(token_path, 'w') as token:
-                token.write(creds.to_json())
-
-        try:
-            service = build('sheets', 'v4', credentials=creds)
-            metadata = service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-            sheet_title = metadata.get("properties", {}).get("title", spreadsheet_id[:12] + "...")
-
-            # Use custom tab name if provided, else use sheet title
-            final_tab_name = tab_name.strip() if tab_name.strip() else sheet_title
-
-            sheet_widget = SheetTabWidget(spreadsheet_id, credentials_path)
-            self.tab_widget.addTab(sheet_widget, final_tab_name)
+    def on_metadata_failed(self, placeholder, error):
+        # The placeholder stays, showing the error, until it is closed; loading the
+        # spreadsheet again is allowed
+        self.open_spreadsheet_ids.discard(placeholder.spreadsheet_id)
+        placeholder.label.setText(f"Could not load sheet {placeholder.spreadsheet_id}:\n{error}")
 
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to load sheet metadata:\n{e}")
-                    
     def close_tab(self, index):
         widget = self.tab_widget.widget(index)
-        if widget:
-            widget.deleteLater()
         self.tab_widget.removeTab(index)
+        if widget is self.sql_console:
+            self.sql_console = None
+        if widget is self.diagnostics:
+            self.diagnostics = None
+        if widget:
+            self.open_spreadsheet_ids.discard(getattr(widget, 'spreadsheet_id', None))
+            self.scheduler.unregister(widget)
+            widget.shutdown()
 
     def load_sheets_from_file(self, filepath):
         if not self.credentials_path:
             QMessageBox.critical(self, "Error", "Load the credentials file before sheet files.")
             return
 
-        SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
-        token_path = os.path.join(os.path.dirname(self.credentials_path), 'token.json')
-        if os.path.exists(token_path):
-            creds = Credentials.from_authorized_user_file(token_path, SCOPES)
-            if creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, SCOPES)
-            creds = flow.run_local_server(port=0)
-            with open(token_path, 'w') as token:
-                token.write(creds.to_json())
-
-        service = build('sheets', 'v4', credentials=creds)
-
+        # Every listed spreadsheet gets its placeholder tab now; their requests overlap
         sheets_loaded = 0
-        with open(filepath, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith("#"):
-                    continue
-
-                parts = line.split(',')
-                spreadsheet_id = parts[0].strip()
-                custom_name = parts[1].strip() if len(parts) > 1 else None
-
-                if spreadsheet_id in self.open_spreadsheet_ids:
-                    continue  # Skip if already open
-
-                try:
-                    metadata = service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-                    sheet_title = metadata.get("properties", {}).get("title", spreadsheet_id[:12] + "...")
-                    tab_name = custom_name if custom_name else sheet_title
+        for spreadsheet_id, custom_name in read_sheets_file(filepath):
+            if spreadsheet_id in self.open_spreadsheet_ids:
+                continue  # Skip if already open
 
-                    sheet_widget = SheetTabWidget(spreadsheet_id, self.credentials_path)
-                    self.tab_widget.addTab(sheet_widget, tab_name)
-                    self.open_spreadsheet_ids.add(spreadsheet_id)  # Track this one
-                    sheets_loaded += 1
-                except Exception as e:
-                    QMessageBox.warning(self, "Error", f"Could not load sheet {spreadsheet_id}:\n{e}")
+            self.open_spreadsheet(spreadsheet_id, self.credentials_path, custom_name)
+            sheets_loaded += 1
 
         if sheets_loaded == 0:
             QMessageBox.information(self, "Info", "All sheets already open.")
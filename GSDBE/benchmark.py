@@ -0,0 +1,248 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import statistics
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6.QtWidgets import QApplication, QTableView, QTabWidget
+from PySide6.QtCore import QEventLoop
+
+import GSDBE
+import gsdbe_core
+import fake_sheets
+
+# Load tests for GSDBE's fetch, render and export paths against the fake API in
+# fake_sheets.py, so they run without a Google account. Run from this directory:
+#   python benchmark.py --rows 20000 --latency 0.08 --tabs 20 --seconds 30
+
+CREDENTIALS = 'benchmark-credentials.json'  # never read, the fake registry ignores it
+
+def wait_until(predicate, timeout=120.0):
+    # Runs the Qt event loop until predicate() holds, so worker results get delivered
+    deadline = time.monotonic() + timeout
+    app = QApplication.instance()
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError("benchmark step timed out")
+        app.processEvents(QEventLoop.AllEvents, 50)
+        time.sleep(0.001)
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'n': len(samples),
+        'median_ms': round(statistics.median(samples) * 1000, 1),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 1),
+        'max_ms': round(samples[-1] * 1000, 1),
+    }
+
+def open_tab(backend, spreadsheet_id):
+    metadata = fake_sheets.FakeSpreadsheets(backend).metadata(spreadsheet_id)
+    worksheets = [sheet['properties'] for sheet in metadata['sheets']]
+    return GSDBE.SheetTabWidget(spreadsheet_id, CREDENTIALS, worksheets)
+
+def timed_fetch(tab, force, errors):
+    # Seconds from submitting a fetch of the visible worksheet until its result is applied.
+    # Failed attempts (injected errors) are retried and counted, their time included.
+    started = time.perf_counter()
+    while True:
+        done = []
+        tab.submit_fetch(tab.current, lambda changed: done.append(None), done.append, force=force)
+        wait_until(lambda: done)
+        if done[0] is None:
+            return time.perf_counter() - started
+        errors.append(done[0])
+
+def bench_refresh(backend, rows, cols, repeats, error_rate):
+    # Full fetches, polls that find nothing new, and polls right after a remote edit
+    backend.add_spreadsheet('refresh', rows, cols)
+    tab = open_tab(backend, 'refresh')
+    wait_until(lambda: tab.current.grid_size is not None and tab.worker.is_idle())
+    backend.error_rate = error_rate
+    full, unchanged, changed, errors = [], [], [], []
+    for i in range(repeats):
+        full.append(timed_fetch(tab, True, errors))
+        unchanged.append(timed_fetch(tab, False, errors))
+        backend.edit('refresh', f"A{i % max(rows, 1) + 1}", [[f"edit {i}"]])
+        changed.append(timed_fetch(tab, False, errors))
+    backend.error_rate = 0.0
+    tab.shutdown()
+    wait_until(tab.worker.is_idle)
+    return {
+        'grid': f"{rows}x{cols}",
+        'full_fetch': summarize(full),
+        'poll_unchanged': summarize(unchanged),
+        'poll_after_edit': summarize(changed),
+        'failed_attempts': len(errors),
+    }
+
+def bench_render(sizes, repeats):
+    # Loading an N x M grid into the model and painting the first screen of it, then
+    # re-applying the same grid with one cell changed (the cost of a typical refresh).
+    # Transposing the rows to columns is timed on its own: the fetch worker does it, off
+    # the GUI thread.
+    results = []
+    for rows, cols in sizes:
+        grid = [[fake_sheets.generated_cell(r, c) for c in range(cols)] for r in range(rows)]
+        transpose, load, paint, update = [], [], [], []
+        for _ in range(repeats):
+            model = GSDBE.SheetTableModel()
+            view = QTableView()
+            view.resize(1200, 700)
+            started = time.perf_counter()
+            columns = gsdbe_core.page_columns(grid)
+            transpose.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            model.apply_grid(columns, rows)
+            load.append(time.perf_counter() - started)
+            view.setModel(model)
+            started = time.perf_counter()
+            view.grab()
+            paint.append(time.perf_counter() - started)
+            edited = [list(column) for column in columns]
+            if rows and cols:
+                edited[0][rows // 2] = 'changed'
+            started = time.perf_counter()
+            model.apply_grid(edited, rows)
+            update.append(time.perf_counter() - started)
+            view.deleteLater()
+        results.append({
+            'grid': f"{rows}x{cols}",
+            'worker_transpose': summarize(transpose),
+            'load': summarize(load),
+            'first_paint': summarize(paint),
+            'one_cell_update': summarize(update),
+        })
+    return results
+
+def bench_export(backend, rows, cols):
+    # Paged API -> file export of one worksheet in every format, as export_worksheet runs it.
+    # Parquet and Arrow are skipped when pyarrow isn't installed.
+    backend.add_spreadsheet('export', rows, cols)
+    service = gsdbe_core.SERVICES.get_service(CREDENTIALS)
+    results = []
+    for export_format, extension in gsdbe_core.EXPORT_EXTENSIONS.items():
+        if export_format in ('parquet', 'arrow'):
+            try:
+                gsdbe_core.import_pyarrow()
+            except ImportError:
+                continue
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'export' + extension)
+            started = time.perf_counter()
+            props = GSDBE.find_worksheet(GSDBE.fetch_worksheets(service, 'export'), 0)
+            pages = GSDBE.iter_sheet_pages(
+                service, 'export', GSDBE.worksheet_grid(props)[0], props['title'],
+                value_render_option='UNFORMATTED_VALUE'
+            )
+            exporter = gsdbe_core.EXPORTERS[export_format](path)
+            gsdbe_core.export_pages(pages, [exporter])
+            elapsed = time.perf_counter() - started
+            size = os.path.getsize(path)
+        results.append({
+            'format': export_format,
+            'grid': f"{rows}x{cols}",
+            'rows': exporter.written,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(exporter.written / elapsed) if elapsed else None,
+            'file_bytes': size,
+        })
+    return results
+
+def bench_polling(backend, tabs, rows, cols, seconds, edit_every, error_rate):
+    # Many open tabs under one RefreshScheduler, as in MainWindow; one spreadsheet is edited
+    # every edit_every seconds. Reports API calls per minute by method.
+    tab_widget = QTabWidget()
+    scheduler = GSDBE.RefreshScheduler(tab_widget)
+    for i in range(tabs):
+        backend.add_spreadsheet(f"poll{i}", rows, cols)
+        tab = open_tab(backend, f"poll{i}")
+        tab_widget.addTab(tab, f"poll{i}")
+        scheduler.register(tab)
+    wait_until(lambda: all(tab_widget.widget(i).worker.is_idle() for i in range(tabs)))
+    backend.error_rate = error_rate
+    started = time.monotonic()
+    next_edit = started + edit_every
+    edits = 0
+    while time.monotonic() - started < seconds:
+        QApplication.instance().processEvents(QEventLoop.AllEvents, 50)
+        time.sleep(0.005)
+        if edit_every and time.monotonic() >= next_edit:
+            backend.edit(f"poll{edits % tabs}", "A1", [[f"edit {edits}"]])
+            edits += 1
+            next_edit += edit_every
+    counts = backend.call_counts(since=started)
+    minutes = (time.monotonic() - started) / 60
+    backend.error_rate = 0.0
+    scheduler.timer.stop()
+    wait_until(lambda: all(tab_widget.widget(i).worker.is_idle() for i in range(tabs)))
+    for i in range(tabs):
+        scheduler.unregister(tab_widget.widget(i))
+        tab_widget.widget(i).shutdown()
+    return {
+        'tabs': tabs,
+        'seconds': seconds,
+        'remote_edits': edits,
+        'calls_per_minute': round(sum(counts.values()) / minutes, 1),
+        'by_method': {method: round(count / minutes, 1) for method, count in sorted(counts.items())},
+    }
+
+def print_results(results):
+    for name, result in results.items():
+        print(f"== {name}")
+        for entry in result if isinstance(result, list) else [result]:
+            print(json.dumps(entry, indent=2))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark GSDBE against a local fake Sheets API.")
+    parser.add_argument('--rows', type=int, default=10000, help="rows per fake worksheet")
+    parser.add_argument('--cols', type=int, default=26, help="columns per fake worksheet")
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds added to every API call")
+    parser.add_argument('--jitter', type=float, default=0.02, help="up to this many extra seconds per call")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of calls failing with 429/5xx")
+    parser.add_argument('--repeats', type=int, default=5, help="samples per latency/render measurement")
+    parser.add_argument('--render-sizes', default='1000x26,10000x26,100000x26',
+                        help="comma-separated ROWSxCOLS grids for the render benchmark")
+    parser.add_argument('--tabs', type=int, default=10, help="open tabs for the polling benchmark")
+    parser.add_argument('--poll-rows', type=int, default=1000, help="rows per worksheet in the polling benchmark")
+    parser.add_argument('--seconds', type=float, default=20.0, help="duration of the polling benchmark")
+    parser.add_argument('--edit-every', type=float, default=2.0, help="seconds between remote edits while polling")
+    parser.add_argument('--only', default='refresh,render,export,polling', help="benchmarks to run")
+    parser.add_argument('--json', dest='json_path', help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    # Errors are only injected while measuring, so setup never trips an error dialog
+    backend = fake_sheets.FakeBackend(args.latency, args.jitter, seed=0)
+    fake_sheets.install(backend)
+    cache_dir = tempfile.TemporaryDirectory()
+    gsdbe_core.CACHE_PATH = os.path.join(cache_dir.name, 'cache.db')  # start every run cold
+
+    only = set(args.only.split(','))
+    results = {}
+    if 'refresh' in only:
+        results['refresh'] = bench_refresh(backend, args.rows, args.cols, args.repeats, args.error_rate)
+    if 'render' in only:
+        sizes = [tuple(int(n) for n in size.split('x')) for size in args.render_sizes.split(',')]
+        results['render'] = bench_render(sizes, args.repeats)
+    if 'export' in only:
+        results['export'] = bench_export(backend, args.rows, args.cols)
+    if 'polling' in only:
+        results['polling'] = bench_polling(
+            backend, args.tabs, args.poll_rows, args.cols, args.seconds, args.edit_every, args.error_rate
+        )
+
+    print_results(results)
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+    GSDBE.api_thread_pool().waitForDone()
+    app.processEvents()
+    return results
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,456 @@
+import re
+import json
+import time
+import random
+import threading
+from collections import Counter
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+import gsdbe_core
+
+# Local stand-in for the parts of the Sheets and Drive APIs GSDBE uses, for measuring and
+# testing without a Google account. Install it with install(backend); every tab (and the
+# daemon) then gets FakeService clients from gsdbe_core.SERVICES instead of discovery clients. Calls sleep for the
+# configured latency and can fail with injected HTTP errors, like the real API would.
+
+DEFAULT_ROW_COUNT = 1000  # grid size of a new Sheets worksheet
+DEFAULT_COLUMN_COUNT = 26
+
+def parse_a1(a1):
+    # "'Title'!A1:C10" -> (title, row0, col0, row1, col1), 0-based with exclusive ends.
+    # Open ends ("A:A", "2:5", "A1:A") are None, meaning "to the edge of the grid". Without
+    # a "Title!" prefix the title is None (the first worksheet) or, when a1 isn't a cell
+    # reference, a1 itself names a whole worksheet.
+    title, _, cells = a1.rpartition('!')
+    if not title and not re.fullmatch(r'[A-Za-z]*\d*(:[A-Za-z]*\d*)?', cells):
+        title, cells = cells, ''
+    if title.startswith("'") and title.endswith("'"):
+        title = title[1:-1].replace("''", "'")
+    if not cells:
+        return title, 0, 0, None, None
+    parts = [re.fullmatch(r'([A-Za-z]*)(\d*)', part).groups() for part in cells.split(':')]
+    (c0, r0), (c1, r1) = parts[0], parts[-1]
+    row0 = int(r0) - 1 if r0 else 0
+    col0 = gsdbe_core.col_letter_to_num(c0.upper()) - 1 if c0 else 0
+    row1 = int(r1) if r1 else None
+    col1 = gsdbe_core.col_letter_to_num(c1.upper()) if c1 else None
+    return title or None, row0, col0, row1, col1
+
+def unformatted(value):
+    # What UNFORMATTED_VALUE would return for a cell typed as value
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+def entered_value(cell):
+    # The displayed value of a CellData sent with updateCells
+    value = cell.get('userEnteredValue', {})
+    if 'numberValue' in value:
+        number = value['numberValue']
+        return str(int(number)) if float(number).is_integer() else repr(number)
+    if 'boolValue' in value:
+        return 'TRUE' if value['boolValue'] else 'FALSE'
+    return str(value.get('stringValue', value.get('formulaValue', '')))
+
+def cell_data(value):
+    # The CellData of a stored value in grid data
+    if value == '':
+        return {}
+    if value.startswith('='):
+        return {'formattedValue': value, 'userEnteredValue': {'formulaValue': value}}
+    return {'formattedValue': value, 'userEnteredValue': {'stringValue': value}}
+
+def generated_cell(r, c):
+    # A mix of integers, decimals and text, so exports exercise every column type
+    kind = c % 3
+    if kind == 0:
+        return str(r * (c + 1))
+    if kind == 1:
+        return f"{r / 7:.2f}"
+    return f"item {r}-{c}"
+
+class FakeWorksheet:
+    def __init__(self, sheet_id, title, rows=None, row_count=None, column_count=None):
+        self.sheet_id = sheet_id
+        self.title = title
+        self.rows = rows or []
+        width = max((len(row) for row in self.rows), default=0)
+        self.row_count = max(row_count or DEFAULT_ROW_COUNT, len(self.rows))
+        self.column_count = max(column_count or DEFAULT_COLUMN_COUNT, width)
+
+    def properties(self, index):
+        return {
+            'sheetId': self.sheet_id,
+            'title': self.title,
+            'index': index,
+            'sheetType': 'GRID',
+            'gridProperties': {'rowCount': self.row_count, 'columnCount': self.column_count},
+        }
+
+    def read(self, row0, col0, row1, col1, render='FORMATTED_VALUE'):
+        # Like the API, trailing empty cells and rows are left out
+        rows = []
+        for row in self.rows[row0:row1]:
+            cells = row[col0:col1]
+            while cells and cells[-1] == '':
+                cells = cells[:-1]
+            if render == 'UNFORMATTED_VALUE':
+                cells = [unformatted(value) for value in cells]
+            rows.append(cells)
+        while rows and not rows[-1]:
+            rows.pop()
+        return rows
+
+    def write(self, row0, col0, values):
+        for r, row in enumerate(values):
+            while len(self.rows) <= row0 + r:
+                self.rows.append([])
+            target = self.rows[row0 + r]
+            for c, value in enumerate(row):
+                if value is None:
+                    continue
+                while len(target) <= col0 + c:
+                    target.append('')
+                target[col0 + c] = str(value)
+        self.row_count = max(self.row_count, len(self.rows))
+        self.column_count = max(self.column_count, max((col0 + len(row) for row in values), default=0))
+
+    def clear(self, row0, col0, row1, col1):
+        for row in self.rows[row0:row1]:
+            for c in range(col0, min(len(row), col1 if col1 is not None else len(row))):
+                row[c] = ''
+
+    def insert(self, dimension, start, end):
+        if dimension == 'ROWS':
+            self.rows[start:start] = [[] for _ in range(end - start)]
+            self.row_count += end - start
+        else:
+            for row in self.rows:
+                if len(row) > start:
+                    row[start:start] = [''] * (end - start)
+            self.column_count += end - start
+
+    def delete(self, dimension, start, end):
+        if dimension == 'ROWS':
+            del self.rows[start:end]
+            self.row_count -= min(end, self.row_count) - start
+        else:
+            for row in self.rows:
+                del row[start:end]
+            self.column_count -= min(end, self.column_count) - start
+
+class FakeSpreadsheet:
+    def __init__(self, spreadsheet_id, title='Fake Spreadsheet'):
+        self.spreadsheet_id = spreadsheet_id
+        self.title = title
+        self.worksheets = []
+        self.version = 1
+
+    def add_worksheet(self, title=None, rows=None, **kwargs):
+        sheet_id = max((ws.sheet_id for ws in self.worksheets), default=-1) + 1
+        ws = FakeWorksheet(sheet_id, title or f"Sheet{len(self.worksheets) + 1}", rows, **kwargs)
+        self.worksheets.append(ws)
+        return ws
+
+    def locate(self, a1):
+        # (worksheet, row0, col0, row1, col1); like the API, a bare name that matches a
+        # worksheet title means that whole worksheet even if it also reads as a cell
+        if '!' not in a1 and any(ws.title == a1.strip("'") for ws in self.worksheets):
+            return self.worksheet(a1.strip("'")), 0, 0, None, None
+        title, *bounds = parse_a1(a1)
+        return (self.worksheet(title), *bounds)
+
+    def worksheet(self, title=None, sheet_id=None):
+        if title is None and sheet_id is None and self.worksheets:
+            return self.worksheets[0]
+        for ws in self.worksheets:
+            if ws.title == title or (sheet_id is not None and ws.sheet_id == sheet_id):
+                return ws
+        raise fake_error(400, f"Unable to parse range: {title}")
+
+class FakeBackend:
+    # Holds the fake spreadsheets and decides how each call behaves. latency (+ up to jitter)
+    # seconds are slept per call; error_rate is the chance a call fails with one of
+    # error_statuses, and fail_next() queues failures for the next calls. calls logs
+    # (time, method) for every call, failed or not.
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_statuses=(429, 500, 503), seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.spreadsheets = {}
+        self.calls = []
+        self.queued_failures = []
+
+    def add_spreadsheet(self, spreadsheet_id, rows=0, cols=0, worksheets=1, title=None, cell=generated_cell):
+        # A spreadsheet whose worksheets each hold rows x cols generated values
+        spreadsheet = FakeSpreadsheet(spreadsheet_id, title or f"Fake {spreadsheet_id}")
+        for _ in range(worksheets):
+            data = [[cell(r, c) for c in range(cols)] for r in range(rows)]
+            spreadsheet.add_worksheet(rows=data)
+        self.spreadsheets[spreadsheet_id] = spreadsheet
+        return spreadsheet
+
+    def edit(self, spreadsheet_id, a1, values):
+        # A change made by someone else: no latency, not logged as a call
+        with self.lock:
+            FakeValues(self).write(spreadsheet_id, [{'range': a1, 'values': values}])
+
+    def fail_next(self, status, count=1):
+        with self.lock:
+            self.queued_failures.extend([status] * count)
+
+    def spreadsheet(self, spreadsheet_id):
+        spreadsheet = self.spreadsheets.get(spreadsheet_id)
+        if spreadsheet is None:
+            raise fake_error(404, f"Requested entity was not found: {spreadsheet_id}")
+        return spreadsheet
+
+    def call(self, method, fn):
+        with self.lock:
+            self.calls.append((time.monotonic(), method))
+            status = self.queued_failures.pop(0) if self.queued_failures else None
+            if status is None and self.error_rate and self.random.random() < self.error_rate:
+                status = self.random.choice(self.error_statuses)
+            delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        if status is not None:
+            raise fake_error(status, f"Injected error on {method}")
+        with self.lock:
+            return fn()
+
+    def call_counts(self, since=0.0):
+        return Counter(method for t, method in self.calls if t >= since)
+
+def fake_error(status, message):
+    return HttpError(
+        httplib2.Response({'status': status}),
+        ('{"error": {"code": %d, "message": "%s"}}' % (status, message)).encode()
+    )
+
+class FakeRequest:
+    # Recorded in gsdbe_core.API_METRICS like a real request, with the sizes of the JSON bodies
+    def __init__(self, backend, method, fn, spreadsheet_id=None, body=None):
+        self.backend = backend
+        self.method = method
+        self.fn = fn
+        self.spreadsheet_id = spreadsheet_id
+        self.body = body
+
+    def execute(self, http=None, num_retries=0):
+        started = time.perf_counter()
+        result = error = None
+        try:
+            result = self.backend.call(self.method, self.fn)
+            return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            gsdbe_core.API_METRICS.record(
+                self.spreadsheet_id, self.method, time.perf_counter() - started,
+                sent=len(json.dumps(self.body)) if self.body is not None else 0,
+                received=len(json.dumps(result)) if result is not None else 0, error=error
+            )
+
+class FakeValues:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def request(self, method, spreadsheet_id, fn, body=None):
+        return FakeRequest(self.backend, method, fn, spreadsheet_id, body)
+
+    def read(self, spreadsheet_id, a1, render):
+        ws, row0, col0, row1, col1 = self.backend.spreadsheet(spreadsheet_id).locate(a1)
+        return {'range': a1, 'majorDimension': 'ROWS', 'values': ws.read(row0, col0, row1, col1, render)}
+
+    def write(self, spreadsheet_id, data):
+        spreadsheet = self.backend.spreadsheet(spreadsheet_id)
+        updated = 0
+        for item in data:
+            ws, row0, col0, _, _ = spreadsheet.locate(item['range'])
+            ws.write(row0, col0, item.get('values', []))
+            updated += sum(len(row) for row in item.get('values', []))
+        spreadsheet.version += 1
+        return updated
+
+    def clear_ranges(self, spreadsheet_id, ranges):
+        spreadsheet = self.backend.spreadsheet(spreadsheet_id)
+        for a1 in ranges:
+            ws, row0, col0, row1, col1 = spreadsheet.locate(a1)
+            ws.clear(row0, col0, row1, col1)
+        spreadsheet.version += 1
+        return {'spreadsheetId': spreadsheet_id, 'clearedRanges': list(ranges)}
+
+    def get(self, spreadsheetId, range, valueRenderOption='FORMATTED_VALUE', **kwargs):
+        return self.request('values.get', spreadsheetId, lambda: self.read(spreadsheetId, range, valueRenderOption))
+
+    def batchGet(self, spreadsheetId, ranges, valueRenderOption='FORMATTED_VALUE', **kwargs):
+        return self.request('values.batchGet', spreadsheetId, lambda: {
+            'spreadsheetId': spreadsheetId,
+            'valueRanges': [self.read(spreadsheetId, a1, valueRenderOption) for a1 in ranges],
+        })
+
+    def update(self, spreadsheetId, range, body, **kwargs):
+        return self.request('values.update', spreadsheetId, lambda: {
+            'spreadsheetId': spreadsheetId,
+            'updatedRange': range,
+            'updatedCells': self.write(spreadsheetId, [{'range': range, 'values': body.get('values', [])}]),
+        }, body)
+
+    def batchUpdate(self, spreadsheetId, body, **kwargs):
+        return self.request('values.batchUpdate', spreadsheetId, lambda: {
+            'spreadsheetId': spreadsheetId,
+            'totalUpdatedCells': self.write(spreadsheetId, body.get('data', [])),
+        }, body)
+
+    def clear(self, spreadsheetId, range, body=None, **kwargs):
+        return self.request('values.clear', spreadsheetId, lambda: self.clear_ranges(spreadsheetId, [range]), body)
+
+    def batchClear(self, spreadsheetId, body, **kwargs):
+        return self.request('values.batchClear', spreadsheetId,
+                            lambda: self.clear_ranges(spreadsheetId, body.get('ranges', [])), body)
+
+class FakeSpreadsheets:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def values(self):
+        return FakeValues(self.backend)
+
+    def metadata(self, spreadsheet_id, ranges=None, include_grid_data=False):
+        # fields masks are ignored; properties are cheap to return in full. With grid data,
+        # each worksheet gets a GridData per range asked of it, in request order. Cells carry
+        # the stored text as formattedValue, and as formulaValue too when it starts with "="
+        # (the fake has no formula engine).
+        spreadsheet = self.backend.spreadsheet(spreadsheet_id)
+        sheets = [{'properties': ws.properties(i)} for i, ws in enumerate(spreadsheet.worksheets)]
+        if include_grid_data:
+            for a1 in ranges or []:
+                ws, row0, col0, row1, col1 = spreadsheet.locate(a1)
+                sheet = sheets[spreadsheet.worksheets.index(ws)]
+                sheet.setdefault('data', []).append({'rowData': [
+                    {'values': [cell_data(value) for value in row]}
+                    for row in ws.read(row0, col0, row1, col1)
+                ]})
+        return {
+            'spreadsheetId': spreadsheet_id,
+            'properties': {'title': spreadsheet.title},
+            'sheets': sheets,
+        }
+
+    def apply(self, spreadsheet_id, requests):
+        # The structural requests GSDBE sends; anything else is accepted and ignored
+        spreadsheet = self.backend.spreadsheet(spreadsheet_id)
+        for request in requests:
+            if 'insertDimension' in request:
+                span = request['insertDimension']['range']
+                spreadsheet.worksheet(sheet_id=span['sheetId']).insert(
+                    span['dimension'], span['startIndex'], span['endIndex'])
+            elif 'deleteDimension' in request:
+                span = request['deleteDimension']['range']
+                spreadsheet.worksheet(sheet_id=span['sheetId']).delete(
+                    span['dimension'], span['startIndex'], span['endIndex'])
+            elif 'appendDimension' in request:
+                append = request['appendDimension']
+                ws = spreadsheet.worksheet(sheet_id=append['sheetId'])
+                if append['dimension'] == 'ROWS':
+                    ws.row_count += append['length']
+                else:
+                    ws.column_count += append['length']
+            elif 'deleteRange' in request or 'insertRange' in request:
+                # Only shiftDimension ROWS: the cells below move up (delete) or down (insert)
+                span = request.get('deleteRange', request.get('insertRange'))['range']
+                ws = spreadsheet.worksheet(sheet_id=span['sheetId'])
+                for c in range(span['startColumnIndex'], span['endColumnIndex']):
+                    column = [row[c] if c < len(row) else '' for row in ws.rows]
+                    if 'deleteRange' in request:
+                        del column[span['startRowIndex']:span['endRowIndex']]
+                    else:
+                        column[span['startRowIndex']:span['startRowIndex']] = [''] * (span['endRowIndex'] - span['startRowIndex'])
+                    ws.clear(0, c, None, c + 1)
+                    ws.write(0, c, [[value] for value in column])
+            elif 'updateCells' in request:
+                # With a range, the cells of the range that rows doesn't cover are cleared
+                update = request['updateCells']
+                if 'range' in update:
+                    span = update['range']
+                    start = {'sheetId': span['sheetId'], 'rowIndex': span['startRowIndex'],
+                             'columnIndex': span['startColumnIndex']}
+                    spreadsheet.worksheet(sheet_id=span['sheetId']).clear(
+                        span['startRowIndex'], span['startColumnIndex'], span['endRowIndex'], span['endColumnIndex'])
+                else:
+                    start = update['start']
+                ws = spreadsheet.worksheet(sheet_id=start['sheetId'])
+                ws.write(start.get('rowIndex', 0), start.get('columnIndex', 0), [
+                    [entered_value(cell) for cell in row.get('values', [])] for row in update.get('rows', [])
+                ])
+            elif 'pasteData' in request:
+                # Delimited text, typed in as it reads (formulas stay text: the fake has no engine)
+                paste = request['pasteData']
+                coordinate = paste['coordinate']
+                ws = spreadsheet.worksheet(sheet_id=coordinate['sheetId'])
+                ws.write(coordinate.get('rowIndex', 0), coordinate.get('columnIndex', 0), [
+                    line.split(paste['delimiter']) for line in paste['data'].split('\n')
+                ])
+        spreadsheet.version += 1
+        return {'spreadsheetId': spreadsheet_id, 'replies': [{} for _ in requests]}
+
+    def get(self, spreadsheetId, ranges=None, includeGridData=False, **kwargs):
+        return FakeRequest(self.backend, 'spreadsheets.get',
+                           lambda: self.metadata(spreadsheetId, ranges, includeGridData), spreadsheetId)
+
+    def batchUpdate(self, spreadsheetId, body, **kwargs):
+        return FakeRequest(self.backend, 'spreadsheets.batchUpdate',
+                           lambda: self.apply(spreadsheetId, body.get('requests', [])), spreadsheetId, body)
+
+class FakeFiles:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get(self, fileId, **kwargs):
+        return FakeRequest(self.backend, 'files.get',
+                           lambda: {'version': str(self.backend.spreadsheet(fileId).version)}, fileId)
+
+class FakeService:
+    # Answers for both the Sheets and the Drive client
+    def __init__(self, backend):
+        self.backend = backend
+
+    def spreadsheets(self):
+        return FakeSpreadsheets(self.backend)
+
+    def files(self):
+        return FakeFiles(self.backend)
+
+class FakeCredentials:
+    valid = True
+
+    def has_scopes(self, scopes):
+        return True
+
+class FakeServiceRegistry(gsdbe_core.ServiceRegistry):
+    def __init__(self, backend):
+        super().__init__()
+        self.backend = backend
+
+    def get_credentials(self, credentials_path):
+        return FakeCredentials()
+
+    def get_service(self, credentials_path, api='sheets', version='v4'):
+        return FakeService(self.backend)
+
+def install(backend):
+    # Route every GSDBE API call to backend; returns the registry it replaced
+    previous = gsdbe_core.SERVICES
+    gsdbe_core.SERVICES = FakeServiceRegistry(backend)
+    return previous
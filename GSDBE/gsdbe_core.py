@@ -0,0 +1,1023 @@
+import sys
+import os
+import re
+import csv
+import bisect
+import sqlite3
+import hashlib
+import json
+import math
+import zlib
+import time
+import threading
+import urllib.parse
+from collections import Counter, deque
+from itertools import zip_longest
+
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from google.auth.transport.requests import Request
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+import google_auth_httplib2
+import httplib2
+
+# The parts of GSDBE that don't need Qt: API clients and change detection, paged fetching,
+# grid diffs, the columnar value store, the snapshot cache and the SQLite export/mirror.
+# GSDBE.py builds the desktop app on top of this module, gsdbe_daemon.py the headless one.
+
+DRIVE_METADATA_SCOPE = 'https://www.googleapis.com/auth/drive.metadata.readonly'
+SCOPES = ['https://www.googleapis.com/auth/spreadsheets', DRIVE_METADATA_SCOPE]
+CHANGE_DETECTION = 'drive'  # 'drive' (file version), 'probe' (hash of PROBE_RANGES) or 'full'
+PROBE_RANGES = ['A1:A']  # cells hashed by the 'probe' detector, on the worksheet being polled
+FETCH_PAGE_ROWS = 2000  # rows per range when paging through a sheet
+PAGES_PER_REQUEST = 5  # page ranges fetched per values.batchGet call
+SHEET_TITLE = 'Sheet1'  # assumed when a spreadsheet's worksheets aren't known
+EXPORT_TABLE = 'sheet_data'
+def user_cache_dir():
+    # Per-user cache directory of GSDBE: %LOCALAPPDATA% on Windows, ~/Library/Caches on
+    # macOS, $XDG_CACHE_HOME (or ~/.cache) elsewhere
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'GSDBE')
+
+CACHE_PATH = os.path.join(user_cache_dir(), 'gsdbe_cache.db')
+CACHE_TTL = 7 * 24 * 3600  # seconds; older snapshots are discarded instead of shown
+API_THREADS = 8  # threads shared by all tabs for Sheets API calls
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # seconds, API latency histogram bounds
+RECENT_API_ERRORS = 50  # failed API calls kept with their message for diagnostics
+
+def col_num_to_letter(n):
+    result = ''
+    while n:
+        n, rem = divmod(n - 1, 26)
+        result = chr(65 + rem) + result
+    return result
+
+def col_letter_to_num(letters):
+    n = 0
+    for ch in letters.upper():
+        n = n * 26 + ord(ch) - 64
+    return n
+
+def a1_range(title, cells=None):
+    # Worksheet titles may contain spaces or quotes, so they are always quoted
+    quoted = "'" + title.replace("'", "''") + "'"
+    return f"{quoted}!{cells}" if cells else quoted
+
+def a1_title(range_name):
+    # The worksheet title of an a1_range() range
+    title = range_name.rpartition('!')[0] or range_name
+    return title[1:-1].replace("''", "'")
+
+def block_cells(top, left, height, width):
+    # A1 cells of a height x width block at 0-based (top, left)
+    return f"{col_num_to_letter(left + 1)}{top + 1}:{col_num_to_letter(left + width)}{top + height}"
+
+def page_columns(rows):
+    # A page of rows as returned by values().get, transposed to interned columns of len(rows)
+    # values each (blank past a row's end). Fetch workers build these, so the model on the
+    # GUI thread only compares and extends lists. Transposed FETCH_PAGE_ROWS rows at a time,
+    # as zipping many thousands of rows at once is several times slower.
+    columns = []
+    for start in range(0, len(rows), FETCH_PAGE_ROWS):
+        chunk = rows[start:start + FETCH_PAGE_ROWS]
+        for c, values in enumerate(zip_longest(*chunk, fillvalue='')):
+            if c == len(columns):
+                columns.append([''] * start)
+            columns[c].extend(map(sys.intern, values))
+        for column in columns:
+            column.extend([''] * (start + len(chunk) - len(column)))
+    return columns
+
+class ColumnarStore:
+    # Column-major cache of the sheet values: one list per column, with every value interned
+    # so repeated strings are stored once. Rows are only materialised on demand.
+    def __init__(self):
+        self.columns = []
+        self.row_count = 0
+
+    def __len__(self):
+        return self.row_count
+
+    def __getitem__(self, r):
+        return self.row(r)
+
+    @property
+    def column_count(self):
+        return len(self.columns)
+
+    def cell(self, r, c):
+        return self.columns[c][r]
+
+    def set_cell(self, r, c, value):
+        self.columns[c][r] = sys.intern(value) if value else ''
+
+    def row(self, r):
+        # Trailing blanks are dropped to match what the Sheets API returns
+        values = [column[r] for column in self.columns]
+        while values and values[-1] == '':
+            values.pop()
+        return values
+
+    def rows(self):
+        # Zipped across the columns rather than row() by row(): a whole sheet at C speed
+        if not self.columns:
+            return [[] for _ in range(self.row_count)]
+        rows = []
+        for values in zip(*self.columns):
+            values = list(values)
+            while values and values[-1] == '':
+                values.pop()
+            rows.append(values)
+        return rows
+
+    def copy(self):
+        # A copy another thread can read while this one changes: the values are immutable
+        # strings, so only the column lists are copied
+        store = ColumnarStore()
+        store.columns = [list(column) for column in self.columns]
+        store.row_count = self.row_count
+        return store
+
+    def diff(self, start, columns, count):
+        # Cell-level diff of rows [start, start + count) against a page of columns (see
+        # page_columns; blank past their end), as (row, column, new value). Column by column,
+        # so an unchanged one costs a single list comparison.
+        changes = []
+        blank = [''] * count
+        for c in range(max(len(self.columns), len(columns))):
+            old = self.columns[c][start:start + count] if c < len(self.columns) else blank
+            new = columns[c][:count] if c < len(columns) else blank
+            if len(new) < count:
+                new = new + blank[len(new):]
+            if old != new:
+                changes.extend(
+                    (r, c, value) for r, (was, value) in enumerate(zip(old, new), start) if was != value
+                )
+        return changes
+
+    def set_column_count(self, count):
+        if count > len(self.columns):
+            self.columns.extend([''] * self.row_count for _ in range(count - len(self.columns)))
+        else:
+            del self.columns[count:]
+
+    def append_rows(self, rows):
+        self.append_columns(page_columns(rows), len(rows))
+
+    def append_columns(self, columns, count):
+        # count rows given as page_columns; columns past the store's are dropped, missing
+        # ones (and the end of short ones) are blank
+        for c, column in enumerate(self.columns):
+            values = columns[c][:count] if c < len(columns) else []
+            column.extend(values)
+            column.extend([''] * (count - len(values)))
+        self.row_count += count
+
+    def truncate(self, count):
+        for column in self.columns:
+            del column[count:]
+        self.row_count = min(self.row_count, count)
+
+def error_status(error):
+    # HTTP status of a failed API call as a string, or the exception type for transport errors
+    if isinstance(error, HttpError):
+        return str(error.resp.status)
+    return type(error).__name__
+
+class ApiCallStats:
+    # Running totals of one (spreadsheet, operation): calls, a latency histogram over
+    # LATENCY_BUCKETS (the last bucket is everything slower), traffic, retries and errors
+    def __init__(self):
+        self.calls = 0
+        self.errors = Counter()
+        self.retries = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.last_call = None
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th slowest call, capped at the slowest call
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.histogram):
+            seen += count
+            if count and seen >= q * self.calls:
+                return min(bound, self.max_seconds)
+        return self.max_seconds
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'errors': sum(self.errors.values()),
+            'errors_by_status': dict(self.errors),
+            'retries': self.retries,
+            'latency_ms': {
+                'mean': round(self.seconds / self.calls * 1000, 1) if self.calls else None,
+                'p50': round(self.quantile(0.5) * 1000, 1),
+                'p95': round(self.quantile(0.95) * 1000, 1),
+                'max': round(self.max_seconds * 1000, 1),
+            },
+            'histogram': [
+                {'le_ms': round(bound * 1000) if bound is not None else None, 'calls': count}
+                for bound, count in zip(LATENCY_BUCKETS + (None,), self.histogram)
+            ],
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'last_call': self.last_call,
+        }
+
+class ApiMetrics:
+    # Every Sheets/Drive call GSDBE makes, recorded per spreadsheet and operation by
+    # PooledHttpRequest (and fake_sheets). Calls are recorded from the API threads and read
+    # by the diagnostics tab and the daemon, hence the lock.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.stats = {}  # (spreadsheet_id, operation) -> ApiCallStats
+            self.recent_errors = deque(maxlen=RECENT_API_ERRORS)
+
+    def record(self, spreadsheet_id, operation, seconds, sent=0, received=0, retries=0, error=None):
+        now = time.time()
+        with self.lock:
+            stats = self.stats.get((spreadsheet_id, operation))
+            if stats is None:
+                stats = self.stats[(spreadsheet_id, operation)] = ApiCallStats()
+            stats.calls += 1
+            stats.retries += retries
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.histogram[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            stats.bytes_sent += sent
+            stats.bytes_received += received
+            stats.last_call = now
+            if error is not None:
+                status = error_status(error)
+                stats.errors[status] += 1
+                self.recent_errors.append({
+                    'time': now, 'spreadsheet_id': spreadsheet_id, 'operation': operation,
+                    'status': status, 'message': str(error)[:500],
+                })
+
+    def snapshot(self):
+        # Everything recorded since started (or the last reset), JSON-ready
+        with self.lock:
+            keys = sorted(self.stats, key=lambda key: (key[0] or '', key[1]))
+            calls = [
+                {'spreadsheet_id': key[0], 'operation': key[1], **self.stats[key].as_dict()} for key in keys
+            ]
+            errors = list(self.recent_errors)
+            started = self.started
+        now = time.time()
+        minutes = max(now - started, 1.0) / 60
+        total = sum(entry['calls'] for entry in calls)
+        return {
+            'started': started,
+            'time': now,
+            'totals': {
+                'calls': total,
+                'calls_per_minute': round(total / minutes, 1),
+                'errors': sum(entry['errors'] for entry in calls),
+                'rate_limited': sum(entry['errors_by_status'].get('429', 0) for entry in calls),
+                'retries': sum(entry['retries'] for entry in calls),
+                'bytes_sent': sum(entry['bytes_sent'] for entry in calls),
+                'bytes_received': sum(entry['bytes_received'] for entry in calls),
+            },
+            'calls': calls,
+            'recent_errors': errors,
+        }
+
+    def export_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+API_METRICS = ApiMetrics()
+
+SPREADSHEET_IN_URI = re.compile(r'/(?:spreadsheets|files)/([^/:?]+)')
+
+def request_spreadsheet_id(uri):
+    # Spreadsheet (Drive file) id a Sheets or Drive API URI addresses, None if it has none
+    match = SPREADSHEET_IN_URI.search(uri or '')
+    return urllib.parse.unquote(match.group(1)) if match else None
+
+def api_operation(method_id):
+    # 'sheets.spreadsheets.values.batchGet' -> 'values.batchGet', 'drive.files.get' -> 'files.get'
+    operation = (method_id or 'unknown').split('.', 1)[-1]
+    if operation.startswith('spreadsheets.values.'):
+        operation = operation[len('spreadsheets.'):]
+    return operation
+
+class CountingHttp:
+    # Passes requests through to an httplib2-style http, counting attempts (retries included)
+    # and response bytes for ApiMetrics
+    def __init__(self, http):
+        self.http = http
+        self.attempts = 0
+        self.received = 0
+
+    def request(self, *args, **kwargs):
+        self.attempts += 1
+        resp, content = self.http.request(*args, **kwargs)
+        self.received += len(content or b'')
+        return resp, content
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+class PooledHttpRequest(HttpRequest):
+    # httplib2 connections must not be shared between threads, so each request executes on
+    # the authorised connection owned by whichever thread runs it. Every call is recorded in
+    # API_METRICS, failed or not.
+    def __init__(self, http_factory, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.http_factory = http_factory
+
+    def execute(self, http=None, num_retries=0):
+        http = CountingHttp(http or self.http_factory())
+        started = time.perf_counter()
+        error = None
+        try:
+            return super().execute(http=http, num_retries=num_retries)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            API_METRICS.record(
+                request_spreadsheet_id(self.uri), api_operation(self.methodId), time.perf_counter() - started,
+                sent=(len(self.uri) + len(self.body or '')) * max(http.attempts, 1), received=http.received,
+                retries=max(0, http.attempts - 1), error=error
+            )
+
+class ServiceRegistry:
+    # Process-wide cache of Sheets clients keyed by credentials file. Every tab (and every
+    # worker thread) using the same credentials shares one Credentials object and one
+    # discovery client; the token is refreshed under a lock so it is only refreshed once.
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.credentials = {}
+        self.services = {}
+        self.local = threading.local()
+
+    def key(self, credentials_path):
+        return os.path.abspath(credentials_path)
+
+    def get_credentials(self, credentials_path):
+        key = self.key(credentials_path)
+        creds = self.credentials.get(key)
+        if creds is not None and creds.valid:
+            return creds
+        with self.lock:
+            creds = self.credentials.get(key)
+            if creds is not None and creds.valid:
+                return creds
+            token_path = os.path.join(os.path.dirname(key), 'token.json')
+            if creds is None and os.path.exists(token_path):
+                # Keep the scopes the token was granted with; older tokens predate the Drive scope
+                creds = Credentials.from_authorized_user_file(token_path)
+            if not creds or not creds.valid:
+                if creds and creds.expired and creds.refresh_token:
+                    creds.refresh(Request())
+                else:
+                    flow = InstalledAppFlow.from_client_secrets_file(key, SCOPES)
+                    creds = flow.run_local_server(port=0)
+                with open(token_path, 'w') as token:
+                    token.write(creds.to_json())
+            self.credentials[key] = creds
+            return creds
+
+    def thread_http(self, credentials_path):
+        key = self.key(credentials_path)
+        creds = self.get_credentials(key)
+        https = self.local.__dict__.setdefault('https', {})
+        http = https.get(key)
+        if http is None or http.credentials is not creds:
+            http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+            https[key] = http
+        return http
+
+    def get_service(self, credentials_path, api='sheets', version='v4'):
+        key = self.key(credentials_path)
+        with self.lock:
+            service = self.services.get((key, api, version))
+            if service is None:
+                service = build(
+                    api, version,
+                    credentials=self.get_credentials(key),
+                    requestBuilder=lambda http, *args, **kwargs: PooledHttpRequest(
+                        lambda: self.thread_http(key), http, *args, **kwargs
+                    )
+                )
+                self.services[(key, api, version)] = service
+            return service
+
+SERVICES = ServiceRegistry()
+
+class ChangeDetector:
+    # Strategy deciding whether a poll needs the full values fetch. marker(title) runs on the
+    # worker thread and returns a cheap fingerprint of the spreadsheet (or of the worksheet
+    # being polled); the tab only pulls the worksheet's values when it differs from the marker
+    # of its last full fetch. None means "can't tell, fetch".
+    def __init__(self, credentials_path, spreadsheet_id):
+        self.credentials_path = credentials_path
+        self.spreadsheet_id = spreadsheet_id
+
+    def marker(self, title=None):
+        return None
+
+    def spreadsheet_marker(self):
+        # Fingerprint covering every worksheet, for callers that sync them all (the daemon)
+        return self.marker()
+
+class DriveRevisionDetector(ChangeDetector):
+    # Drive's file version goes up on every change to the spreadsheet. Needs the read-only
+    # Drive metadata scope; tokens issued without it fall back to full fetches.
+    def __init__(self, credentials_path, spreadsheet_id):
+        super().__init__(credentials_path, spreadsheet_id)
+        self.enabled = True
+
+    def marker(self, title=None):
+        if not self.enabled:
+            return None
+        if not SERVICES.get_credentials(self.credentials_path).has_scopes([DRIVE_METADATA_SCOPE]):
+            self.enabled = False
+            return None
+        drive = SERVICES.get_service(self.credentials_path, 'drive', 'v3')
+        try:
+            result = drive.files().get(
+                fileId=self.spreadsheet_id, fields='version', supportsAllDrives=True
+            ).execute()
+        except HttpError as e:
+            if e.resp.status == 403:
+                self.enabled = False
+                return None
+            raise
+        return result.get('version')
+
+class ProbeRangeDetector(ChangeDetector):
+    # Hashes a few narrow ranges (PROBE_RANGES) of the polled worksheet. Only sees edits inside
+    # those ranges, so it suits sheets where every change touches a known column, e.g. an
+    # append-only log. The digest is stable across processes, since markers are persisted
+    # with the snapshot cache.
+    def __init__(self, credentials_path, spreadsheet_id, ranges=None):
+        super().__init__(credentials_path, spreadsheet_id)
+        self.ranges = ranges or PROBE_RANGES
+
+    def marker(self, title=None):
+        return self.probe([title or SHEET_TITLE])
+
+    def spreadsheet_marker(self):
+        # The probe ranges of every worksheet in one batchGet; the worksheet list is part of
+        # the digest, so adding or renaming a tab counts as a change
+        service = SERVICES.get_service(self.credentials_path)
+        return self.probe([props.get('title', SHEET_TITLE) for props in fetch_worksheets(service, self.spreadsheet_id)])
+
+    def probe(self, titles):
+        values = []
+        if titles:
+            result = SERVICES.get_service(self.credentials_path).spreadsheets().values().batchGet(
+                spreadsheetId=self.spreadsheet_id,
+                ranges=[a1_range(title, cells) for title in titles for cells in self.ranges]
+            ).execute()
+            values = [value_range.get('values', []) for value_range in result.get('valueRanges', [])]
+        return hashlib.blake2b(json.dumps([titles, values]).encode(), digest_size=16).hexdigest()
+
+CHANGE_DETECTORS = {
+    'drive': DriveRevisionDetector,
+    'probe': ProbeRangeDetector,
+    'full': ChangeDetector,
+}
+
+def fetch_worksheets(service, spreadsheet_id):
+    # Properties of every worksheet, in tab order; no cell data
+    metadata = service.spreadsheets().get(
+        spreadsheetId=spreadsheet_id,
+        fields='sheets.properties(sheetId,title,index,gridProperties)'
+    ).execute()
+    return [sheet['properties'] for sheet in metadata.get('sheets', [])]
+
+def find_worksheet(sheets, sheet_id):
+    # Worksheets are matched on sheetId, which survives renames; {} if it was deleted
+    return next((props for props in sheets if props.get('sheetId', 0) == sheet_id), {})
+
+def worksheet_grid(props):
+    grid = props.get('gridProperties', {})
+    return grid.get('rowCount', 0), grid.get('columnCount', 0)
+
+def iter_sheet_pages(service, spreadsheet_id, grid_rows, title=SHEET_TITLE,
+                     value_render_option='FORMATTED_VALUE'):
+    # Pages through rows [0, grid_rows) FETCH_PAGE_ROWS at a time, PAGES_PER_REQUEST pages
+    # per values.batchGet, yielding (start_row, rows) so callers never hold the whole sheet
+    pages = [
+        (start, a1_range(title, f"{start + 1}:{min(start + FETCH_PAGE_ROWS, grid_rows)}"))
+        for start in range(0, grid_rows, FETCH_PAGE_ROWS)
+    ]
+    for i in range(0, len(pages), PAGES_PER_REQUEST):
+        batch = pages[i:i + PAGES_PER_REQUEST]
+        result = service.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id,
+            ranges=[page_range for _, page_range in batch],
+            valueRenderOption=value_render_option,
+            dateTimeRenderOption='FORMATTED_STRING'
+        ).execute()
+        for (start, _), value_range in zip(batch, result.get('valueRanges', [])):
+            yield start, value_range.get('values', [])
+
+def fetch_worksheet_data(service, spreadsheet_id, sheet_id, title=SHEET_TITLE, report=None,
+                         value_render_option='FORMATTED_VALUE'):
+    # Reads the worksheet's real size, then pages through it, passing each page to
+    # report(start_row, rows). The worksheet list comes back too, so callers can follow
+    # renames and added/deleted worksheets.
+    # Returns (data_rows, width, grid_rows, grid_cols, sheets).
+    sheets = fetch_worksheets(service, spreadsheet_id)
+    props = find_worksheet(sheets, sheet_id)
+    grid_rows, grid_cols = worksheet_grid(props)
+    data_rows = width = 0
+    pages = iter_sheet_pages(
+        service, spreadsheet_id, grid_rows, props.get('title', title), value_render_option
+    )
+    for start, rows in pages:
+        if rows:
+            data_rows = start + len(rows)
+            width = max(width, max(len(row) for row in rows))
+        if report:
+            report(start, rows)
+    return data_rows, width, grid_rows, grid_cols, sheets
+
+def read_sheets_file(path):
+    # sheets.txt: one "spreadsheet_id[, name]" per line; blank lines and # comments are
+    # skipped. Returns [(spreadsheet_id, name or None)].
+    entries = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split(',')
+            name = parts[1].strip() if len(parts) > 1 else ''
+            entries.append((parts[0].strip(), name or None))
+    return entries
+
+# Plain decimal literals only: no leading zeros ("00123" is an ID, not 123), underscores,
+# surrounding whitespace, nan or inf
+INTEGER_LITERAL = re.compile(r'-?(?:0|[1-9][0-9]*)')
+REAL_LITERAL = re.compile(r'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?')
+
+def infer_sqlite_type(values, parse_strings=False):
+    # INTEGER or REAL when every non-empty value is an int or float, otherwise TEXT. With
+    # UNFORMATTED_VALUE the API already returns numbers as numbers, so strings stay TEXT;
+    # parse_strings also counts strings that are plain decimal literals (formatted values).
+    kind = None
+    for value in values:
+        if value is None or value == '':
+            continue
+        if isinstance(value, str):
+            if not parse_strings:
+                return 'TEXT'
+            if INTEGER_LITERAL.fullmatch(value):
+                value = 0
+            elif REAL_LITERAL.fullmatch(value):
+                value = 0.0
+            else:
+                return 'TEXT'
+        elif not isinstance(value, (int, float)) or isinstance(value, float) and not math.isfinite(value):
+            return 'TEXT'
+        if isinstance(value, float):
+            kind = 'REAL'
+        elif kind is None:
+            kind = 'INTEGER'
+    return kind or 'TEXT'
+
+def unique_column_name(name, taken):
+    # SQLite column names are case-insensitive; repeated headers get a _2, _3, ... suffix
+    candidate, n = name, 1
+    while candidate.lower() in taken:
+        n += 1
+        candidate = f"{name}_{n}"
+    taken.add(candidate.lower())
+    return candidate
+
+def sqlite_column_names(first, width):
+    # Column names for a sheet whose first row is `first`: that row when it fills every
+    # column, else col1, col2, ... Returns (names, whether the first row is a header)
+    taken = set()
+    if first is not None and len(first) == width and all(str(cell).strip() != '' for cell in first):
+        return [
+            unique_column_name(str(cell).strip().replace(" ", "_").replace('"', '') or f"col{i+1}", taken)
+            for i, cell in enumerate(first)
+        ], True
+    return [unique_column_name(f"col{i+1}", taken) for i in range(width)], False
+
+def import_pyarrow():
+    # pyarrow is optional: only the Parquet and Arrow exporters need it
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet and Arrow export need pyarrow (pip install pyarrow)") from None
+    return pyarrow
+
+class PageExporter:
+    # Writes a worksheet out page by page, as iter_sheet_pages yields (start_row, rows), so no
+    # export holds the whole sheet. The first non-empty page decides the column names (see
+    # sqlite_column_names) and types (see infer_sqlite_type); blank rows between pages are
+    # written as empty rows. Formats that can't add columns later drop cells past the first
+    # page's width and count them in dropped. Subclasses implement begin(), write_rows(),
+    # finish() and abort(); close() returns the number of rows written.
+    adds_columns = False
+
+    def __init__(self, path):
+        self.path = path
+        self.names = None
+        self.types = None
+        self.next_row = 0
+        self.written = 0
+        self.dropped = 0
+
+    def write_page(self, start, rows):
+        if not rows:
+            return
+        if self.names is None:
+            width = max(len(row) for row in rows)
+            self.names, header = sqlite_column_names(rows[0], width)
+            if header:
+                rows = rows[1:]
+                start += 1
+            self.types = [infer_sqlite_type(row[i] if i < len(row) else None for row in rows) for i in range(width)]
+            self.next_row = start
+            self.begin()
+        elif self.adds_columns:
+            width = max(len(row) for row in rows)
+            if width > len(self.names):
+                taken = {name.lower() for name in self.names}
+                added = [unique_column_name(f"col{i+1}", taken) for i in range(len(self.names), width)]
+                self.names += added
+                self.types += ['TEXT'] * len(added)
+                self.add_columns(added)
+
+        width = len(self.names)
+        blank = (None,) * width
+        values = [blank] * (start - self.next_row)
+        for row in rows:
+            if len(row) > width:
+                self.dropped += sum(1 for cell in row[width:] if cell != '')
+                row = row[:width]
+            values.append(tuple(None if cell == '' else cell for cell in row) + (None,) * (width - len(row)))
+        self.write_rows(values)
+        self.written += len(values)
+        self.next_row = start + len(rows)
+
+    def close(self):
+        if self.names is None:
+            self.names, self.types = [], []
+            self.begin()
+        self.finish()
+        return self.written
+
+    def add_columns(self, names):
+        pass
+
+class SqliteExporter(PageExporter):
+    # A fresh table, written inside a single transaction with executemany; a wider page later
+    # on adds TEXT columns
+    adds_columns = True
+
+    def __init__(self, path, table=EXPORT_TABLE):
+        super().__init__(path)
+        self.table = table
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.execute("BEGIN")
+
+    def begin(self):
+        if not self.names:
+            return  # nothing to export, no table
+        self.conn.execute(f'DROP TABLE IF EXISTS "{self.table}"')
+        col_defs = ', '.join(f'"{name}" {kind}' for name, kind in zip(self.names, self.types))
+        self.conn.execute(f'CREATE TABLE "{self.table}" ({col_defs})')
+
+    def add_columns(self, names):
+        for name in names:
+            self.conn.execute(f'ALTER TABLE "{self.table}" ADD COLUMN "{name}" TEXT')
+
+    def write_rows(self, rows):
+        insert = f'INSERT INTO "{self.table}" VALUES ({",".join("?" * len(self.names))})'
+        self.conn.executemany(insert, rows)
+
+    def finish(self):
+        try:
+            self.conn.execute("COMMIT")
+        finally:
+            self.conn.close()
+
+    def abort(self):
+        if self.conn.in_transaction:
+            self.conn.execute("ROLLBACK")
+        self.conn.close()
+
+class FileExporter(PageExporter):
+    # Writes next to path and renames over it in finish(), so readers never see half a file
+    opened = False
+
+    def begin(self):
+        self.tmp_path = self.path + '.tmp'
+        self.open_file()
+        self.opened = True
+
+    def finish(self):
+        self.close_file()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        # Nothing to close when open_file() failed (unwritable path, pyarrow missing); the
+        # caller re-raises that error
+        if not self.opened:
+            return
+        self.opened = False
+        try:
+            self.close_file()
+        except Exception:
+            pass  # already failing; the export's own error is the one to report
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+class CsvExporter(FileExporter):
+    # Header row of column names, then the rows as they arrive
+    def open_file(self):
+        self.file = open(self.tmp_path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.names)
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)  # None is written as an empty field
+
+    def close_file(self):
+        self.file.close()
+
+ARROW_BATCH_ROWS = 65536  # rows per Arrow record batch / Parquet row group
+
+def arrow_integer(value):
+    # int64 value of an int, bool, integral float or integer literal; ValueError for anything
+    # else, so the exporter writes null rather than a truncated or wrapped number
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(f"not an integer: {value!r}")
+        value = int(value)
+    elif isinstance(value, str):
+        if not INTEGER_LITERAL.fullmatch(value):
+            raise ValueError(f"not an integer literal: {value!r}")
+        value = int(value)
+    elif not isinstance(value, int):
+        raise TypeError(f"not an integer: {value!r}")
+    if not -2 ** 63 <= value < 2 ** 63:
+        raise ValueError(f"out of int64 range: {value}")
+    return int(value)
+
+class ArrowExporter(FileExporter):
+    # Typed columns: INTEGER -> int64, REAL -> float64, TEXT -> string, by the first page's
+    # values. A later value that doesn't fit its column's type is written as null and counted
+    # in rejected. Rows are buffered into record batches of ARROW_BATCH_ROWS.
+    def open_file(self):
+        pa = self.pa = import_pyarrow()
+        arrow_types = {'INTEGER': pa.int64(), 'REAL': pa.float64(), 'TEXT': pa.string()}
+        converters = {'INTEGER': arrow_integer, 'REAL': float, 'TEXT': str}
+        self.schema = pa.schema([(name, arrow_types[kind]) for name, kind in zip(self.names, self.types)])
+        self.converters = [converters[kind] for kind in self.types]
+        self.buffer = []
+        self.rejected = 0
+        self.open_writer()
+
+    def write_rows(self, rows):
+        self.buffer.extend(rows)
+        if len(self.buffer) >= ARROW_BATCH_ROWS:
+            self.write_batch()
+
+    def write_batch(self):
+        if not self.buffer:
+            return
+        arrays = []
+        for c, (convert, field) in enumerate(zip(self.converters, self.schema)):
+            column = []
+            for row in self.buffer:
+                value = row[c]
+                if value is not None:
+                    try:
+                        value = convert(value)
+                    except (TypeError, ValueError):
+                        value = None
+                        self.rejected += 1
+                column.append(value)
+            arrays.append(self.pa.array(column, type=field.type))
+        self.writer.write_batch(self.pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        self.buffer = []
+
+    def close_file(self):
+        self.write_batch()
+        self.writer.close()
+
+class ParquetExporter(ArrowExporter):
+    def open_writer(self):
+        self.writer = self.pa.parquet.ParquetWriter(self.tmp_path, self.schema)
+
+class ArrowIpcExporter(ArrowExporter):
+    # The Arrow IPC file format (Feather v2), memory-mappable by pyarrow, pandas and polars
+    def open_writer(self):
+        self.sink = self.pa.OSFile(self.tmp_path, 'wb')
+        try:
+            self.writer = self.pa.ipc.new_file(self.sink, self.schema)
+        except Exception:
+            self.sink.close()
+            raise
+
+    def close_file(self):
+        super().close_file()
+        self.sink.close()
+
+EXPORTERS = {
+    'sqlite': SqliteExporter,
+    'csv': CsvExporter,
+    'parquet': ParquetExporter,
+    'arrow': ArrowIpcExporter,
+}
+EXPORT_EXTENSIONS = {'sqlite': '.db', 'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrow'}
+
+def export_pages(pages, exporters, report=None):
+    # The one paged-fetch pipeline behind every export: each page goes to every exporter in
+    # turn, so a worksheet is fetched once however many formats it is written to. report()
+    # gets the first exporter's row count after every page. Returns each one's row count.
+    closed = []
+    try:
+        for start, rows in pages:
+            for exporter in exporters:
+                exporter.write_page(start, rows)
+            if report:
+                report(exporters[0].written)
+        for exporter in exporters:
+            closed.append(exporter.close())
+        return closed
+    except Exception:
+        for exporter in exporters[len(closed):]:
+            exporter.abort()
+        raise
+
+def export_pages_to_sqlite(db_path, pages, table=EXPORT_TABLE, report=None):
+    return export_pages(pages, [SqliteExporter(db_path, table)], report)[0]
+
+class SnapshotCache:
+    # Last known values of each worksheet, kept on disk so tabs can render before
+    # (or without) the API answering. Rows are stored as zlib-compressed JSON along with the
+    # change-detector marker and grid size they were fetched with. Shared by every tab's
+    # worker thread, hence the lock.
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            "spreadsheet_id TEXT, sheet_id INTEGER, fetched_at REAL, marker TEXT, data BLOB, "
+            "PRIMARY KEY (spreadsheet_id, sheet_id))"
+        )
+        self.conn.commit()
+
+    def load(self, spreadsheet_id, sheet_id, ttl=CACHE_TTL):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT fetched_at, marker, data FROM snapshots WHERE spreadsheet_id = ? AND sheet_id = ?",
+                (spreadsheet_id, sheet_id)
+            ).fetchone()
+        if row is None or time.time() - row[0] > ttl:
+            return None
+        payload = json.loads(zlib.decompress(row[2]))
+        return {
+            'fetched_at': row[0],
+            'marker': json.loads(row[1]),
+            'rows': payload['rows'],
+            'grid': payload['grid'],
+        }
+
+    def save(self, spreadsheet_id, sheet_id, rows, grid, marker, fetched_at):
+        data = zlib.compress(json.dumps({'rows': rows, 'grid': grid}, separators=(',', ':')).encode())
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?)",
+                (spreadsheet_id, sheet_id, fetched_at, json.dumps(marker), data)
+            )
+            self.conn.commit()
+
+    def purge(self, ttl=CACHE_TTL):
+        with self.lock:
+            self.conn.execute("DELETE FROM snapshots WHERE fetched_at < ?", (time.time() - ttl,))
+            self.conn.commit()
+
+_snapshot_cache = None
+
+def snapshot_cache():
+    global _snapshot_cache
+    if _snapshot_cache is None:
+        _snapshot_cache = SnapshotCache(CACHE_PATH)
+        _snapshot_cache.purge()
+    return _snapshot_cache
+
+def row_hash(values):
+    return hashlib.blake2b('\x1f'.join(str(value) for value in values).encode(), digest_size=8).hexdigest()
+
+class SqliteMirror:
+    # A local copy of one worksheet that is kept current from the row-level diffs of each
+    # refresh. sheet_rows holds one row per sheet row (row_num is 1-based like the sheet),
+    # one TEXT column per sheet column letter and a hash of the row's values, so re-sending
+    # an unchanged row costs no write. sync_state records what was mirrored and when.
+    # Calls are serialised by the owning tab's worker, so the connection may hop threads.
+    def __init__(self, db_path, spreadsheet_id, sheet_title=SHEET_TITLE, table='sheet_rows'):
+        self.db_path = db_path
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_title = sheet_title
+        self.table = table
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            f'CREATE TABLE IF NOT EXISTS "{table}" (row_num INTEGER PRIMARY KEY, row_hash TEXT NOT NULL)'
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_state ("
+            "spreadsheet_id TEXT, sheet_title TEXT, row_count INTEGER, column_count INTEGER, "
+            "rows_written INTEGER, last_sync REAL, PRIMARY KEY (spreadsheet_id, sheet_title))"
+        )
+        self.columns = [
+            info[1] for info in self.conn.execute(f'PRAGMA table_info("{table}")')
+            if info[1] not in ('row_num', 'row_hash')
+        ]
+
+    def ensure_columns(self, width):
+        while len(self.columns) < width:
+            name = col_num_to_letter(len(self.columns) + 1)
+            self.conn.execute(f'ALTER TABLE "{self.table}" ADD COLUMN "{name}" TEXT')
+            self.columns.append(name)
+
+    def apply(self, rows, row_count):
+        # rows: [(row_index, values)] for every row that changed since the last sync;
+        # rows past row_count were removed from the sheet. Returns the number of rows written.
+        self.begin()
+        try:
+            self.write(rows)
+            return self.commit(row_count)
+        except Exception:
+            self.rollback()
+            raise
+
+    # apply() in steps, for callers that stream a worksheet in pages: begin(), write() each
+    # page, then commit() with the final row count, all in one transaction
+    def begin(self):
+        self.changes_before = self.conn.total_changes
+        self.conn.execute("BEGIN")
+
+    def write(self, rows):
+        self.ensure_columns(max((len(values) for _, values in rows), default=0))
+        names = ', '.join(f'"{name}"' for name in self.columns)
+        updates = ', '.join(f'"{name}" = excluded."{name}"' for name in self.columns)
+        width = len(self.columns)
+        upsert = (
+            f'INSERT INTO "{self.table}" (row_num, row_hash{", " if names else ""}{names}) '
+            f'VALUES ({", ".join("?" * (width + 2))}) '
+            f'ON CONFLICT(row_num) DO UPDATE SET row_hash = excluded.row_hash'
+            f'{", " if updates else ""}{updates} '
+            f'WHERE "{self.table}".row_hash != excluded.row_hash'
+        )
+        self.conn.executemany(upsert, (
+            (r + 1, row_hash(values), *values, *([None] * (width - len(values))))
+            for r, values in rows
+        ))
+
+    def commit(self, row_count):
+        self.conn.execute(f'DELETE FROM "{self.table}" WHERE row_num > ?', (row_count,))
+        written = self.conn.total_changes - self.changes_before
+        self.conn.execute(
+            "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?, "
+            "COALESCE((SELECT rows_written FROM sync_state WHERE spreadsheet_id = ? AND sheet_title = ?), 0) + ?, ?)",
+            (self.spreadsheet_id, self.sheet_title, row_count, len(self.columns),
+             self.spreadsheet_id, self.sheet_title, written, time.time())
+        )
+        self.conn.execute("COMMIT")
+        return written
+
+    def rollback(self):
+        if self.conn.in_transaction:
+            self.conn.execute("ROLLBACK")
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,232 @@
+import os
+import re
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import gsdbe_core
+from gsdbe_core import (
+    CHANGE_DETECTION, CHANGE_DETECTORS, API_THREADS, SHEET_TITLE, EXPORTERS, EXPORT_EXTENSIONS,
+    fetch_worksheets, worksheet_grid, iter_sheet_pages, export_pages, import_pyarrow, read_sheets_file,
+    SqliteMirror, API_METRICS
+)
+
+# Headless GSDBE: mirrors every spreadsheet in sheets.txt to local files on a schedule, with
+# no Qt involved. Run from this directory:
+#   python gsdbe_daemon.py --credentials credentials.json --sheets sheets.txt --out exports
+# Each run asks the change detector first and only fetches spreadsheets that changed (or
+# every FULL_FETCH_EVERY runs). Every worksheet is fetched once, page by page with unformatted
+# values, and each page goes to every format before the next one is fetched:
+#   sqlite   <out>/<name>.db, one SqliteMirror table per worksheet, only changed rows rewritten
+#   csv      <out>/<name>/<worksheet>.csv
+#   parquet  <out>/<name>/<worksheet>.parquet, needs pyarrow
+#   arrow    <out>/<name>/<worksheet>.arrow (Arrow IPC), needs pyarrow
+# where <worksheet> is the worksheet's title made filename-safe plus its sheetId, so titles
+# that only differ in punctuation ("Sheet 1", "Sheet_1") don't share a table or file.
+# One log line per spreadsheet and per run reports the throughput; --metrics also appends
+# them to a JSON lines file. --api-stats keeps a JSON file of every API call's latency,
+# traffic and errors per spreadsheet and operation, rewritten after each run.
+
+FORMATS = ('sqlite', 'csv', 'parquet', 'arrow')
+FULL_FETCH_EVERY = 12  # runs; a spreadsheet is fetched this often whatever the detector says
+
+log = logging.getLogger('gsdbe_daemon')
+
+def safe_filename(name):
+    return re.sub(r'[^\w.-]+', '_', name).strip('_') or 'sheet'
+
+def worksheet_name(props):
+    return f"{safe_filename(props.get('title', SHEET_TITLE))}_{props.get('sheetId', 0)}"
+
+class MirrorExporter:
+    # Feeds pages to a SqliteMirror like the file exporters get them, in one transaction per
+    # worksheet; rows past the last non-empty page are removed on close()
+    def __init__(self, mirror):
+        self.mirror = mirror
+        self.row_count = 0
+        self.written = 0
+        self.mirror.begin()
+
+    def write_page(self, start, rows):
+        if rows:
+            self.mirror.write([(start + i, values) for i, values in enumerate(rows)])
+            self.row_count = start + len(rows)
+
+    def close(self):
+        self.written = self.mirror.commit(self.row_count)
+        return self.written
+
+    def abort(self):
+        self.mirror.rollback()
+
+class SpreadsheetJob:
+    # One spreadsheet of sheets.txt. Keeps its change marker and SQLite mirrors between runs;
+    # run() is only ever called from one thread at a time.
+    def __init__(self, spreadsheet_id, name, credentials_path, out_dir, formats):
+        self.spreadsheet_id = spreadsheet_id
+        self.name = name or spreadsheet_id
+        self.credentials_path = credentials_path
+        self.out_dir = out_dir
+        self.formats = formats
+        self.detector = CHANGE_DETECTORS[CHANGE_DETECTION](credentials_path, spreadsheet_id)
+        self.last_marker = None
+        self.runs_since_fetch = 0
+        self.mirrors = {}  # (sheetId, title) -> SqliteMirror
+
+    def run(self):
+        # Returns this spreadsheet's metrics for the run; errors are reported, not raised
+        started = time.perf_counter()
+        metrics = {'spreadsheet_id': self.spreadsheet_id, 'name': self.name, 'skipped': False,
+                   'worksheets': 0, 'rows': 0, 'cells': 0, 'rows_written': 0, 'error': None}
+        try:
+            marker = self.detector.spreadsheet_marker()
+            self.runs_since_fetch += 1
+            if (marker is not None and marker == self.last_marker
+                    and self.runs_since_fetch < FULL_FETCH_EVERY):
+                metrics['skipped'] = True
+            else:
+                self.sync(metrics)
+                self.last_marker = marker
+                self.runs_since_fetch = 0
+        except Exception as e:
+            metrics['error'] = str(e)
+        metrics['seconds'] = round(time.perf_counter() - started, 3)
+        metrics['rows_per_second'] = round(metrics['rows'] / metrics['seconds']) if metrics['seconds'] else None
+        return metrics
+
+    def sync(self, metrics):
+        service = gsdbe_core.SERVICES.get_service(self.credentials_path)
+        base = safe_filename(self.name)
+        for props in fetch_worksheets(service, self.spreadsheet_id):
+            title = props.get('title', SHEET_TITLE)
+            exporters = []
+            mirror_exporter = None
+            if 'sqlite' in self.formats:
+                key = (props.get('sheetId', 0), title)
+                mirror = self.mirrors.get(key)
+                if mirror is None:
+                    os.makedirs(self.out_dir, exist_ok=True)
+                    mirror = self.mirrors[key] = SqliteMirror(
+                        os.path.join(self.out_dir, base + '.db'), self.spreadsheet_id, title, worksheet_name(props)
+                    )
+                mirror_exporter = MirrorExporter(mirror)
+                exporters.append(mirror_exporter)
+            files = [name for name in self.formats if name != 'sqlite']
+            if files:
+                os.makedirs(os.path.join(self.out_dir, base), exist_ok=True)
+            for name in files:
+                path = os.path.join(self.out_dir, base, worksheet_name(props) + EXPORT_EXTENSIONS[name])
+                exporters.append(EXPORTERS[name](path))
+
+            grid_rows, _ = worksheet_grid(props)
+            pages = iter_sheet_pages(
+                service, self.spreadsheet_id, grid_rows, title, value_render_option='UNFORMATTED_VALUE'
+            )
+            row_count = 0
+            def counted(pages):
+                nonlocal row_count
+                for start, rows in pages:
+                    if rows:
+                        row_count = start + len(rows)
+                        metrics['cells'] += sum(len(row) for row in rows)
+                    yield start, rows
+            export_pages(counted(pages), exporters)
+            metrics['worksheets'] += 1
+            metrics['rows'] += row_count
+            if mirror_exporter:
+                metrics['rows_written'] += mirror_exporter.written
+
+    def close(self):
+        for mirror in self.mirrors.values():
+            mirror.close()
+        self.mirrors.clear()
+
+def log_metrics(metrics, metrics_path=None):
+    for entry in metrics:
+        if 'spreadsheet_id' not in entry:
+            log.info("run %(run)d: %(fetched)d fetched, %(skipped)d unchanged, %(failed)d failed, "
+                     "%(rows)d rows in %(seconds).2f s (%(rows_per_second)s rows/s), "
+                     "%(api_calls)d API call(s), %(api_errors)d failed", entry)
+        elif entry['error']:
+            log.error("%s: %s", entry['name'], entry['error'])
+        elif entry['skipped']:
+            log.info("%s: unchanged", entry['name'])
+        else:
+            log.info("%s: %d worksheet(s), %d rows, %d cells in %.2f s (%s rows/s), %d SQLite row(s) written",
+                     entry['name'], entry['worksheets'], entry['rows'], entry['cells'],
+                     entry['seconds'], entry['rows_per_second'], entry['rows_written'])
+    if metrics_path:
+        with open(metrics_path, 'a') as f:
+            for entry in metrics:
+                f.write(json.dumps(entry) + '\n')
+
+def run_once(jobs, executor, run):
+    # All spreadsheets in parallel, API_THREADS at a time; returns the metrics to log
+    started = time.perf_counter()
+    api_before = API_METRICS.snapshot()['totals']
+    results = list(executor.map(SpreadsheetJob.run, jobs))
+    seconds = time.perf_counter() - started
+    api_after = API_METRICS.snapshot()['totals']
+    rows = sum(entry['rows'] for entry in results)
+    summary = {
+        'run': run, 'time': time.time(), 'seconds': round(seconds, 3), 'rows': rows,
+        'rows_per_second': round(rows / seconds) if seconds else None,
+        'fetched': sum(1 for entry in results if not entry['skipped'] and not entry['error']),
+        'skipped': sum(1 for entry in results if entry['skipped']),
+        'failed': sum(1 for entry in results if entry['error']),
+        'api_calls': api_after['calls'] - api_before['calls'],
+        'api_errors': api_after['errors'] - api_before['errors'],
+    }
+    return results + [summary]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mirror the spreadsheets in sheets.txt to local files.")
+    parser.add_argument('--credentials', required=True, help="OAuth client file; token.json is kept next to it")
+    parser.add_argument('--sheets', default='sheets.txt', help="spreadsheet list, one 'id[, name]' per line")
+    parser.add_argument('--out', default='exports', help="output directory")
+    parser.add_argument('--formats', default='sqlite', help=f"comma-separated, from {', '.join(FORMATS)}")
+    parser.add_argument('--interval', type=float, default=300.0, help="seconds between the starts of two runs")
+    parser.add_argument('--once', action='store_true', help="run once and exit, e.g. from cron")
+    parser.add_argument('--metrics', help="append per-run metrics to this JSON lines file")
+    parser.add_argument('--api-stats', help="rewrite this JSON file with the API call statistics after every run")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    formats = [name.strip() for name in args.formats.split(',') if name.strip()]
+    unknown = [name for name in formats if name not in FORMATS]
+    if unknown:
+        parser.error(f"unknown format(s): {', '.join(unknown)}")
+    if 'parquet' in formats or 'arrow' in formats:
+        try:
+            import_pyarrow()
+        except ImportError as e:
+            parser.error(str(e))
+
+    jobs = [
+        SpreadsheetJob(spreadsheet_id, name, args.credentials, args.out, formats)
+        for spreadsheet_id, name in read_sheets_file(args.sheets)
+    ]
+    if not jobs:
+        parser.error(f"no spreadsheets listed in {args.sheets}")
+    run = 0
+    try:
+        with ThreadPoolExecutor(max_workers=min(API_THREADS, len(jobs))) as executor:
+            while True:
+                run += 1
+                started = time.monotonic()
+                log_metrics(run_once(jobs, executor, run), args.metrics)
+                if args.api_stats:
+                    API_METRICS.export_json(args.api_stats)
+                if args.once:
+                    break
+                time.sleep(max(0.0, args.interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        log.info("stopped")
+    finally:
+        for job in jobs:
+            job.close()
+
+if __name__ == "__main__":
+    main()
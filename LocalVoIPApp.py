@@ -6,28 +6,23 @@ import random
 import string
 import pyaudio
 import sys
-import struct, math
 import time
 
+import voip_dsp
+import voip_mixer
+import voip_transport
+
 # Global audio parameters
-CHUNK = 1024             # Audio samples per frame
+CHUNK = 320              # Audio samples per frame (20 ms)
 FORMAT = pyaudio.paInt16 # 16-bit audio format
 CHANNELS = 1             # Mono
 RATE = 16000             # Sample rate in Hz
+FRAME_BYTES = CHUNK * 2  # One frame of 16-bit mono PCM
+MEDIA_PORT = 50011       # Host's UDP port for call audio
 
 def get_volume(data):
-    """Calculate RMS volume from audio data."""
-    if not data:
-        return 0
-    count = len(data) // 2
-    try:
-        fmt = "<" + "h" * count
-        samples = struct.unpack(fmt, data)
-    except Exception:
-        return 0
-    sum_squares = sum(s * s for s in samples)
-    rms = math.sqrt(sum_squares / count)
-    return rms
+    """Calculate RMS volume from audio data (see voip_dsp.rms)."""
+    return voip_dsp.rms(data)
 
 def volume_to_color(rms):
     """
@@ -67,6 +62,9 @@ class VoIPApp:
         self.room_code = None
         self.connected_users = []   # List of tuples: (username, role)
         self.client_sockets = {}    # For host: mapping client username -> socket.
+        self.mixer = None           # For host: voip_mixer.Mixer of the running call.
+        self.mixer_lock = threading.Lock()
+        self.media_socket = None    # For host: UDP socket carrying the call's audio.
         self.indicator_widgets = {} # Mapping username -> (canvas, oval id) for host view.
         self.call_indicator = None  # For client call view indicator.
         self.current_client_sock = None  # For clients, store the active TCP socket.
@@ -108,19 +106,8 @@ class VoIPApp:
 
     # --- New helper methods for volume control ---
     def scale_audio(self, data, volume):
-        """Scale 16-bit audio samples by a volume factor."""
-        count = len(data) // 2
-        fmt = "<" + "h" * count
-        samples = struct.unpack(fmt, data)
-        scaled = []
-        for s in samples:
-            new_val = int(s * volume)
-            if new_val > 32767:
-                new_val = 32767
-            elif new_val < -32768:
-                new_val = -32768
-            scaled.append(new_val)
-        return struct.pack(fmt, *scaled)
+        """Scale 16-bit audio samples by a volume factor, clipping (see voip_dsp.scale)."""
+        return voip_dsp.scale(data, volume)
 
     def set_volume(self, val):
         try:
@@ -531,10 +518,12 @@ class VoIPApp:
             self.show_notification("No room found with that code on the local network.")
             return
         PORT = 50007
+        media_sock = None
         try:
+            media_sock = voip_transport.media_socket()
             client_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             client_sock.connect((host_ip, PORT))
-            request_message = f"REQUEST|{self.username}|{room_code}"
+            request_message = f"REQUEST|{self.username}|{room_code}|{media_sock.getsockname()[1]}"
             client_sock.sendall(request_message.encode())
             response = client_sock.recv(1024).decode()
             if response.startswith("ACCEPT"):
@@ -552,11 +541,15 @@ class VoIPApp:
                 self.current_client_sock = client_sock
                 self.is_host = False
                 self.add_room_tab()
-                self.start_audio_communication(client_sock, role="client", peer_name=self.host_username)
+                self.start_audio_communication(client_sock, role="client", peer_name=self.host_username,
+                                               media_sock=media_sock, media_address=(host_ip, MEDIA_PORT))
             else:
                 self.show_notification("Connection declined by host.")
                 client_sock.close()
+                media_sock.close()
         except Exception as e:
+            if media_sock:
+                media_sock.close()
             self.show_notification(f"Failed to connect: {e}")
 
     def start_server(self):
@@ -629,12 +622,13 @@ class VoIPApp:
         try:
             request = client_sock.recv(1024).decode()
             parts = request.split('|')
-            if len(parts) != 3 or parts[0] != "REQUEST":
+            if len(parts) != 4 or parts[0] != "REQUEST" or not parts[3].isdigit():
                 client_sock.sendall("DECLINE".encode())
                 client_sock.close()
                 return
             client_username = parts[1]
             client_room_code = parts[2].strip()
+            media_address = (client_sock.getpeername()[0], int(parts[3]))
             if client_room_code != self.room_code:
                 client_sock.sendall("DECLINE".encode())
                 client_sock.close()
@@ -667,26 +661,46 @@ class VoIPApp:
             self.root.after(0, show_prompt)
             decision_event.wait()
             if decision_result.get('decision'):
+                # Join the mix before accepting, so a client the host cannot carry is declined
+                if not self.join_mixer(client_username, media_address):
+                    client_sock.sendall("DECLINE".encode())
+                    client_sock.close()
+                    return
                 self.connected_users.append((client_username, "client"))
                 self.broadcast_user_list()
                 accept_msg = f"ACCEPT|{self.username}|{','.join([f'{u}:{r}' for u, r in self.connected_users])}"
-                client_sock.sendall(accept_msg.encode("utf-8"))
+                try:
+                    client_sock.sendall(accept_msg.encode("utf-8"))
+                except OSError:
+                    self.leave_mixer(client_username)
+                    self.connected_users = [entry for entry in self.connected_users if entry[0] != client_username]
+                    self.broadcast_user_list()
+                    raise
                 self.client_sockets[client_username] = client_sock
                 self.root.after(0, self.update_room_view)
-                self.start_audio_communication(client_sock, role="host", peer_name=client_username)
+                self.start_audio_communication(client_sock, role="host", peer_name=client_username,
+                                               media_address=media_address)
             else:
                 client_sock.sendall("DECLINE".encode())
                 client_sock.close()
         except Exception:
             client_sock.close()
 
-    def start_audio_communication(self, sock, role, peer_name=None):
+    def start_audio_communication(self, sock, role, peer_name=None, media_sock=None, media_address=None):
         """
-        Begin bi-directional audio streaming over the given socket.
+        Begin bi-directional audio streaming with a peer. Audio goes over UDP as
+        voip_transport packets, to and from media_address; sock stays for signaling.
         For a client, the call UI is integrated into the main window.
+        The host has already added the client to its conference mix (see join_mixer)
+        and only watches the signaling connection.
         """
-        if role == "client":
-            self.show_client_call_view()
+        if role == "host":
+            threading.Thread(target=self.watch_client, args=(sock, peer_name), daemon=True).start()
+            return
+        self.show_client_call_view()
+        call_over = threading.Event()
+        sender = voip_transport.MediaSender(media_sock, media_address)
+        jitter_buffer = voip_transport.JitterBuffer(RATE, CHUNK)
 
         def send_audio():
             try:
@@ -696,16 +710,28 @@ class VoIPApp:
             except Exception as e:
                 print(f"Audio input error: {e}")
                 return
-            while True:
+            while not call_over.is_set():
                 try:
-                    data = stream.read(CHUNK)
-                    sock.sendall(data)
+                    data = stream.read(CHUNK, exception_on_overflow=False)
+                    sender.send(data)
                 except Exception:
                     break
             stream.stop_stream()
             stream.close()
 
         def receive_audio():
+            while not call_over.is_set():
+                try:
+                    data, address = media_sock.recvfrom(voip_transport.MAX_DATAGRAM)
+                except (socket.timeout, ConnectionResetError):
+                    continue
+                except OSError:
+                    break
+                packet = voip_transport.parse(data)
+                if packet and address == media_address:
+                    jitter_buffer.push(packet)
+
+        def play_audio():
             try:
                 stream = self.py_audio.open(format=FORMAT, channels=CHANNELS, rate=RATE,
                                             output=True, frames_per_buffer=CHUNK,
@@ -713,42 +739,158 @@ class VoIPApp:
             except Exception as e:
                 print(f"Audio output error: {e}")
                 return
-            while True:
+            silence = bytes(FRAME_BYTES)
+            while not call_over.is_set():
                 try:
-                    data = sock.recv(CHUNK)
-                    if role == "client" and data == b"HOST_ENDED":
-                        self.host_ended_call(peer_name, self.content_frame)
-                        break
-                    if not data:
-                        if role == "host":
-                            self.client_disconnected(peer_name)
-                        elif role == "client":
-                            self.host_ended_call(peer_name, self.content_frame)
-                        break
+                    # One frame per write; the output device's pace is the playout clock
+                    data = jitter_buffer.pop() or silence
                     # Apply volume control: if muted, output silence;
                     # otherwise, scale audio by self.volume_factor if not 1.0.
                     if self.muted:
-                        data = b'\x00' * len(data)
+                        data = silence
                     elif self.volume_factor != 1.0:
                         data = self.scale_audio(data, self.volume_factor)
                     rms = get_volume(data)
                     color = volume_to_color(rms)
-                    if role == "host" and peer_name:
-                        self.root.after(0, lambda: self.safe_update_itemconfig(*self.indicator_widgets.get(peer_name, (None, None)), color))
-                    elif role == "client":
-                        self.root.after(0, lambda: self.safe_update_itemconfig(*self.call_indicator, color))
+                    self.root.after(0, lambda: self.safe_update_itemconfig(*self.call_indicator, color))
                     stream.write(data)
                 except Exception:
-                    if role == "host":
-                        self.client_disconnected(peer_name)
-                    elif role == "client":
-                        self.host_ended_call(peer_name, self.content_frame)
                     break
             stream.stop_stream()
             stream.close()
 
+        def watch_signaling():
+            # The TCP connection only carries signaling now: HOST_ENDED, or its end
+            try:
+                while True:
+                    data = sock.recv(1024)
+                    if not data or b"HOST_ENDED" in data:
+                        break
+            except Exception:
+                pass
+            call_over.set()
+            media_sock.close()
+            self.host_ended_call(peer_name, self.content_frame)
+
         threading.Thread(target=send_audio, daemon=True).start()
         threading.Thread(target=receive_audio, daemon=True).start()
+        threading.Thread(target=play_audio, daemon=True).start()
+        threading.Thread(target=watch_signaling, daemon=True).start()
+
+    def join_mixer(self, peer_name, media_address):
+        """
+        Host: add a client to the conference mix, starting the mix loop for the first one.
+        Returns False if the media socket could not be opened.
+        """
+        with self.mixer_lock:
+            if self.mixer is None:
+                try:
+                    self.media_socket = voip_transport.media_socket(MEDIA_PORT)
+                except OSError as e:
+                    print(f"Media socket error: {e}")
+                    return False
+                self.mixer = voip_mixer.Mixer(RATE, CHUNK)
+                threading.Thread(target=self.run_mixer, args=(self.mixer, self.media_socket), daemon=True).start()
+                threading.Thread(target=self.receive_media, args=(self.mixer, self.media_socket), daemon=True).start()
+            self.mixer.add(peer_name, voip_transport.MediaSender(self.media_socket, media_address))
+            return True
+
+    def leave_mixer(self, peer_name):
+        """
+        Host: take a client out of the mix, stopping the mix loop after the last one.
+        The media socket is closed there and then, so the next call's mixer can bind
+        MEDIA_PORT without sharing it with the old loops (SO_REUSEADDR would allow that).
+        Returns the removed participant, or None if it had already left.
+        """
+        with self.mixer_lock:
+            if self.mixer is None:
+                return None
+            participant = self.mixer.remove(peer_name)
+            if not len(self.mixer):
+                self.mixer = None
+                self.media_socket.close()
+                self.media_socket = None
+            return participant
+
+    def run_mixer(self, mixer, media_sock):
+        """
+        Host's conference loop, with one microphone and one speaker stream for the whole
+        call. Each microphone frame is one tick of the mix; without a microphone a
+        FrameClock keeps time and the host is mixed in as silence.
+        """
+        try:
+            mic = self.py_audio.open(format=FORMAT, channels=CHANNELS, rate=RATE,
+                                     input=True, frames_per_buffer=CHUNK,
+                                     input_device_index=self.input_device)
+        except Exception as e:
+            print(f"Audio input error: {e}")
+            mic = None
+        try:
+            speaker = self.py_audio.open(format=FORMAT, channels=CHANNELS, rate=RATE,
+                                         output=True, frames_per_buffer=CHUNK,
+                                         output_device_index=self.output_device)
+        except Exception as e:
+            print(f"Audio output error: {e}")
+            speaker = None
+        clock = voip_mixer.FrameClock(CHUNK / RATE)
+        silence = bytes(FRAME_BYTES)
+        while self.mixer is mixer:
+            try:
+                if mic:
+                    local = mic.read(CHUNK, exception_on_overflow=False)
+                else:
+                    clock.wait()
+                    local = silence
+                heard = mixer.mix(local)
+                if speaker:
+                    # Apply volume control as for a client's received audio
+                    if self.muted:
+                        heard = silence
+                    elif self.volume_factor != 1.0:
+                        heard = self.scale_audio(heard, self.volume_factor)
+                    speaker.write(heard)
+            except Exception as e:
+                if self.mixer is mixer:
+                    print(f"Mixer error: {e}")
+                break
+            levels = mixer.levels()
+            levels[self.username] = get_volume(local)
+            self.root.after(0, lambda: self.show_levels(levels))
+        for stream in (mic, speaker):
+            if stream:
+                stream.stop_stream()
+                stream.close()
+        media_sock.close()
+
+    def receive_media(self, mixer, media_sock):
+        """Host: hand each incoming audio packet to the jitter buffer of the client that sent it."""
+        while self.mixer is mixer:
+            try:
+                data, address = media_sock.recvfrom(voip_transport.MAX_DATAGRAM)
+            except (socket.timeout, ConnectionResetError):
+                # Windows reports an earlier datagram's ICMP "port unreachable" as a reset
+                continue
+            except OSError:
+                break
+            packet = voip_transport.parse(data)
+            if packet:
+                mixer.push(address, packet)
+
+    def watch_client(self, sock, peer_name):
+        """Host: a client's TCP connection only carries signaling; its end means they left."""
+        try:
+            while sock.recv(1024):
+                pass
+        except Exception:
+            pass
+        if self.leave_mixer(peer_name):
+            self.client_disconnected(peer_name)
+
+    def show_levels(self, levels):
+        """Host: color each user's indicator by their level in the last mixed frame."""
+        for name, rms in levels.items():
+            if name in self.indicator_widgets:
+                self.safe_update_itemconfig(*self.indicator_widgets[name], volume_to_color(rms))
 
     def update_indicator(self, peer_name, color):
         """Update the volume indicator for a given user in the host room view."""
@@ -809,6 +951,7 @@ class VoIPApp:
         Resets the room state.
         """
         for client, sock in list(self.client_sockets.items()):
+            self.leave_mixer(client)
             try:
                 sock.sendall(b"HOST_ENDED")
                 sock.close()
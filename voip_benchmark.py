@@ -0,0 +1,203 @@
+"""
+Per-chunk cost of LocalVoIPApp's audio processing, old versus new.
+
+Runs RMS and gain/clipping on random 16-bit PCM chunks at 16 and 48 kHz, with the
+original struct-based code, voip_dsp with NumPy and voip_dsp without it, and
+reports microseconds per chunk and the share of the chunk's real-time budget used.
+Also times one tick of the host's conference mix (voip_mixer) against the number of
+participants, and plays a simulated lossy, jittery link through voip_transport's jitter
+buffer to report mouth-to-ear delay and concealment. Run from this directory:
+    python voip_benchmark.py --repeats 2000 --participants 1,2,4,8,16,32
+"""
+import sys
+import json
+import math
+import time
+import random
+import struct
+import argparse
+import statistics
+
+import voip_dsp
+import voip_mixer
+import voip_transport
+
+APP_CHUNK = 320  # samples per read in LocalVoIPApp
+OLD_CHUNK = 1024 # its read size before the UDP transport
+APP_RATE = 16000
+
+def legacy_rms(data):
+    """get_volume as it was: struct.unpack into Python ints."""
+    count = len(data) // 2
+    samples = struct.unpack("<" + "h" * count, data)
+    return math.sqrt(sum(s * s for s in samples) / count)
+
+def legacy_scale(data, volume):
+    """VoIPApp.scale_audio as it was."""
+    count = len(data) // 2
+    fmt = "<" + "h" * count
+    scaled = []
+    for s in struct.unpack(fmt, data):
+        scaled.append(min(max(int(s * volume), -32768), 32767))
+    return struct.pack(fmt, *scaled)
+
+def random_chunk(samples, rng):
+    # Speech-like level with some peaks that clip once amplified
+    values = (max(-32768, min(32767, int(rng.gauss(0, 6000)))) for _ in range(samples))
+    return struct.pack("<%dh" % samples, *values)
+
+def time_per_call(fn, chunks, repeats):
+    """Median seconds per call over repeats calls, cycling through chunks."""
+    samples = []
+    for i in range(repeats):
+        chunk = chunks[i % len(chunks)]
+        started = time.perf_counter()
+        fn(chunk)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+def implementations():
+    impls = [('struct (old)', legacy_rms, legacy_scale)]
+    if voip_dsp.np is not None:
+        impls.append(('voip_dsp numpy', voip_dsp.rms, voip_dsp.scale))
+    impls.append(('voip_dsp no numpy', voip_dsp.rms, voip_dsp.scale))
+    return impls
+
+def run(repeats, gain, seed=0):
+    rng = random.Random(seed)
+    numpy = voip_dsp.np
+    results = []
+    for rate in (16000, 48000):
+        for samples in (OLD_CHUNK, rate * APP_CHUNK // APP_RATE):
+            chunks = [random_chunk(samples, rng) for _ in range(8)]
+            budget = samples / rate
+            for name, rms, scale in implementations():
+                voip_dsp.np = None if name == 'voip_dsp no numpy' else numpy
+                try:
+                    assert scale(chunks[0], gain) == legacy_scale(chunks[0], gain), name
+                    assert abs(rms(chunks[0]) - legacy_rms(chunks[0])) < 1e-6, name
+                    rms_s = time_per_call(rms, chunks, repeats)
+                    scale_s = time_per_call(lambda chunk: scale(chunk, gain), chunks, repeats)
+                finally:
+                    voip_dsp.np = numpy
+                results.append({
+                    'rate': rate,
+                    'samples': samples,
+                    'chunk_ms': round(budget * 1000, 1),
+                    'implementation': name,
+                    'rms_us': round(rms_s * 1e6, 1),
+                    'scale_us': round(scale_s * 1e6, 1),
+                    'budget_percent': round((rms_s + scale_s) / budget * 100, 3),
+                })
+    return results
+
+def run_mixer(repeats, counts, seed=0):
+    """
+    Seconds per mix tick (jitter buffers, mix-minus, sending every feed) for each participant
+    count. Feeds go to a local UDP socket that is never read, so the kernel drops them.
+    """
+    rng = random.Random(seed)
+    chunks = [random_chunk(APP_CHUNK, rng) for _ in range(8)]
+    budget = APP_CHUNK / APP_RATE
+    sink = voip_transport.media_socket()
+    results = []
+    for count in counts:
+        mixer = voip_mixer.Mixer(APP_RATE, APP_CHUNK)
+        sender = voip_transport.media_socket()
+        participants = [
+            mixer.add(f"user{i}", voip_transport.MediaSender(sender, ('127.0.0.1', sink.getsockname()[1])))
+            for i in range(count)
+        ]
+        samples = []
+        for i in range(repeats):
+            for n, participant in enumerate(participants):
+                participant.buffer.push(voip_transport.Packet(n, i & 0xFFFF, i * APP_CHUNK, chunks[(i + n) % len(chunks)]))
+            started = time.perf_counter()
+            mixer.mix(chunks[i % len(chunks)])
+            samples.append(time.perf_counter() - started)
+        sender.close()
+        tick_s = statistics.median(samples)
+        results.append({
+            'participants': count,
+            'tick_us': round(tick_s * 1e6, 1),
+            'per_participant_us': round(tick_s / count * 1e6, 1),
+            'budget_percent': round(tick_s / budget * 100, 3),
+        })
+    sink.close()
+    return results
+
+def run_link(loss, jitter_ms, seconds=60.0, seed=0):
+    """
+    Plays seconds of 20 ms frames through a JitterBuffer in simulated time. Each packet is
+    lost with probability loss, otherwise delayed by 10 ms plus an exponentially distributed
+    jitter with mean jitter_ms. Mouth-to-ear counts from capture to playout.
+    """
+    rng = random.Random(seed)
+    frame_s = APP_CHUNK / APP_RATE
+    ticks = int(seconds / frame_s)
+    payloads = [random_chunk(APP_CHUNK, rng) for _ in range(ticks)]
+    sent_at = {id(payload): i * frame_s for i, payload in enumerate(payloads)}
+    arrivals = []
+    for i, payload in enumerate(payloads):
+        if rng.random() >= loss:
+            delay = 0.010 + (rng.expovariate(1000 / jitter_ms) if jitter_ms else 0)
+            arrivals.append((i * frame_s + delay, voip_transport.Packet(1, i & 0xFFFF, i * APP_CHUNK & 0xFFFFFFFF, payload)))
+    arrivals.sort(key=lambda arrival: arrival[0])
+
+    buffer = voip_transport.JitterBuffer(APP_RATE, APP_CHUNK)
+    delays, silent, pending = [], 0, 0
+    for tick in range(ticks + 50):
+        now = tick * frame_s
+        while pending < len(arrivals) and arrivals[pending][0] <= now:
+            buffer.push(arrivals[pending][1], arrivals[pending][0])
+            pending += 1
+        frame = buffer.pop()
+        if frame is None:
+            silent += 1
+        elif id(frame) in sent_at:
+            delays.append(now + frame_s - sent_at[id(frame)])
+    stats = buffer.stats()
+    delays.sort()
+    return {
+        'loss_percent': round(loss * 100, 1),
+        'jitter_ms': jitter_ms,
+        'mouth_to_ear_ms': round(statistics.median(delays) * 1000),
+        'p95_ms': round(delays[int(len(delays) * 0.95)] * 1000),
+        'late_percent': round(stats['late'] / ticks * 100, 2),
+        'concealed_percent': round(stats['concealed'] / ticks * 100, 2),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark LocalVoIPApp's per-chunk audio DSP.")
+    parser.add_argument('--repeats', type=int, default=1000, help="timed calls per measurement")
+    parser.add_argument('--gain', type=float, default=1.5, help="volume factor for the gain/clipping step")
+    parser.add_argument('--participants', default='1,2,4,8,16',
+                        help="comma-separated participant counts for the mixer benchmark")
+    parser.add_argument('--json', dest='json_path', help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = run(args.repeats, args.gain)
+    print(f"{'rate':>6} {'samples':>7} {'chunk ms':>8}  {'implementation':<17} {'rms us':>8} {'scale us':>9} {'% budget':>9}")
+    for entry in results:
+        print(f"{entry['rate']:>6} {entry['samples']:>7} {entry['chunk_ms']:>8}  {entry['implementation']:<17} "
+              f"{entry['rms_us']:>8} {entry['scale_us']:>9} {entry['budget_percent']:>9}")
+
+    mixing = run_mixer(args.repeats, [int(n) for n in args.participants.split(',')])
+    print(f"\n{'participants':>12} {'tick us':>9} {'us each':>8} {'% budget':>9}")
+    for entry in mixing:
+        print(f"{entry['participants']:>12} {entry['tick_us']:>9} {entry['per_participant_us']:>8} "
+              f"{entry['budget_percent']:>9}")
+
+    links = [run_link(loss, jitter) for loss in (0.0, 0.02, 0.05) for jitter in (2, 10, 30)]
+    print(f"\n{'loss %':>6} {'jitter ms':>9} {'m2e ms':>7} {'p95 ms':>7} {'late %':>7} {'concealed %':>12}")
+    for entry in links:
+        print(f"{entry['loss_percent']:>6} {entry['jitter_ms']:>9} {entry['mouth_to_ear_ms']:>7} {entry['p95_ms']:>7} "
+              f"{entry['late_percent']:>7} {entry['concealed_percent']:>12}")
+    results = {'dsp': results, 'mixer': mixing, 'link': links}
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+    return results
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,98 @@
+"""
+Host-side conference mixing for LocalVoIPApp.
+
+Every participant's audio packets go into their own voip_transport.JitterBuffer. One loop,
+clocked by the host's microphone (or a FrameClock when the host has none), takes a frame
+from each buffer per tick and mixes them once with voip_dsp.mix_minus. Each participant is
+then sent the mix without their own voice. A tick is one pass over each participant's
+frame, so CPU grows linearly with the number of people in the call.
+"""
+import time
+import threading
+
+import voip_dsp
+import voip_transport
+
+class Participant:
+    """One client in the mix: the jitter buffer of its packets and the sender of its mix."""
+    def __init__(self, name, sender, rate, frame_samples):
+        self.name = name
+        self.sender = sender
+        self.buffer = voip_transport.JitterBuffer(rate, frame_samples)
+        self.level = 0
+
+class Mixer:
+    """The participants of one call, mixed together a frame at a time by mix()."""
+    def __init__(self, rate, frame_samples):
+        self.rate = rate
+        self.frame_samples = frame_samples
+        self.participants = {}
+        self.addresses = {}  # media address -> participant
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.participants)
+
+    def add(self, name, sender):
+        """Add a participant whose mix goes out through sender (a voip_transport.MediaSender)."""
+        participant = Participant(name, sender, self.rate, self.frame_samples)
+        with self.lock:
+            previous = self.participants.get(name)
+            if previous:
+                self.addresses.pop(previous.sender.address, None)
+            self.participants[name] = participant
+            self.addresses[sender.address] = participant
+        return participant
+
+    def remove(self, name):
+        """Take a participant out of the mix; returns it, or None if it had already left."""
+        with self.lock:
+            participant = self.participants.pop(name, None)
+            if participant:
+                self.addresses.pop(participant.sender.address, None)
+        return participant
+
+    def push(self, address, packet):
+        """Buffer a packet received from address; packets from strangers are ignored."""
+        participant = self.addresses.get(address)
+        if participant:
+            participant.buffer.push(packet)
+
+    def mix(self, local):
+        """
+        One tick: mix the host's frame with a frame from every participant, send each
+        participant their mix-minus and return what the host should hear.
+        """
+        with self.lock:
+            participants = list(self.participants.values())
+        frames = [participant.buffer.pop() for participant in participants]
+        heard, feeds = voip_dsp.mix_minus(local, frames)
+        for participant, frame, feed in zip(participants, frames, feeds):
+            participant.level = voip_dsp.rms(frame) if frame else 0
+            try:
+                participant.sender.send(feed)
+            except OSError:  # a datagram that can't go out is just a lost frame
+                pass
+        return heard
+
+    def levels(self):
+        """RMS level of each participant's frame in the last tick, by name."""
+        with self.lock:
+            return {name: participant.level for name, participant in self.participants.items()}
+
+class FrameClock:
+    """
+    Ticks every period seconds against a monotonic deadline. After a stall of more than a
+    period it restarts from now rather than firing a burst of ticks to catch up.
+    """
+    def __init__(self, period):
+        self.period = period
+        self.deadline = time.monotonic()
+
+    def wait(self):
+        self.deadline += self.period
+        delay = self.deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        elif delay < -self.period:
+            self.deadline = time.monotonic()
@@ -0,0 +1,188 @@
+"""
+Datagram media transport for LocalVoIPApp.
+
+Audio frames travel over UDP in RTP-style packets: RFC 3550's fixed 12-byte header with
+version, payload type, sequence number, timestamp (in samples) and SSRC. A lost packet only
+costs its own frame, where on TCP every frame behind it waited for the retransmission. The
+receiver puts packets into a JitterBuffer that reorders them, sizes its delay from the
+measured interarrival jitter and conceals lost frames. TCP is left for signaling.
+"""
+import math
+import time
+import random
+import socket
+import struct
+import threading
+from collections import namedtuple
+
+import voip_dsp
+
+RTP_VERSION = 2
+PAYLOAD_TYPE = 96        # dynamic: 16-bit mono PCM in the sender's byte order
+HEADER = struct.Struct('!BBHII')
+MAX_DATAGRAM = 4096
+VOICE_TOS = 0xB8         # DSCP EF; Wi-Fi (WMM) sends it from the voice queue
+RECV_TIMEOUT = 0.5       # seconds, so receive loops notice a call ending
+
+MIN_DELAY_FRAMES = 2     # playout delay bounds of a JitterBuffer, in frames
+MAX_DELAY_FRAMES = 10
+JITTER_SPREAD = 3        # the delay covers this many times the measured jitter
+RESYNC_FRAMES = 50       # a packet this far behind means the stream restarted
+CONCEAL_FRAMES = 3       # lost frames covered by repeating the last one before silence
+CONCEAL_FADE = 0.5       # gain applied per repetition
+
+Packet = namedtuple('Packet', 'ssrc seq timestamp payload')
+
+def seq_delta(a, b):
+    """a - b for 16-bit sequence numbers that wrap around."""
+    return ((a - b + 0x8000) & 0xFFFF) - 0x8000
+
+def timestamp_delta(a, b):
+    """a - b for 32-bit timestamps that wrap around."""
+    return ((a - b + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+def media_socket(port=0):
+    """UDP socket for audio, bound to port (0 for any free one) and marked as voice traffic."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_TOS, VOICE_TOS)
+    except (AttributeError, OSError):  # not settable on every platform; only a QoS hint
+        pass
+    if port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('', port))
+    sock.settimeout(RECV_TIMEOUT)
+    return sock
+
+def pack(packet):
+    return HEADER.pack(RTP_VERSION << 6, PAYLOAD_TYPE, packet.seq, packet.timestamp, packet.ssrc) + packet.payload
+
+def parse(data):
+    """The Packet in a datagram, or None if it isn't one of ours."""
+    if len(data) < HEADER.size:
+        return None
+    flags, payload_type, seq, timestamp, ssrc = HEADER.unpack_from(data)
+    if flags >> 6 != RTP_VERSION or payload_type & 0x7F != PAYLOAD_TYPE:
+        return None
+    return Packet(ssrc, seq, timestamp, bytes(data[HEADER.size:]))
+
+class MediaSender:
+    """
+    Sends frames to one address as a packet stream with its own SSRC. The sequence number
+    and timestamp start at random values, as RFC 3550 recommends.
+    """
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.ssrc = random.getrandbits(32)
+        self.seq = random.getrandbits(16)
+        self.timestamp = random.getrandbits(32)
+
+    def send(self, frame):
+        self.sock.sendto(pack(Packet(self.ssrc, self.seq, self.timestamp, frame)), self.address)
+        self.seq = (self.seq + 1) & 0xFFFF
+        self.timestamp = (self.timestamp + len(frame) // 2) & 0xFFFFFFFF
+
+class JitterBuffer:
+    """
+    Reorders one packet stream and plays it out a frame per pop().
+
+    The playout delay (target, in frames) follows the RFC 3550 interarrival jitter: it grows
+    as soon as the jitter rises, and when more frames are buffered than it needs one is
+    skipped per pop to bring the delay back down. Packets arriving after their turn are
+    dropped as late. A missing frame is concealed by repeating the last one at falling
+    gain, then silence; an underrun also waits for target frames before playing again.
+    """
+    def __init__(self, rate, frame_samples, min_delay=MIN_DELAY_FRAMES, max_delay=MAX_DELAY_FRAMES):
+        self.rate = rate
+        self.frame_samples = frame_samples
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.received = self.late = self.lost = self.concealed = self.skipped = self.underruns = 0
+        self.lock = threading.Lock()
+        self.restart(None)
+
+    def restart(self, ssrc):
+        self.ssrc = ssrc
+        self.frames = {}  # sequence number -> payload
+        self.next_seq = None
+        self.playing = False
+        self.previous = None  # (arrival, timestamp) of the last packet
+        self.jitter = 0.0  # in samples
+        self.target = self.min_delay
+        self.last = None
+        self.fading = 0
+
+    def push(self, packet, arrival=None):
+        if arrival is None:
+            arrival = time.monotonic()
+        with self.lock:
+            if packet.ssrc != self.ssrc:
+                self.restart(packet.ssrc)
+            self.received += 1
+            if self.previous is not None:
+                previous_arrival, previous_timestamp = self.previous
+                transit = (arrival - previous_arrival) * self.rate - timestamp_delta(packet.timestamp, previous_timestamp)
+                self.jitter += (abs(transit) - self.jitter) / 16
+            self.previous = (arrival, packet.timestamp)
+            delay = math.ceil(JITTER_SPREAD * self.jitter / self.frame_samples)
+            self.target = min(max(delay, self.min_delay), self.max_delay)
+
+            if self.next_seq is not None:
+                behind = seq_delta(packet.seq, self.next_seq)
+                if behind < -RESYNC_FRAMES:
+                    self.restart(packet.ssrc)
+                elif behind < 0:
+                    self.late += 1
+                    return
+            if len(self.frames) >= 2 * self.max_delay:
+                del self.frames[min(self.frames, key=lambda seq: seq_delta(seq, packet.seq))]
+                self.skipped += 1
+            self.frames[packet.seq] = packet.payload
+
+    def pop(self):
+        """The next frame to play, or None for silence."""
+        with self.lock:
+            if not self.playing:
+                if len(self.frames) < self.target:
+                    return self.conceal()
+                self.playing = True
+                reference = next(iter(self.frames))
+                self.next_seq = min(self.frames, key=lambda seq: seq_delta(seq, reference))
+            elif len(self.frames) > self.target + 1:
+                if self.frames.pop(self.next_seq, None) is not None:
+                    self.skipped += 1
+                self.next_seq = (self.next_seq + 1) & 0xFFFF
+
+            frame = self.frames.pop(self.next_seq, None)
+            self.next_seq = (self.next_seq + 1) & 0xFFFF
+            if frame is not None:
+                self.last = frame
+                self.fading = 0
+                return frame
+            if self.frames:
+                self.lost += 1
+            else:
+                self.playing = False
+                self.underruns += 1
+            return self.conceal()
+
+    def conceal(self):
+        if self.last is None or self.fading >= CONCEAL_FRAMES:
+            return None
+        self.fading += 1
+        self.concealed += 1
+        return voip_dsp.scale(self.last, CONCEAL_FADE ** self.fading)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'received': self.received,
+                'late': self.late,
+                'lost': self.lost,
+                'concealed': self.concealed,
+                'skipped': self.skipped,
+                'underruns': self.underruns,
+                'jitter_ms': round(self.jitter / self.rate * 1000, 1),
+                'delay_ms': round(self.target * self.frame_samples / self.rate * 1000),
+            }